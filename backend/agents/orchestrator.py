@@ -1,10 +1,10 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel, Tool, FunctionDeclaration, Part
+from vertexai.generative_models import Tool, FunctionDeclaration, Part
 from sqlalchemy import select
 from app import database
 from app.models import EventLog, Exercise
-from app.config import settings, logger
-import asyncio
+from app.config import logger
+from app.llm import llm_gate, model_registry
+from app.user_state import describe_latest_metrics, get_user_state
 import json
 
 # Ensure db pool is init if this module is imported standalone (handled by lifespan in main app usually)
@@ -150,10 +150,8 @@ async def get_workout_plan(client_id: str):
     4. Gemini generates Plan.
     """
     try:
-        # Init Vertex inside function to avoid startup errors if auth missing locally
-        vertexai.init(project=settings.PROJECT_ID, location=settings.GCP_REGION)
-        # Use Configured Model
-        model = GenerativeModel(settings.GEMINI_MODEL_ID, tools=[training_tools])
+        # Shared handle (Vertex initialized once at startup; lazily if auth was missing then)
+        model = model_registry.get(tools=[training_tools])
     except Exception as e:
         return f"AI Initialization Failed: {e}"
 
@@ -162,14 +160,20 @@ async def get_workout_plan(client_id: str):
     is_traveling = False
     
     async with database.async_engine.connect() as conn:
-         # Find latest wearable event
-         stmt = select(EventLog.payload).where(
-             EventLog.user_id == client_id, 
-             EventLog.event_type == "wearable"
-         ).order_by(EventLog.created_at.desc()).limit(1)
-         
-         result = await conn.execute(stmt)
-         log = result.scalar_one_or_none()
+         # One primary-key lookup on the user_state projection
+         state = await get_user_state(conn, client_id) or {}
+         log = None
+         if state.get("recovery") is not None:
+             sleep_score = state["recovery"]
+         else:
+             # Legacy: readings that predate the biometric tables only exist as event payloads
+             stmt = select(EventLog.payload).where(
+                 EventLog.user_id == client_id, 
+                 EventLog.event_type == "wearable"
+             ).order_by(EventLog.created_at.desc()).limit(1)
+             
+             result = await conn.execute(stmt)
+             log = result.scalar_one_or_none()
          
          if log:
              # Handle different payload structures (Terra vs Seed)
@@ -179,20 +183,24 @@ async def get_workout_plan(client_id: str):
              elif "data" in p and "scores" in p["data"]:
                  sleep_score = p["data"]["scores"].get("recovery", 50)
          
-         # Check Travel and Persona Status
-         from app.models import User
-         user_stmt = select(User).where(User.id == client_id)
-         user_result = await conn.execute(user_stmt)
-         user = user_result.scalar_one_or_none()
+         # Check Travel and Persona Status (users table only if the profile isn't projected yet)
+         if state.get("is_traveling") is None:
+             from app.models import User
+             user_stmt = select(User.is_traveling, User.coach_style).where(User.id == client_id)
+             user_result = await conn.execute(user_stmt)
+             state.update(user_result.mappings().first() or {})
          
-         is_traveling = user.is_traveling if user else False
-         coach_style = user.coach_style if user and user.coach_style else "hyrox_competitor"
+         is_traveling = bool(state.get("is_traveling"))
+         coach_style = state.get("coach_style") or "hyrox_competitor"
     
     logger.info(f"Orchestrator: Client {client_id} has Sleep Score {sleep_score}, Traveling={is_traveling}, Persona={coach_style}")
 
     # 2. Construct Prompt
     system_prompt = get_system_prompt(coach_style=coach_style)
     
+    latest_metrics = describe_latest_metrics(state)
+    performance_injection = f"Latest logged performance (scale loads from these):\n{latest_metrics}" if latest_metrics else ""
+
     travel_injection = ""
     if is_traveling:
         travel_injection = """
@@ -205,6 +213,7 @@ async def get_workout_plan(client_id: str):
     
     Client ID: {client_id}
     Recovery Score: {sleep_score}/100.
+    {performance_injection}
     
     Mission: Build a workout session.
     
@@ -221,7 +230,7 @@ async def get_workout_plan(client_id: str):
     chat = model.start_chat()
     
     # 1st Turn: Send Prompt
-    response = await chat.send_message_async(prompt)
+    response = await llm_gate.run(lambda: chat.send_message_async(prompt))
     
     # Loop for Function Calling (Simple 1-turn loop for MVP)
     # response.candidates[0].content.parts might contain a function call
@@ -243,12 +252,12 @@ async def get_workout_plan(client_id: str):
                 )
                 
                 # Send Tool Output back to Model
-                response_final = await chat.send_message_async(
+                response_final = await llm_gate.run(lambda: chat.send_message_async(
                     Part.from_function_response(
                         name=fn_name,
                         response={"content": tool_output}
                     )
-                )
+                ))
                 return response_final.text
                 
         return response.text
@@ -0,0 +1,165 @@
+"""
+Analytics aggregation for Elite Concierge AI.
+
+Provides:
+- load_series: (day, value, reps) column arrays for one user/category within a time window,
+  already reduced to one row per day (or per day and rep count) in SQL, no ORM objects
+- epley / brzycki: estimated one-rep max, vectorized
+- daily: one point per calendar day (last or max of the day)
+- rolling_mean, linear_trend, percentiles: NumPy over the daily series
+- summarize: everything the /analytics endpoints return, in one pass
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app.models import PerformanceMetric
+
+# Relative change per week below which a trend counts as flat (0.5% of the mean)
+STABLE_FRACTION_PER_WEEK = 0.005
+DEFAULT_WINDOW_DAYS = 365
+
+
+@dataclass
+class Series:
+    timestamps: np.ndarray  # datetime64[us] (midnight of each day), ascending
+    values: np.ndarray  # float64
+    reps: np.ndarray  # float64, NaN where not logged
+
+    def __len__(self):
+        return len(self.values)
+
+
+async def load_series(
+    db,
+    user_id: str,
+    category: str,
+    name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    how: str = "last",
+) -> Series:
+    """
+    Rows logged since `since` (default: the last DEFAULT_WINDOW_DAYS days), bucketed by
+    day in SQL so the result stays small however long the history is:
+    - how="last": the latest entry of each day
+    - how="max": the heaviest entry per (day, reps). The best e1RM of a day is always
+      among these (e1RM grows with weight at fixed reps), so NumPy finishes the job.
+    """
+    if since is None:
+        since = datetime.utcnow() - timedelta(days=DEFAULT_WINDOW_DAYS)
+    day = func.date(PerformanceMetric.timestamp)
+    window = (
+        (PerformanceMetric.user_id == user_id) &
+        (PerformanceMetric.category == category) &
+        (PerformanceMetric.timestamp >= since)
+    )
+    if name is not None:
+        window &= PerformanceMetric.name == name
+
+    if how == "max":
+        stmt = select(day.label("day"), func.max(PerformanceMetric.value), PerformanceMetric.reps).where(window)
+        stmt = stmt.group_by(day, PerformanceMetric.reps).order_by(day)
+    else:
+        latest_first = func.row_number().over(partition_by=day, order_by=PerformanceMetric.timestamp.desc())
+        ranked = select(
+            day.label("day"), PerformanceMetric.value, PerformanceMetric.reps, latest_first.label("rank")
+        ).where(window).subquery()
+        stmt = select(ranked.c.day, ranked.c.value, ranked.c.reps).where(ranked.c.rank == 1).order_by(ranked.c.day)
+    rows = (await db.execute(stmt)).all()
+
+    days, values, reps = zip(*rows) if rows else ((), (), ())
+    return Series(
+        timestamps=np.array([str(d) for d in days], dtype="datetime64[us]"),
+        values=np.array(values, dtype=np.float64),
+        reps=np.array([np.nan if r is None else r for r in reps], dtype=np.float64),
+    )
+
+
+# --- Estimated 1RM ---
+
+def epley(weight: np.ndarray, reps: np.ndarray) -> np.ndarray:
+    """weight * (1 + reps / 30); a single (or unrecorded) rep is the weight itself."""
+    weight = np.asarray(weight, dtype=np.float64)
+    reps = np.nan_to_num(np.asarray(reps, dtype=np.float64), nan=1.0)
+    return np.where(reps > 1, weight * (1 + reps / 30), weight)
+
+
+def brzycki(weight: np.ndarray, reps: np.ndarray) -> np.ndarray:
+    """weight * 36 / (37 - reps); the formula diverges near 37 reps, so reps are capped at 36."""
+    weight = np.asarray(weight, dtype=np.float64)
+    reps = np.clip(np.nan_to_num(np.asarray(reps, dtype=np.float64), nan=1.0), 1, 36)
+    return np.where(reps > 1, weight * 36 / (37 - reps), weight)
+
+
+E1RM_FORMULAS = {"epley": epley, "brzycki": brzycki}
+
+
+# --- Windowing ---
+
+def daily(timestamps: np.ndarray, values: np.ndarray, how: str = "last"):
+    """Collapses an ascending series to one value per day. Returns (days, values)."""
+    days = timestamps.astype("datetime64[D]")
+    unique_days, starts = np.unique(days, return_index=True)
+    if how == "max":
+        return unique_days, np.maximum.reduceat(values, starts)
+    ends = np.append(starts[1:], len(values)) - 1
+    return unique_days, values[ends]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over up to `window` points (shorter at the start), via one cumsum."""
+    if len(values) == 0:
+        return values
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (cumsum[idx] - cumsum[lo]) / (idx - lo)
+
+
+def linear_trend(days: np.ndarray, values: np.ndarray) -> float:
+    """Least-squares slope in units per day (0.0 with fewer than two days)."""
+    if len(values) < 2:
+        return 0.0
+    x = (days - days[0]).astype(np.float64)
+    x_mean = x.mean()
+    denom = np.sum((x - x_mean) ** 2)
+    if denom == 0:
+        return 0.0
+    return float(np.sum((x - x_mean) * (values - values.mean())) / denom)
+
+
+def trend_label(slope_per_day: float, values: np.ndarray) -> str:
+    scale = abs(float(values.mean())) if len(values) else 0.0
+    if scale == 0 or abs(slope_per_day * 7) < STABLE_FRACTION_PER_WEEK * scale:
+        return "stable"
+    return "up" if slope_per_day > 0 else "down"
+
+
+def percentiles(values: np.ndarray, qs: Sequence[int] = (10, 50, 90)) -> Dict[str, float]:
+    if len(values) == 0:
+        return {}
+    return {f"p{q}": float(v) for q, v in zip(qs, np.percentile(values, qs))}
+
+
+def summarize(timestamps: np.ndarray, values: np.ndarray, how: str = "last", window: int = 7) -> dict:
+    """Daily history with a rolling average, latest value, regression trend and percentiles."""
+    if len(values) == 0:
+        return {"latest": 0.0, "history": [], "slope_per_week": 0.0, "trend": "stable", "percentiles": {}}
+
+    days, day_values = daily(timestamps, values, how=how)
+    rolling = rolling_mean(day_values, window)
+    slope = linear_trend(days, day_values)
+    history = [
+        {"date": str(day), "value": round(float(value), 2), "rolling_avg": round(float(avg), 2)}
+        for day, value, avg in zip(days, day_values, rolling)
+    ]
+    return {
+        "latest": float(day_values[-1]),
+        "history": history,
+        "slope_per_week": round(slope * 7, 3),
+        "trend": trend_label(slope, day_values),
+        "percentiles": percentiles(day_values),
+    }
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import uuid
 
@@ -9,6 +9,7 @@ from app.database import get_db
 from app.models import PerformanceMetric, User
 from app.auth import get_current_user, AuthenticatedUser
 from app.schema import MetricCreate, MetricResponse
+from app.user_state import record_metric
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -28,12 +29,14 @@ async def log_metric(
         name=metric_in.name,
         value=metric_in.value,
         unit=metric_in.unit,
+        reps=metric_in.reps,
         notes=metric_in.notes,
         logged_by=current_user.uid,
         timestamp=metric_in.timestamp or datetime.utcnow()
     )
     
     db.add(new_metric)
+    await record_metric(db, new_metric)
     await db.commit()
     await db.refresh(new_metric)
     
@@ -58,72 +61,78 @@ async def get_metrics(
 
 # --- Aggregators ---
 
+from fastapi import Query
+from datetime import timedelta
+from app.aggregation import DEFAULT_WINDOW_DAYS, E1RM_FORMULAS, load_series, summarize
 from app.schema import StrengthMetric, EngineMetric, ReadinessMetric
 
+def window_start(days: int) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
+
 @router.get("/strength", response_model=StrengthMetric)
 async def get_strength_analytics(
+    exercise: Optional[str] = None,
+    formula: str = Query("epley", pattern="^(epley|brzycki)$"),
+    days: int = Query(DEFAULT_WINDOW_DAYS, ge=1, le=3650),
     current_user: AuthenticatedUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Returns aggregated Strength data (e.g. Squat 1RM trend).
+    Returns aggregated Strength data: daily best estimated 1RM for one exercise
+    (default: the most recently logged one), rolling average, trend and percentiles.
     """
-    # 1. Fetch 'strength' metrics
-    stmt = select(PerformanceMetric).where(
-        (PerformanceMetric.user_id == current_user.uid) & 
-        (PerformanceMetric.category == 'strength')
-    ).order_by(PerformanceMetric.timestamp.asc())
-    
-    result = await db.execute(stmt)
-    logs = result.scalars().all()
+    if exercise is None:
+        stmt = select(PerformanceMetric.name).where(
+            (PerformanceMetric.user_id == current_user.uid) & 
+            (PerformanceMetric.category == 'strength')
+        ).order_by(PerformanceMetric.timestamp.desc()).limit(1)
+        exercise = (await db.execute(stmt)).scalar_one_or_none()
     
-    # 2. Mock/Calculate Logic (MVP: Just take the latest 'Squat' or similar)
-    if not logs:
-        return StrengthMetric(estimated_1rm=0, exercise="Squat", trend="stable", history=[])
-        
-    history = [{"date": m.timestamp.strftime("%Y-%m-%d"), "value": m.value} for m in logs]
-    latest = logs[-1].value
+    if exercise is None:
+        return StrengthMetric(estimated_1rm=0, exercise="Squat", trend="stable", history=[], formula=formula)
     
-    # Simple Trend
-    trend = "stable"
-    if len(logs) >= 2:
-        prev = logs[-2].value
-        if latest > prev: trend = "up"
-        elif latest < prev: trend = "down"
+    series = await load_series(db, current_user.uid, 'strength', name=exercise, since=window_start(days), how="max")
+    e1rm = E1RM_FORMULAS[formula](series.values, series.reps)
+    summary = summarize(series.timestamps, e1rm, how="max")
             
     return StrengthMetric(
-        estimated_1rm=latest,
-        exercise=logs[-1].name or "Compound",
-        trend=trend,
-        history=history
+        estimated_1rm=round(summary["latest"], 1),
+        exercise=exercise,
+        trend=summary["trend"],
+        history=summary["history"],
+        formula=formula,
+        slope_per_week=summary["slope_per_week"],
+        percentiles=summary["percentiles"]
     )
 
 @router.get("/engine", response_model=EngineMetric)
 async def get_engine_analytics(
+    days: int = Query(DEFAULT_WINDOW_DAYS, ge=1, le=3650),
     current_user: AuthenticatedUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Returns Engine capacity (FTP/Run Pace).
     """
-    stmt = select(PerformanceMetric).where(
-        (PerformanceMetric.user_id == current_user.uid) & 
-        (PerformanceMetric.category == 'engine')
-    ).order_by(PerformanceMetric.timestamp.asc())
-    
-    result = await db.execute(stmt)
-    logs = result.scalars().all()
+    series = await load_series(db, current_user.uid, 'engine', since=window_start(days))
     
-    if not logs:
+    if not len(series):
         return EngineMetric(ftp=0, vo2_max=None, history=[])
     
-    history = [{"date": m.timestamp.strftime("%Y-%m-%d"), "value": m.value} for m in logs]
-    latest = logs[-1].value
+    summary = summarize(series.timestamps, series.values)
     
-    return EngineMetric(ftp=latest, vo2_max=None, history=history)
+    return EngineMetric(
+        ftp=summary["latest"],
+        vo2_max=None,
+        history=summary["history"],
+        trend=summary["trend"],
+        slope_per_week=summary["slope_per_week"],
+        percentiles=summary["percentiles"]
+    )
 
 @router.get("/readiness", response_model=ReadinessMetric)
 async def get_readiness_analytics(
+    days: int = Query(DEFAULT_WINDOW_DAYS, ge=1, le=3650),
     current_user: AuthenticatedUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -132,23 +141,36 @@ async def get_readiness_analytics(
     """
     # For MVP, we might look for daily logs or specific metrics
     # Here we assume 'readiness' category metrics are logged (0-100)
-    stmt = select(PerformanceMetric).where(
-        (PerformanceMetric.user_id == current_user.uid) & 
-        (PerformanceMetric.category == 'readiness')
-    ).order_by(PerformanceMetric.timestamp.asc())
-    
-    result = await db.execute(stmt)
-    logs = result.scalars().all()
+    series = await load_series(db, current_user.uid, 'readiness', since=window_start(days))
     
-    if not logs:
+    if not len(series):
         return ReadinessMetric(score=85, hrv=0, sleep_score=0, history=[])
-        
-    history = [{"date": m.timestamp.strftime("%Y-%m-%d"), "value": m.value} for m in logs]
-    latest_score = int(logs[-1].value)
+    
+    summary = summarize(series.timestamps, series.values)
     
     return ReadinessMetric(
-        score=latest_score,
+        score=int(summary["latest"]),
         hrv=0, # Placeholder if not logging specific HRV
         sleep_score=0,
-        history=history
+        history=summary["history"],
+        trend=summary["trend"],
+        slope_per_week=summary["slope_per_week"],
+        percentiles=summary["percentiles"]
     )
+
+from app.biometrics import metric_trend
+from app.schema import BiometricBucket
+
+@router.get("/biometrics", response_model=List[BiometricBucket])
+async def get_biometric_trend(
+    metric: str = "recovery",
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    days: int = Query(30, ge=1, le=365),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Wearable trend (e.g. recovery per day) straight from the hourly/daily rollups.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    return await metric_trend(db, current_user.uid, metric, bucket=bucket, since=since)
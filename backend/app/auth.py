@@ -5,10 +5,15 @@ Provides:
 - Firebase Admin SDK initialization
 - Token verification dependency for FastAPI
 - Role-based access control
+- Local ID token verification (app.token_verifier) with the Admin SDK as fallback
+- Verified-token and user-row caches (auth off the hot path of dashboard polls)
 """
+import asyncio
+import hashlib
 import os
+import time
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -16,9 +21,11 @@ from sqlalchemy import select
 import firebase_admin
 from firebase_admin import credentials, auth as firebase_auth
 
+from app.cache import TTLCache
 from app.config import settings, logger
 from app.database import get_db
 from app.models import User
+from app.token_verifier import FirebaseTokenVerifier, InvalidTokenError, UnknownSigningKeyError
 
 # Initialize Firebase Admin SDK
 # IMPORTANT: The backend runs on GCP project "blackcard-concierge-ai" (557456081985)
@@ -26,6 +33,9 @@ from app.models import User
 # We must explicitly tell the Admin SDK which project to verify tokens against.
 FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "blackcard-concierge")
 
+# In-process verifier; keys are refreshed in the background (started in app lifespan)
+token_verifier = FirebaseTokenVerifier(FIREBASE_PROJECT_ID)
+
 _firebase_app = None
 
 def get_firebase_app():
@@ -55,6 +65,73 @@ def get_firebase_app():
 # Security scheme
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# sha256(token) -> decoded claims; each entry expires with the token itself
+_token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_MAX_SECONDS)
+# uid -> users row snapshot (column values); invalidated on role changes
+_user_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+TOKEN_EXPIRY_LEEWAY_SECONDS = 30
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+async def verify_token(token: str) -> dict:
+    """
+    Verifies a Firebase ID token, reusing earlier verifications until the token's `exp`.
+    Uses the local verifier once its keys are loaded; otherwise (cold start, or a kid
+    from a rotation we haven't fetched yet) the SDK call runs in a worker thread.
+    Failures are never cached.
+    """
+    key = _token_key(token)
+    decoded = _token_cache.get(key)
+    if decoded is not None:
+        return decoded
+
+    decoded = None
+    if settings.AUTH_LOCAL_VERIFY and token_verifier.ready:
+        try:
+            decoded = token_verifier.verify(token)
+        except UnknownSigningKeyError:
+            token_verifier.request_refresh()
+    if decoded is None:
+        decoded = await asyncio.to_thread(firebase_auth.verify_id_token, token)
+
+    exp = decoded.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(exp - time.time() - TOKEN_EXPIRY_LEEWAY_SECONDS, _token_cache.ttl)
+        if ttl > 0:
+            _token_cache.set(key, decoded, ttl=ttl)
+    return decoded
+
+
+def _snapshot_user(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+async def get_user_row(db: AsyncSession, uid: str) -> Optional[User]:
+    """
+    Looks up a users row through a short-TTL cache. Cache hits return a fresh
+    transient User (not bound to any session) built from the stored snapshot.
+    """
+    snapshot = _user_cache.get(uid)
+    if snapshot is not None:
+        return User(**snapshot)
+
+    result = await db.execute(select(User).where(User.id == uid))
+    db_user = result.scalar_one_or_none()
+    if db_user is not None:
+        _user_cache.set(uid, _snapshot_user(db_user))
+    return db_user
+
+
+def invalidate_user(uid: Optional[str] = None):
+    """Drops one cached users row, or all of them."""
+    if uid is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(uid)
+
 class AuthenticatedUser:
     """Represents the authenticated user from Firebase + DB lookup."""
     def __init__(self, uid: str, email: Optional[str], role: str, db_user: Optional[User] = None):
@@ -143,13 +220,13 @@ async def get_current_user(
     # Verify Firebase token
     try:
         get_firebase_app()  # Ensure initialized
-        decoded_token = firebase_auth.verify_id_token(token)
+        decoded_token = await verify_token(token)
         uid = decoded_token["uid"]
         email = decoded_token.get("email")
         
         logger.info(f"Authenticated Firebase user: {uid}")
         
-    except firebase_admin.exceptions.FirebaseError as e:
+    except (firebase_admin.exceptions.FirebaseError, InvalidTokenError) as e:
         logger.warning(f"Firebase auth failed: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -172,9 +249,7 @@ async def get_current_user(
         )
     
     # Look up user in database
-    stmt = select(User).where(User.id == uid)
-    result = await db.execute(stmt)
-    db_user = result.scalar_one_or_none()
+    db_user = await get_user_row(db, uid)
     
     # Auto-create user on first login
     if db_user is None:
@@ -216,6 +291,21 @@ async def get_current_user_optional(
         return None
 
 
+async def get_current_user_stream(
+    token: Optional[str] = Query(None),
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    api_key: Optional[str] = Header(None, alias="X-Elite-Key"),
+    db: AsyncSession = Depends(get_db)
+) -> AuthenticatedUser:
+    """
+    Auth for Server-Sent Events. Browsers' EventSource cannot set headers,
+    so the ID token may also arrive as a `token` query parameter.
+    """
+    if credentials is None and token:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return await get_current_user(credentials, api_key, db)
+
+
 def require_role(*allowed_roles: str):
     """
     Dependency factory that requires specific roles.
@@ -0,0 +1,180 @@
+"""
+Biometric time-series for Elite Concierge AI.
+
+Provides:
+- extract_samples: typed (user, metric, ts, value) readings from wearable / Terra event payloads
+- record_samples: inserts readings and incrementally upserts hourly + daily rollups
+  (and the user_state recovery projection) in the caller's transaction
+- latest_value / metric_trend: index lookups on the rollups (no JSON scanning)
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, select
+
+from app.config import logger
+from app.database import dialect_insert
+from app.models import BiometricRollup, BiometricSample
+from app.user_state import record_recovery
+
+BUCKETS = ("hour", "day")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _parse_ts(value: Any, default: datetime) -> datetime:
+    """ISO-8601 (with or without offset) -> naive UTC, like the rest of the schema."""
+    if not isinstance(value, str):
+        return default
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return default
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def extract_samples(user_id: str, event_type: str, payload: dict, created_at: Optional[datetime] = None) -> List[dict]:
+    """Pulls numeric readings out of an events payload; unknown shapes yield nothing."""
+    created_at = created_at or datetime.utcnow()
+    samples = []
+
+    if event_type == "wearable":
+        # WearableEvent: recovery_score plus any flat numeric extras in `data` (hrv, resting_hr, ...)
+        source = payload.get("device_type") or ""
+        if _is_number(payload.get("recovery_score")):
+            samples.append({"metric": "recovery", "value": payload["recovery_score"], "ts": created_at, "source": source})
+        for metric, value in (payload.get("data") or {}).items():
+            if _is_number(value):
+                samples.append({"metric": metric, "value": value, "ts": created_at, "source": source})
+
+    elif isinstance(payload.get("data"), list):
+        # Terra rows: {"type", "user": {"provider", ...}, "data": [{"metadata": {"end_time"}, "scores": {...}}]}
+        source = (payload.get("user") or {}).get("provider") or "terra"
+        for sample in payload.get("data") or []:
+            if not isinstance(sample, dict):
+                continue
+            ts = _parse_ts((sample.get("metadata") or {}).get("end_time"), created_at)
+            for metric, value in (sample.get("scores") or {}).items():
+                if _is_number(value):
+                    samples.append({"metric": metric, "value": value, "ts": ts, "source": source})
+
+    for sample in samples:
+        sample["user_id"] = user_id
+        sample["value"] = float(sample["value"])
+    return samples
+
+
+def _bucket_start(ts: datetime, bucket: str) -> datetime:
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _rollup_rows(readings) -> List[dict]:
+    """Pre-aggregates a batch so each rollup row is upserted once per statement."""
+    groups: Dict[tuple, dict] = {}
+    for user_id, metric, ts, value in readings:
+        for bucket in BUCKETS:
+            key = (user_id, metric, bucket, _bucket_start(ts, bucket))
+            row = groups.get(key)
+            if row is None:
+                groups[key] = {
+                    "user_id": user_id, "metric": metric, "bucket": bucket, "bucket_start": key[3],
+                    "count": 1, "sum": value, "min": value, "max": value, "last_value": value, "last_ts": ts,
+                }
+                continue
+            row["count"] += 1
+            row["sum"] += value
+            row["min"] = min(row["min"], value)
+            row["max"] = max(row["max"], value)
+            if ts >= row["last_ts"]:
+                row["last_value"], row["last_ts"] = value, ts
+    # Consistent lock order across concurrent writers
+    return [groups[key] for key in sorted(groups)]
+
+
+async def record_samples(session, samples: List[dict]) -> int:
+    """
+    Writes readings and folds the newly inserted ones into the hour/day rollups.
+    Runs in the caller's transaction (no commit). Returns the number of new readings.
+    """
+    if not samples:
+        return 0
+    postgres = session.bind.dialect.name == "postgresql"
+
+    insert_samples = (
+        dialect_insert(session, BiometricSample)
+        .on_conflict_do_nothing(index_elements=["user_id", "metric", "ts", "source"])
+        .returning(BiometricSample.user_id, BiometricSample.metric, BiometricSample.ts, BiometricSample.value)
+    )
+    inserted = (await session.execute(insert_samples, samples)).all()
+    if not inserted:
+        return 0
+
+    table = BiometricRollup.__table__
+    upsert = dialect_insert(session, BiometricRollup)
+    excluded = upsert.excluded
+    least, greatest = (func.least, func.greatest) if postgres else (func.min, func.max)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["user_id", "metric", "bucket", "bucket_start"],
+        set_={
+            "count": table.c["count"] + excluded["count"],
+            "sum": table.c["sum"] + excluded["sum"],
+            "min": least(table.c["min"], excluded["min"]),
+            "max": greatest(table.c["max"], excluded["max"]),
+            "last_value": case(
+                (excluded["last_ts"] >= table.c["last_ts"], excluded["last_value"]),
+                else_=table.c["last_value"],
+            ),
+            "last_ts": greatest(table.c["last_ts"], excluded["last_ts"]),
+        },
+    )
+    await session.execute(upsert, _rollup_rows(inserted))
+    await record_recovery(session, inserted)
+    logger.info(f"Biometrics: Recorded {len(inserted)} readings ({len(samples) - len(inserted)} duplicates)")
+    return len(inserted)
+
+
+# --- Queries (rollups only) ---
+
+async def latest_value(conn, user_id: str, metric: str) -> Optional[float]:
+    """Most recent reading of a metric, from the newest daily bucket."""
+    stmt = select(BiometricRollup.last_value).where(
+        BiometricRollup.user_id == user_id,
+        BiometricRollup.metric == metric,
+        BiometricRollup.bucket == "day",
+    ).order_by(BiometricRollup.bucket_start.desc()).limit(1)
+    return (await conn.execute(stmt)).scalar_one_or_none()
+
+
+async def metric_trend(
+    conn,
+    user_id: str,
+    metric: str,
+    bucket: str = "day",
+    since: Optional[datetime] = None,
+) -> List[dict]:
+    """Per-bucket avg/min/max/last, oldest first; one primary-key range scan."""
+    stmt = select(BiometricRollup).where(
+        BiometricRollup.user_id == user_id,
+        BiometricRollup.metric == metric,
+        BiometricRollup.bucket == bucket,
+    )
+    if since is not None:
+        stmt = stmt.where(BiometricRollup.bucket_start >= _bucket_start(since, bucket))
+    rows = (await conn.execute(stmt.order_by(BiometricRollup.bucket_start.asc()))).scalars().all()
+    return [
+        {
+            "bucket_start": row.bucket_start,
+            "avg": row.sum / row.count,
+            "min": row.min,
+            "max": row.max,
+            "last": row.last_value,
+            "count": row.count,
+        }
+        for row in rows
+    ]
@@ -20,6 +20,25 @@ class Settings(BaseSettings):
     PROJECT_ID: str = os.getenv("PROJECT_ID", "")
     GCP_REGION: str = "europe-west2"
     GEMINI_MODEL_ID: str = "gemini-2.5-flash"
+    LLM_TIMEOUT_SECONDS: float = 30.0  # Per-call cap on a single Gemini generation
+    LLM_MAX_CONCURRENCY: int = 8  # Max in-flight Gemini calls per worker
+
+    # RAG
+    EMBEDDING_MODEL_ID: str = "text-embedding-004"
+    EMBEDDING_CACHE_SIZE: int = 1024  # In-process query embeddings per worker
+    EMBEDDING_CACHE_TTL_SECONDS: float = 86400.0
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "")  # SQLite file; empty disables the disk tier
+    RAG_CACHE_SIZE: int = 256  # Cached retrieve_protocol results per worker
+    RAG_CACHE_TTL_SECONDS: float = 300.0  # Bounds staleness when ingest NOTIFYs don't arrive (memory event bus)
+
+    # pgvector ANN index on document_chunks.embedding ("hnsw", "ivfflat" or "none")
+    RAG_VECTOR_INDEX: str = "hnsw"
+    RAG_HNSW_M: int = 16
+    RAG_HNSW_EF_CONSTRUCTION: int = 64
+    RAG_HNSW_EF_SEARCH: int = 40  # Search-time candidate list; higher = better recall, slower
+    RAG_HNSW_ITERATIVE_SCAN: str = ""  # "off"/"strict_order"/"relaxed_order" (pgvector >= 0.8); empty = server default
+    RAG_IVFFLAT_LISTS: int = 100  # Rule of thumb: rows / 1000 (up to 1M rows)
+    RAG_IVFFLAT_PROBES: int = 10  # Lists scanned per query; higher = better recall, slower
 
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
@@ -28,18 +47,75 @@ class Settings(BaseSettings):
     DB_NAME: str = os.getenv("DB_NAME", "concierge_db")
     DB_PASS: str = os.getenv("DB_PASS", "") # Injected via Secret
 
+    # Trainer -> client roster cache (app.users.get_trainer_client_ids)
+    ROSTER_CACHE_SIZE: int = 1024
+    ROSTER_CACHE_TTL_SECONDS: float = 60.0  # Safety net for changes made on other instances
+
+    # Live event stream (/events/stream)
+    EVENT_BUS_BACKEND: str = "memory"  # "memory" (single instance) or "postgres" (LISTEN/NOTIFY across instances)
+    EVENT_STREAM_QUEUE_SIZE: int = 100  # Buffered events per subscriber before oldest are dropped
+    EVENT_STREAM_HEARTBEAT_SECONDS: float = 15.0
+
     # Auth
     ELITE_API_KEY: str = os.getenv("ELITE_API_KEY", "dev-secret-123")
     TERRA_API_SECRET: str = os.getenv("TERRA_API_SECRET", "terra-secret-placeholder")
+    TERRA_SIGNATURE_TOLERANCE_SECONDS: float = 300.0  # Replay window for terra-signature timestamps
     
     # Firebase Auth
     FIREBASE_CREDENTIALS_JSON: str = os.getenv("FIREBASE_CREDENTIALS_JSON", "")
+    AUTH_LOCAL_VERIFY: bool = True  # Verify ID tokens in-process against cached Google JWKS
+    AUTH_TOKEN_CACHE_SIZE: int = 4096  # Verified ID tokens per worker
+    AUTH_TOKEN_CACHE_MAX_SECONDS: float = 600.0  # Re-verify at least this often (also capped by token exp)
+    AUTH_USER_CACHE_SIZE: int = 4096
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0  # Bounds role staleness across instances
     
     # Twilio (WhatsApp)
     TWILIO_ACCOUNT_SID: str = os.getenv("TWILIO_ACCOUNT_SID", "")
     TWILIO_AUTH_TOKEN: str = os.getenv("TWILIO_AUTH_TOKEN", "")
     TWILIO_WHATSAPP_NUMBER: str = os.getenv("TWILIO_WHATSAPP_NUMBER", "")
 
+    # Push notifications (app.notifications.notifier)
+    NOTIFY_BATCH_WINDOW_SECONDS: float = 0.5  # Coalescing window before one send_each call
+    NOTIFY_DEDUPE_WINDOW_SECONDS: float = 300.0  # Repeat RED alerts per user are dropped within this window
+    NOTIFY_MAX_ATTEMPTS: int = 3
+
+    # Bulk ingestion (app.ingest group commit for Terra samples)
+    INGEST_BATCH_MAX_ROWS: int = 2000  # Flush as soon as this many rows are buffered
+    INGEST_BATCH_MAX_DELAY_SECONDS: float = 0.01  # ...or after this long; bounds added latency per delivery
+
+    # Inbound WhatsApp processing (ack-then-process; app.webhooks.whatsapp_queue)
+    WHATSAPP_WORKERS: int = 4  # Concurrent agent runs; one sender's messages are handled in order
+    WHATSAPP_QUEUE_SIZE: int = 500
+
+    # Media uploads (app.media; multipart, spooled to a temp file)
+    MEDIA_MAX_IMAGE_BYTES: int = 10 * 1024 * 1024
+    MEDIA_MAX_VIDEO_BYTES: int = 50 * 1024 * 1024  # Form-check clips; Gemini inline data tops out around here
+
+    # Vision result cache (app.vision_cache; keyed by media hash + model + prompt version)
+    VISION_CACHE_SIZE: int = 512  # In-memory LRU entries per instance
+    VISION_CACHE_MEMORY_TTL_SECONDS: float = 24 * 3600
+    VISION_CACHE_DB_TTL_SECONDS: float = 30 * 24 * 3600  # vision_cache rows older than this are recomputed
+
+    # Image pre-processing before vision calls (app.image_prep; needs Pillow)
+    IMAGE_PREP_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1536  # Longest side sent to Gemini, in pixels
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PREP_WORKERS: int = 2  # Worker processes for decode/resize/encode
+
+    # Form-check video (app.keyframes; sampling needs OpenCV)
+    FORM_VIDEO_MODE: str = "full"  # "full" (whole clip inline), "fixed" (FORM_SAMPLE_FPS) or "motion"
+    FORM_SAMPLE_FPS: float = 2.0
+    FORM_MAX_FRAMES: int = 16  # Upper bound on frames sent per clip, in any sampled mode
+    FORM_FRAME_MAX_EDGE: int = 768  # Longest side of each frame, in pixels
+    FORM_MOTION_THRESHOLD: float = 12.0  # Mean grayscale change (0-255) that makes a new keyframe
+
+    # Outbound messaging queue (app.messaging.outbox)
+    MESSAGING_WORKERS: int = 4  # Parallel senders; one recipient's messages always share a worker
+    MESSAGING_QUEUE_SIZE: int = 1000
+    MESSAGING_MAX_ATTEMPTS: int = 5
+    MESSAGING_SEND_TIMEOUT_SECONDS: float = 10.0
+    MESSAGING_DRAIN_TIMEOUT_SECONDS: float = 10.0  # Time allowed on shutdown to flush queued sends (and pending WhatsApp jobs)
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
+import re
 from app.config import settings, logger
 
 # Create Base for models
@@ -50,6 +51,12 @@ async def create_tables():
             # 1. Standard SQLAlchemy create
             await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
             await conn.run_sync(Base.metadata.create_all)
+            await ensure_vector_index(conn)
+            await ensure_tag_index(conn)
+            await ensure_chunk_hash_column(conn)
+            await ensure_event_indexes(conn)
+            await ensure_event_external_id(conn)
+            await ensure_performance_metric_reps(conn)
             
             # 2. Manual migration: Add 'is_traveling' if missing
             try:
@@ -61,3 +68,189 @@ async def create_tables():
             except Exception as e:
                 # If column exists or other error, log it but don't crash
                 logger.warning(f"Note: Table migration check skipped/failed: {e}")
+
+
+VECTOR_INDEX_NAMES = {
+    "hnsw": "ix_document_chunks_embedding_hnsw",
+    "ivfflat": "ix_document_chunks_embedding_ivfflat",
+}
+
+HNSW_ITERATIVE_SCAN_MODES = {"off", "strict_order", "relaxed_order"}
+
+def vector_index_options() -> dict:
+    """Build parameters the configured ANN index should have (as pg_indexes reports them)."""
+    index_type = settings.RAG_VECTOR_INDEX.lower()
+    if index_type == "hnsw":
+        return {"m": str(int(settings.RAG_HNSW_M)), "ef_construction": str(int(settings.RAG_HNSW_EF_CONSTRUCTION))}
+    if index_type == "ivfflat":
+        return {"lists": str(int(settings.RAG_IVFFLAT_LISTS))}
+    return {}
+
+def parse_index_options(indexdef: str) -> dict:
+    """`... WITH (m='16', ef_construction='64')` -> {"m": "16", "ef_construction": "64"}."""
+    match = re.search(r"\bWITH \((.*)\)\s*$", indexdef or "")
+    if not match:
+        return {}
+    return {key.strip(): value.strip().strip("'") for key, value in
+            (option.split("=", 1) for option in match.group(1).split(",") if "=" in option)}
+
+async def ensure_vector_index(conn) -> bool:
+    """
+    Creates the ANN index selected by RAG_VECTOR_INDEX on document_chunks.embedding
+    and drops the alternative, so switching index types is a config change.
+    An existing index built with other parameters (m, ef_construction, lists) is rebuilt.
+    """
+    index_type = settings.RAG_VECTOR_INDEX.lower()
+    try:
+        # Savepoint: a failure here must not abort the surrounding migration transaction
+        async with conn.begin_nested():
+            for name_type, index_name in VECTOR_INDEX_NAMES.items():
+                if name_type != index_type:
+                    await conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+            index_name = VECTOR_INDEX_NAMES.get(index_type)
+            if index_name:
+                wanted = vector_index_options()
+                result = await conn.execute(
+                    text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"), {"name": index_name}
+                )
+                indexdef = result.scalar()
+                if indexdef is not None and parse_index_options(indexdef) != wanted:
+                    # CREATE INDEX IF NOT EXISTS would silently keep the old build parameters
+                    logger.warning(f"Rebuilding {index_name}: {parse_index_options(indexdef)} -> {wanted}")
+                    await conn.execute(text(f"DROP INDEX {index_name}"))
+
+                # IVFFlat centroids come from existing rows: build after the initial ingest
+                # and rebuild (rebuild_vector_index) once the corpus has grown substantially.
+                options = ", ".join(f"{key} = {value}" for key, value in wanted.items())
+                await conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} "
+                    f"ON document_chunks USING {index_type} (embedding vector_cosine_ops) WITH ({options})"
+                ))
+        logger.info(f"Database Migration Check: vector index '{index_type}' verified.")
+        return True
+    except Exception as e:
+        logger.warning(f"Note: Vector index check skipped/failed: {e}")
+        return False
+
+async def ensure_tag_index(conn) -> bool:
+    """
+    Converts document_chunks.tags from JSON to JSONB (older deployments) and adds the
+    GIN index that serves tag pre-filtering (`?|` / `@>`) ahead of the vector sort.
+    """
+    try:
+        async with conn.begin_nested():
+            result = await conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'document_chunks' AND column_name = 'tags'"
+            ))
+            if result.scalar() == "json":
+                await conn.execute(text(
+                    "ALTER TABLE document_chunks ALTER COLUMN tags TYPE JSONB USING tags::jsonb"
+                ))
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_document_chunks_tags_gin ON document_chunks USING gin (tags)"
+            ))
+        logger.info("Database Migration Check: tags JSONB + GIN index verified.")
+        return True
+    except Exception as e:
+        logger.warning(f"Note: Tag index check skipped/failed: {e}")
+        return False
+
+async def apply_schema_statements(conn, label: str, statements) -> bool:
+    """
+    Runs idempotent DDL in a savepoint so a failure doesn't abort the surrounding migration.
+    Returns whether it applied (failures are only logged).
+    """
+    try:
+        async with conn.begin_nested():
+            for statement in statements:
+                await conn.execute(text(statement))
+        logger.info(f"Database Migration Check: {label} verified/added.")
+        return True
+    except Exception as e:
+        logger.warning(f"Note: {label} migration skipped/failed: {e}")
+        return False
+
+async def ensure_chunk_hash_column(conn) -> bool:
+    """Adds document_chunks.content_hash + its unique index (ON CONFLICT target for ingestion)."""
+    return await apply_schema_statements(conn, "document_chunks.content_hash", [
+        "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_document_chunks_source_hash ON document_chunks (source, content_hash)",
+    ])
+
+async def ensure_event_indexes(conn) -> bool:
+    """Indexes for the events feed: per-user history (keyset paging) and per-type scans."""
+    return await apply_schema_statements(conn, "events indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_events_user_created ON events (user_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_events_type_created ON events (event_type, created_at)",
+    ])
+
+async def ensure_event_external_id(conn) -> bool:
+    """Adds events.external_id, unique so provider redeliveries are ingested once."""
+    return await apply_schema_statements(conn, "events.external_id", [
+        "ALTER TABLE events ADD COLUMN IF NOT EXISTS external_id VARCHAR",
+        "CREATE UNIQUE INDEX IF NOT EXISTS events_external_id_key ON events (external_id)",
+    ])
+
+async def ensure_performance_metric_reps(conn) -> bool:
+    """Adds performance_metrics.reps (e1RM inputs) and the per-category analytics index."""
+    return await apply_schema_statements(conn, "performance_metrics.reps", [
+        "ALTER TABLE performance_metrics ADD COLUMN IF NOT EXISTS reps INTEGER",
+        "CREATE INDEX IF NOT EXISTS ix_performance_metrics_user_category_ts ON performance_metrics (user_id, category, timestamp)",
+    ])
+
+async def backfill_user_state(conn) -> bool:
+    """Seeds the user_state projection from users + recovery rollups (rows written later keep it current)."""
+    return await apply_schema_statements(conn, "user_state backfill", [
+        """
+        INSERT INTO user_state (user_id, is_traveling, coach_style, updated_at)
+        SELECT id, is_traveling, coach_style, now() FROM users
+        ON CONFLICT (user_id) DO UPDATE SET
+            is_traveling = EXCLUDED.is_traveling, coach_style = EXCLUDED.coach_style
+        WHERE user_state.is_traveling IS NULL
+        """,
+        """
+        INSERT INTO user_state (user_id, recovery, recovery_ts, updated_at)
+        SELECT DISTINCT ON (user_id) user_id, last_value, last_ts, now() FROM biometric_rollups
+        WHERE metric = 'recovery' AND bucket = 'day'
+        ORDER BY user_id, bucket_start DESC
+        ON CONFLICT (user_id) DO UPDATE SET
+            recovery = EXCLUDED.recovery, recovery_ts = EXCLUDED.recovery_ts
+        WHERE user_state.recovery_ts IS NULL
+        """,
+    ])
+
+def dialect_insert(session, model):
+    """INSERT construct with ON CONFLICT support for the session's backend (Postgres, or SQLite in tests)."""
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+async def rebuild_vector_index(conn):
+    """Rebuilds the active ANN index (needed for IVFFlat after large corpus changes)."""
+    index_name = VECTOR_INDEX_NAMES.get(settings.RAG_VECTOR_INDEX.lower())
+    if index_name:
+        await conn.execute(text(f"REINDEX INDEX {index_name}"))
+        logger.info(f"Rebuilt vector index {index_name}")
+
+async def apply_vector_search_settings(session: AsyncSession):
+    """
+    Applies ANN search knobs for the current transaction (SET LOCAL), so they
+    only affect the retrieval query that follows on this session.
+    """
+    if session.bind is None or session.bind.dialect.name != "postgresql":
+        return
+    index_type = settings.RAG_VECTOR_INDEX.lower()
+    if index_type == "hnsw":
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.RAG_HNSW_EF_SEARCH)}"))
+        iterative_scan = settings.RAG_HNSW_ITERATIVE_SCAN.lower()
+        if iterative_scan in HNSW_ITERATIVE_SCAN_MODES:
+            # pgvector >= 0.8: keep walking the graph until enough rows pass the tag filter
+            await session.execute(text(f"SET LOCAL hnsw.iterative_scan = {iterative_scan}"))
+        elif iterative_scan:
+            logger.warning(f"Ignoring RAG_HNSW_ITERATIVE_SCAN={iterative_scan!r} (expected one of {sorted(HNSW_ITERATIVE_SCAN_MODES)})")
+    elif index_type == "ivfflat":
+        await session.execute(text(f"SET LOCAL ivfflat.probes = {int(settings.RAG_IVFFLAT_PROBES)}"))
@@ -0,0 +1,206 @@
+"""
+Event Bus for Elite Concierge AI.
+
+Fans out newly written EventLog rows to live subscribers (the /events/stream SSE endpoint).
+
+Backends:
+- memory: in-process only (single instance / local dev)
+- postgres: publishes with pg_notify and LISTENs on a dedicated connection,
+  so every Cloud Run instance sees rows written by any other instance
+Other channels (e.g. knowledge-base invalidation from scripts/ingest_knowledge.py)
+can be registered with listen() and share the same LISTEN connection.
+"""
+import asyncio
+import json
+from typing import Callable, Dict, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+import app.database
+from app.config import settings, logger
+
+NOTIFY_CHANNEL = "event_log"
+NOTIFY_MAX_BYTES = 7900  # Postgres NOTIFY payload limit is 8000 bytes
+
+
+def serialize_event(event) -> dict:
+    """Wire format shared by /events, the SSE stream and NOTIFY payloads."""
+    return jsonable_encoder({
+        "id": event.id,
+        "user_id": event.user_id,
+        "event_type": event.event_type,
+        "payload": event.payload,
+        "agent_decision": event.agent_decision,
+        "agent_message": event.agent_message,
+        "created_at": event.created_at,
+    })
+
+
+class Subscription:
+    """A subscriber's bounded queue. Slow consumers lose their oldest undelivered events."""
+
+    def __init__(self, bus: "EventBus", predicate: Callable[[dict], bool], maxsize: int):
+        self._bus = bus
+        self.predicate = predicate
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: dict):
+        if not self.predicate(event):
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None if `timeout` elapses first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus._subscribers.discard(self)
+
+
+class EventBus:
+    def __init__(self, backend: str = "memory", queue_size: int = 100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._listen_conn = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self._channel_handlers: Dict[str, Callable[[str], None]] = {}
+
+    def subscribe(self, predicate: Callable[[dict], bool] = lambda event: True) -> Subscription:
+        subscription = Subscription(self, predicate, self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish_local(self, event: dict):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.offer(event)
+            except Exception as e:
+                logger.error(f"EventBus: Subscriber delivery failed: {e}")
+
+    async def publish(self, event_log):
+        """
+        Announces a committed EventLog row. Never raises: a push failure must not
+        fail the write path (pollers still see the row).
+        """
+        await self.publish_many([event_log])
+
+    async def publish_many(self, event_logs):
+        """Announces several committed rows; with Postgres, all NOTIFYs share one transaction."""
+        if not event_logs:
+            return
+        try:
+            events = [serialize_event(event_log) for event_log in event_logs]
+            if self._listen_conn is None:
+                for event in events:
+                    self.publish_local(event)
+                return
+
+            # Our own LISTEN connection delivers them back to local subscribers
+            async with app.database.async_engine.begin() as conn:
+                await conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    [{"channel": NOTIFY_CHANNEL, "payload": self._notify_payload(event)} for event in events],
+                )
+        except Exception as e:
+            logger.error(f"EventBus: Publish failed: {e}")
+
+    @staticmethod
+    def _notify_payload(event: dict) -> str:
+        payload = json.dumps(event, separators=(",", ":"))
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_BYTES:
+            # Large payloads (e.g. Terra batches) travel without the raw body
+            payload = json.dumps({**event, "payload": {"truncated": True}}, separators=(",", ":"))
+        return payload
+
+    # --- Postgres LISTEN/NOTIFY backend ---
+
+    def listen(self, channel: str, handler: Callable[[str], None]):
+        """
+        Calls `handler(payload)` for NOTIFYs on `channel` (postgres backend only; register
+        before start()). It is also called with "" on every (re)connect, since anything
+        sent while the LISTEN connection was down is lost.
+        """
+        self._channel_handlers[channel] = handler
+
+    @staticmethod
+    async def notify(channel: str, payload: str = ""):
+        """Sends a NOTIFY from any process with a database engine (e.g. a CLI script)."""
+        async with app.database.async_engine.begin() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+    def _channel_listener(self, handler: Callable[[str], None]):
+        def on_notify(connection, pid, channel, payload):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"EventBus: Handler for '{channel}' failed: {e}")
+        return on_notify
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self.publish_local(json.loads(payload))
+        except Exception as e:
+            logger.error(f"EventBus: Bad NOTIFY payload: {e}")
+
+    async def start(self):
+        if self.backend != "postgres":
+            return
+        if not settings.DATABASE_URL:
+            logger.warning("EventBus: DATABASE_URL not set, falling back to in-process delivery")
+            return
+        self._listen_task = asyncio.create_task(self._listen_forever())
+
+    async def _listen_forever(self):
+        """Keeps a LISTEN connection open, reconnecting with backoff if it drops."""
+        import asyncpg
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        delay = 1.0
+        while True:
+            try:
+                terminated = asyncio.get_running_loop().create_future()
+                conn = await asyncpg.connect(dsn)
+                conn.add_termination_listener(lambda _: terminated.done() or terminated.set_result(None))
+                await conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                for channel, handler in self._channel_handlers.items():
+                    listener = self._channel_listener(handler)
+                    await conn.add_listener(channel, listener)
+                    listener(conn, None, channel, "")  # Anything sent while disconnected was missed
+                self._listen_conn = conn
+                delay = 1.0
+                logger.info(f"EventBus: Listening on Postgres channel '{NOTIFY_CHANNEL}'")
+                await terminated
+                logger.warning("EventBus: LISTEN connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"EventBus: LISTEN setup failed, using in-process delivery: {e}")
+            self._listen_conn = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def stop(self):
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            self._listen_task = None
+        if self._listen_conn is not None:
+            try:
+                await self._listen_conn.close()
+            finally:
+                self._listen_conn = None
+
+
+# Global instance
+event_bus = EventBus(backend=settings.EVENT_BUS_BACKEND, queue_size=settings.EVENT_STREAM_QUEUE_SIZE)
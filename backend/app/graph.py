@@ -1,20 +1,20 @@
 import operator
+import asyncio
 import logging
-from typing import TypedDict, Annotated, List, Union
+from typing import TypedDict, Annotated, List, Union, NotRequired
 
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage
 import base64
 
-# Vertex AI imports
-import vertexai
-from vertexai.generative_models import GenerativeModel
-
 # Internal Imports
 from app.schema import WearableEvent, VisionEvent, AgentResponse
 from rag.retriever import retriever
 from app.vision_interface import describe_gym_equipment, analyze_form
 from app.config import settings, logger
+from app.llm import llm_gate, model_registry
+from app.user_state import describe_latest_metrics, load_user_state
+from app.media import UploadedMedia
 
 # Helper: Vertex Client Abstraction
 class GeminiClient:
@@ -28,14 +28,7 @@ class GeminiClient:
         
         if settings.is_production():
             try:
-                import vertexai
-                from vertexai.generative_models import GenerativeModel
-                vertexai.init(
-                    project=settings.PROJECT_ID, 
-                    location=settings.GCP_REGION,
-                    api_endpoint=f"{settings.GCP_REGION}-aiplatform.googleapis.com"
-                )
-                self.model = GenerativeModel(settings.GEMINI_MODEL_ID)
+                self.model = model_registry.get()
                 logger.info(f"Vertex AI initialized with model: {settings.GEMINI_MODEL_ID}")
             except Exception as e:
                 logger.error(f"Vertex AI init failed: {e}")
@@ -56,6 +49,21 @@ class GeminiClient:
             logger.error(f"LLM Generation Error: {e}")
             return f"[LLM_ERROR] {str(e)}"
 
+    async def generate_content_async(self, prompt: str) -> str:
+        """Non-blocking generation, bounded by the shared LLM gate (concurrency cap + timeout)."""
+        self._ensure_init()
+        if not self.model:
+            return f"[MOCK_LLM_RESPONSE] Response to: {prompt[:30]}..."
+
+        try:
+            response = await llm_gate.run(lambda: self.model.generate_content_async(prompt))
+            return response.text
+        except asyncio.TimeoutError:
+            return "[LLM_ERROR] Generation timed out"
+        except Exception as e:
+            logger.error(f"LLM Generation Error: {e}")
+            return f"[LLM_ERROR] {str(e)}"
+
 # Global instance for easy mocking
 gemini_client = GeminiClient()
 
@@ -67,6 +75,8 @@ class AgentState(TypedDict):
     vision_data: Union[VisionEvent, None]
     final_response: Union[AgentResponse, None]
     next_agent: str
+    user_id: NotRequired[str]
+    media: NotRequired[UploadedMedia] # Streamed upload (instead of base64 in vision_data)
 
 # --- Nodes ---
 
@@ -92,7 +102,7 @@ def concierge_node(state: AgentState) -> dict:
             )
         }
 
-def biometric_node(state: AgentState) -> dict:
+async def biometric_node(state: AgentState) -> dict:
     """Biometric Sentry Node"""
     logger.info("Biometric Sentry: Analysis started")
     data = state['wearable_data']
@@ -100,6 +110,18 @@ def biometric_node(state: AgentState) -> dict:
     # Logic
     score = data.recovery_score
     status = "RED" if score < 40 else "AMBER" if score < 70 else "GREEN"
+
+    # Latest-state projection (one primary-key lookup); still holds the previous reading here
+    client_context = ""
+    user_state = await load_user_state(state["user_id"]) if state.get("user_id") else None
+    if user_state:
+        if user_state.get("recovery") is not None:
+            client_context += f"Previous recovery score: {user_state['recovery']:.0f}/100.\n"
+        if user_state.get("is_traveling"):
+            client_context += "The client is currently traveling.\n"
+        latest_metrics = describe_latest_metrics(user_state)
+        if latest_metrics:
+            client_context += f"Latest logged performance:\n{latest_metrics}\n"
     
     # RAG Retrieval: Using retrieve_protocol interface
     context_docs = ""
@@ -107,21 +129,21 @@ def biometric_node(state: AgentState) -> dict:
     if status in ["RED", "AMBER"]:
         logger.info("Biometric Sentry: Retrieving RAG context")
         # Querying with specific keywords for the retriever's heuristic
-        context_docs = retriever.retrieve_protocol(query="recovery low hrv fatigue", tags=["recovery"])
+        context_docs = await retriever.retrieve_protocol(query="recovery low hrv fatigue", tags=["recovery"])
     
     # LLM Gen
     prompt = f"""
     You are an Elite Fitness Concierge for a UHNW client.
     The client's recovery score is {score}/100 (Status: {status}).
     Device: {data.device_type}.
-    
+    {client_context}
     Relevant Framework Context:
     {context_docs}
     
     Draft a short, premium text message.
     """
     
-    ai_msg = gemini_client.generate_content(prompt)
+    ai_msg = await gemini_client.generate_content_async(prompt)
     
     return {
         "final_response": AgentResponse(
@@ -131,18 +153,22 @@ def biometric_node(state: AgentState) -> dict:
         )
     }
 
-def vision_node(state: AgentState) -> dict:
+async def vision_node(state: AgentState) -> dict:
     """Vision Agent Node"""
     logger.info("Vision Agent: Analysis started")
     data = state['vision_data']
+    media = state.get("media")
     
     # 1. Video Analysis Path
-    if data.video_base64:
+    if data.video_base64 or (media and media.kind == "video"):
         try:
-            video_bytes = base64.b64decode(data.video_base64)
+            if media:
+                video_bytes, mime_type = media.view(), media.content_type
+            else:
+                video_bytes, mime_type = base64.b64decode(data.video_base64), "video/mp4"
             logger.info(f"Vision Agent: Processing {len(video_bytes)} video bytes")
             
-            feedback = analyze_form(video_bytes)
+            feedback = await analyze_form(video_bytes, mime_type=mime_type)
             
             return {
                 "final_response": AgentResponse(
@@ -164,9 +190,11 @@ def vision_node(state: AgentState) -> dict:
     # 2. Image Analysis Path
     detected = data.detected_equipment
     
-    # Decode image from base64 if provided
+    # Uploaded image (zero-copy view), or decode from base64 if provided
     image_bytes = None
-    if data.image_base64:
+    if media and media.kind == "image":
+        image_bytes = media.view()
+    elif data.image_base64:
         try:
             image_bytes = base64.b64decode(data.image_base64)
             logger.info(f"Vision Agent: Decoded {len(image_bytes)} bytes from base64")
@@ -176,7 +204,7 @@ def vision_node(state: AgentState) -> dict:
     # If no structured data is provided, but we have image bytes
     if not detected and image_bytes:
         logger.info("Vision Agent: Delegating to Vision Interface")
-        analysis = describe_gym_equipment(image_bytes) 
+        analysis = await describe_gym_equipment(image_bytes)
         detected = analysis['detected_equipment']
         logger.info(f"Vision Agent: Detected {detected}")
 
@@ -191,7 +219,7 @@ def vision_node(state: AgentState) -> dict:
     Create a very brief bulleted workout plan.
     """
     
-    ai_msg = gemini_client.generate_content(prompt)
+    ai_msg = await gemini_client.generate_content_async(prompt)
     
     return {
         "final_response": AgentResponse(
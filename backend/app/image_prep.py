@@ -0,0 +1,118 @@
+"""
+Image pre-processing for vision calls (Elite Concierge AI).
+
+Provides:
+- prepare_image: decode, apply EXIF orientation, downsize to a max edge, and re-encode
+  as JPEG without metadata (GPS, device, timestamps never reach the model)
+- ImagePreprocessor: runs prepare_image in a process pool so decoding and resampling
+  stay off the request loop; falls back to the original bytes if anything fails
+"""
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+from app.config import settings, logger
+
+# Pillow is optional: without it, images are sent to the model unchanged
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+
+def prepare_image(data: bytes, max_edge: int, quality: int) -> bytes:
+    """
+    Returns a JPEG no larger than `max_edge` on its longest side, with no EXIF.
+    The original is kept only when it is already small, metadata-free and would grow.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        has_metadata = bool(img.info.get("exif") or img.getexif())
+        # JPEG: let libjpeg decode at a reduced scale (much cheaper than a full decode + resize)
+        img.draft("RGB", (max_edge, max_edge))
+        needs_resize = max(img.size) > max_edge
+
+        img = ImageOps.exif_transpose(img)  # Bake orientation in before the tag is dropped
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+
+    encoded = out.getvalue()
+    if not needs_resize and not has_metadata and len(encoded) >= len(data):
+        return data
+    return encoded
+
+
+class ImagePreprocessor:
+    def __init__(self, max_edge: int = 1536, quality: int = 85, workers: int = 2, enabled: bool = True):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.workers = max(1, workers)
+        self.enabled = enabled and Image is not None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.processed = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def version(self) -> str:
+        """Identifies the pipeline settings (part of vision cache keys)."""
+        return f"jpeg-{self.max_edge}-q{self.quality}" if self.enabled else "original"
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the parent holds gRPC/DB threads that must not be forked
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def start(self):
+        """Lifespan hook: spawns the workers up front so the first photo doesn't pay for it."""
+        if self.enabled:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(self._get_pool(), int, 0) for _ in range(self.workers)])
+
+    async def process(self, data: Union[bytes, memoryview]) -> bytes:
+        data = bytes(data)  # Pickled to the worker either way
+        if not self.enabled:
+            return data
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_pool(), prepare_image, data, self.max_edge, self.quality)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"ImagePrep: Sending original image ({len(data)} bytes): {e}")
+            return data
+
+        self.processed += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(result)
+        logger.info(f"ImagePrep: {len(data)} -> {len(result)} bytes")
+        return result
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "processed": self.processed,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+# Global instance
+image_preprocessor = ImagePreprocessor(
+    max_edge=settings.IMAGE_MAX_EDGE,
+    quality=settings.IMAGE_JPEG_QUALITY,
+    workers=settings.IMAGE_PREP_WORKERS,
+    enabled=settings.IMAGE_PREP_ENABLED,
+)
@@ -0,0 +1,167 @@
+"""
+Bulk ingestion helpers for Elite Concierge AI.
+
+Provides:
+- GroupCommitBuffer: micro-batches rows from concurrent requests into one
+  multi-row INSERT and one transaction (group commit)
+- terra_event_rows: explodes a Terra delivery into one events row per sample
+  (write_event_rows also records each sample's scores in the biometric tables)
+- event_log_buffer: the shared buffer for EventLog rows
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+import app.database
+from app.biometrics import extract_samples, record_samples
+from app.config import settings, logger
+from app.event_bus import event_bus
+from app.models import EventLog
+
+
+class GroupCommitBuffer:
+    """
+    Callers `await submit(rows)` and resume once their rows are committed.
+    Rows arriving within `max_delay` of each other (or until `max_rows`) share
+    one `write_batch` call; each caller gets back the results for its own rows.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[List[dict]], Awaitable[List[Any]]],
+        max_rows: int = 2000,
+        max_delay: float = 0.01,
+        max_concurrent_writes: int = 2,
+    ):
+        self.name = name
+        self.write_batch = write_batch
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_concurrent_writes = max_concurrent_writes
+        self._pending: List[Tuple[List[dict], asyncio.Future]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.batches = 0
+        self.rows_written = 0
+
+    async def submit(self, rows: List[dict]) -> List[Any]:
+        if not rows:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((rows, future))
+        self._pending_rows += len(rows)
+
+        if self._pending_rows >= self.max_rows:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        task = asyncio.get_running_loop().create_task(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: List[Tuple[List[dict], asyncio.Future]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_writes)
+        rows = [row for submitted, _ in batch for row in submitted]
+        try:
+            async with self._semaphore:
+                results = await self.write_batch(rows)
+        except Exception as e:
+            logger.error(f"GroupCommit[{self.name}]: Batch of {len(rows)} rows failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows_written += len(rows)
+        offset = 0
+        for submitted, future in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(submitted)])
+            offset += len(submitted)
+
+    async def flush(self):
+        """Writes anything buffered and waits for in-flight batches."""
+        self._flush_now()
+        if self._writes:
+            await asyncio.gather(*list(self._writes), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending_rows": self._pending_rows,
+            "writes_in_flight": len(self._writes),
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+        }
+
+
+# --- EventLog bulk path ---
+
+async def write_event_rows(rows: List[dict]) -> List[EventLog]:
+    """
+    One transaction: multi-row INSERT ... RETURNING plus the biometric readings and
+    rollups derived from the same rows; then one batched publish.
+    """
+    async with app.database.AsyncSessionLocal() as session:
+        result = await session.scalars(insert(EventLog).returning(EventLog), rows)
+        events = result.all()
+        samples = [
+            sample
+            for event in events
+            for sample in extract_samples(event.user_id, event.event_type, event.payload, event.created_at)
+        ]
+        await record_samples(session, samples)
+        await session.commit()
+    await event_bus.publish_many(events)
+    return events
+
+
+event_log_buffer = GroupCommitBuffer(
+    "events",
+    write_event_rows,
+    max_rows=settings.INGEST_BATCH_MAX_ROWS,
+    max_delay=settings.INGEST_BATCH_MAX_DELAY_SECONDS,
+)
+
+
+TERRA_CATEGORY_MAP = {
+    "activity": "workout",
+    "sleep": "recovery",
+    "body": "biometrics",
+    "daily": "daily_summary",
+}
+
+
+def terra_event_rows(payload_type: str, user: dict, data: List[dict]) -> List[dict]:
+    """One events row per Terra sample (a delivery with no samples still gets one row)."""
+    event_category = TERRA_CATEGORY_MAP.get(payload_type, "unknown_terra")
+    user_id = user.get("user_id", "unknown")
+    created_at = datetime.utcnow()
+    samples = data or [None]
+    return [
+        {
+            "user_id": user_id,
+            "event_type": event_category,
+            "payload": {"type": payload_type, "user": user, "data": [sample] if sample is not None else []},
+            "agent_decision": "PENDING_PROCESSING",
+            "agent_message": "Raw data received from Terra.",
+            "created_at": created_at,
+        }
+        for sample in samples
+    ]
@@ -0,0 +1,217 @@
+"""
+Video keyframe sampling for form checks (Elite Concierge AI).
+
+Instead of sending a whole clip inline, analyze_form can send a small, ordered set of
+JPEG frames, which bounds request size and model latency regardless of clip length.
+
+Modes (FORM_VIDEO_MODE):
+- full: no sampling, the clip is sent as-is
+- fixed: frames at FORM_SAMPLE_FPS, spread over the clip if that exceeds FORM_MAX_FRAMES
+  (also when the container doesn't report its length)
+- motion: a frame is kept whenever the pose has changed enough since the last kept frame
+Needs OpenCV; without it (or on any decode failure) the full clip is sent.
+"""
+import asyncio
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+import numpy as np
+
+from app.config import settings, logger
+
+# OpenCV is optional: without it, form checks send the full video
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+MODES = ("full", "fixed", "motion")
+MOTION_SCAN_FPS = 8.0  # Frames per second compared in motion mode
+MOTION_THUMB_EDGE = 64  # Frames are compared as small grayscale thumbnails
+DEFAULT_FPS = 30.0  # When the container doesn't report one
+SUFFIXES = {"video/mp4": ".mp4", "video/quicktime": ".mov", "video/webm": ".webm", "video/mpeg": ".mpg"}
+
+
+@dataclass
+class Keyframe:
+    timestamp: float  # Seconds from the start of the clip
+    jpeg: bytes
+
+
+def _fit(frame: np.ndarray, max_edge: int) -> np.ndarray:
+    height, width = frame.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _thumb(frame: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(_fit(frame, MOTION_THUMB_EDGE), cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def _spread(items: list, limit: int) -> list:
+    """Evenly spaced subset of at most `limit` items, keeping the first and last."""
+    if len(items) <= limit:
+        return items
+    return [items[i] for i in np.linspace(0, len(items) - 1, limit).round().astype(int)]
+
+
+def extract_keyframes(
+    data: Union[bytes, memoryview],
+    mode: str = "fixed",
+    suffix: str = ".mp4",
+    sample_fps: float = 2.0,
+    max_frames: int = 16,
+    max_edge: int = 768,
+    quality: int = 85,
+    motion_threshold: float = 12.0,
+) -> List[Keyframe]:
+    """
+    Decodes the clip sequentially (grab() skips frames without decoding them into
+    images) and returns up to `max_frames` JPEG keyframes in time order. Blocking.
+    """
+    # VideoCapture only reads from a path
+    with tempfile.NamedTemporaryFile(suffix=suffix) as clip:
+        clip.write(data)
+        clip.flush()
+        capture = cv2.VideoCapture(clip.name)
+        try:
+            if not capture.isOpened():
+                raise ValueError("Unreadable video")
+            fps = capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+            # <= 0 when the container has no frame count (common for MediaRecorder WebM)
+            duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+
+            if mode == "motion":
+                step = 1 / MOTION_SCAN_FPS
+            else:
+                # Long clips: widen the step so the samples still cover the whole rep
+                step = max(1 / sample_fps, duration / max_frames if duration > 0 else 0)
+
+            selected = []  # (timestamp, frame)
+            last_thumb = None
+            next_t = 0.0
+            index = 0
+            while capture.grab():
+                position = capture.get(cv2.CAP_PROP_POS_MSEC)
+                t = position / 1000 if position > 0 else index / fps  # Stream position copes with VFR
+                index += 1
+                if t + 1e-6 < next_t:
+                    continue
+                next_t += step
+                ok, frame = capture.retrieve()
+                if not ok:
+                    continue
+                if mode == "motion":
+                    thumb = _thumb(frame)
+                    if last_thumb is not None and np.abs(thumb - last_thumb).mean() < motion_threshold:
+                        continue
+                    last_thumb = thumb
+                selected.append((t, _fit(frame, max_edge)))
+                if mode != "motion" and duration > 0 and len(selected) >= max_frames:
+                    break
+                if len(selected) >= 2 * max_frames:
+                    # Bound memory on long clips (busy, or of unknown length) and keep covering
+                    # the whole clip: drop every other frame, then sample half as often
+                    selected = selected[::2]
+                    if mode != "motion":
+                        step *= 2
+        finally:
+            capture.release()
+
+    keyframes = []
+    for t, frame in _spread(selected, max_frames):
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            keyframes.append(Keyframe(timestamp=round(t, 2), jpeg=encoded.tobytes()))
+    return keyframes
+
+
+class KeyframeSampler:
+    def __init__(
+        self,
+        mode: str = "full",
+        sample_fps: float = 2.0,
+        max_frames: int = 16,
+        max_edge: int = 768,
+        quality: int = 85,
+        motion_threshold: float = 12.0,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown form video mode '{mode}' (expected one of {MODES})")
+        self.mode = mode
+        self.sample_fps = sample_fps
+        self.max_frames = max(1, max_frames)
+        self.max_edge = max_edge
+        self.quality = quality
+        self.motion_threshold = motion_threshold
+        self.sampled = 0
+        self.failed = 0
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "full" and cv2 is not None
+
+    @property
+    def version(self) -> str:
+        """Identifies the sampling settings (part of vision cache keys)."""
+        if not self.enabled:
+            return "full"
+        params = f"{self.max_frames}-{self.max_edge}-q{self.quality}"
+        if self.mode == "motion":
+            return f"motion-{self.motion_threshold:g}-{params}"
+        return f"fixed-{self.sample_fps:g}fps-{params}"
+
+    async def sample(self, video: Union[bytes, memoryview], mime_type: str = "video/mp4") -> Optional[List[Keyframe]]:
+        """Keyframes for the clip, or None when the full video should be sent instead."""
+        if not self.enabled:
+            return None
+        try:
+            # OpenCV releases the GIL while decoding/encoding, so a thread keeps the loop free
+            # without pickling the whole clip over to a worker process
+            keyframes = await asyncio.to_thread(
+                extract_keyframes, video, self.mode, SUFFIXES.get(mime_type, ".mp4"),
+                self.sample_fps, self.max_frames, self.max_edge, self.quality, self.motion_threshold,
+            )
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Keyframes: Sending full video ({len(video)} bytes): {e}")
+            return None
+        if not keyframes:
+            self.failed += 1
+            logger.warning(f"Keyframes: No frames decoded, sending full video ({len(video)} bytes)")
+            return None
+
+        size = sum(len(k.jpeg) for k in keyframes)
+        self.sampled += 1
+        self.frames += len(keyframes)
+        self.bytes_in += len(video)
+        self.bytes_out += size
+        logger.info(f"Keyframes: {len(video)} bytes -> {len(keyframes)} frames, {size} bytes ({self.mode})")
+        return keyframes
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode if self.enabled else "full",
+            "sampled": self.sampled,
+            "failed": self.failed,
+            "frames": self.frames,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+# Global instance
+keyframe_sampler = KeyframeSampler(
+    mode=settings.FORM_VIDEO_MODE,
+    sample_fps=settings.FORM_SAMPLE_FPS,
+    max_frames=settings.FORM_MAX_FRAMES,
+    max_edge=settings.FORM_FRAME_MAX_EDGE,
+    quality=settings.IMAGE_JPEG_QUALITY,
+    motion_threshold=settings.FORM_MOTION_THRESHOLD,
+)
@@ -0,0 +1,137 @@
+"""
+LLM Call Gating for Elite Concierge AI.
+
+Provides:
+- A process-wide concurrency cap on in-flight Gemini requests
+- Per-call timeouts so a slow generation cannot hold a request forever
+- ModelRegistry: one vertexai.init per process and reusable GenerativeModel handles
+"""
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, TypeVar
+
+from app.config import settings, logger
+
+T = TypeVar("T")
+
+
+class LLMGate:
+    """Bounds concurrent LLM calls on the running event loop and applies a timeout to each."""
+
+    def __init__(self, max_concurrency: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.in_flight = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores bind to the loop they first wait on; rebuild if the loop changed (tests, reloads)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, call: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """
+        Awaits `call()` once a slot is free. Raises asyncio.TimeoutError if the
+        call itself exceeds the timeout (time spent queueing is not counted).
+        """
+        async with self._get_semaphore():
+            self.in_flight += 1
+            try:
+                return await asyncio.wait_for(call(), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"LLM call timed out after {timeout or self.timeout}s")
+                raise
+            finally:
+                self.in_flight -= 1
+
+
+# Global instance shared by graph nodes and the vision interface
+llm_gate = LLMGate(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    timeout=settings.LLM_TIMEOUT_SECONDS,
+)
+
+
+class ModelRegistry:
+    """
+    Initializes Vertex AI once (at lifespan startup) and hands out one GenerativeModel
+    per (model id, tools, generation config). A handle keeps its gRPC client, so
+    reusing it skips per-request client construction, channel setup and auth.
+    Handles are shared across requests; chats are per call via `start_chat()`.
+    """
+
+    def __init__(self, project: str, location: str, default_model_id: str):
+        self.project = project
+        self.location = location
+        self.default_model_id = default_model_id
+        self.init_seconds: Optional[float] = None
+        self._initialized = False
+        self._models: Dict[tuple, Any] = {}
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def init(self):
+        """Idempotent. Runs on first `get()` if startup didn't call it (scripts, tests)."""
+        if self._initialized:
+            return
+        started = time.perf_counter()
+        import vertexai
+
+        vertexai.init(
+            project=self.project,
+            location=self.location,
+            api_endpoint=f"{self.location}-aiplatform.googleapis.com",
+        )
+        self._initialized = True
+        self.init_seconds = time.perf_counter() - started
+        logger.info(f"ModelRegistry: Vertex AI initialized in {self.init_seconds * 1000:.0f}ms")
+
+    async def start(self):
+        """Lifespan hook: SDK import + init off the event loop, then pre-build the default model."""
+        try:
+            await asyncio.to_thread(self.init)
+            self.get()
+        except Exception as e:
+            logger.error(f"ModelRegistry: Vertex AI init failed, will retry on first use: {e}")
+
+    @staticmethod
+    def _key(model_id: str, tools: Optional[Sequence[Any]], generation_config: Optional[dict]) -> tuple:
+        # Tools are module-level constants, so identity is a stable key
+        config_key = json.dumps(generation_config, sort_keys=True) if generation_config else None
+        return (model_id, tuple(id(tool) for tool in tools or ()), config_key)
+
+    def get(
+        self,
+        model_id: Optional[str] = None,
+        tools: Optional[Sequence[Any]] = None,
+        generation_config: Optional[dict] = None,
+    ):
+        model_id = model_id or self.default_model_id
+        key = self._key(model_id, tools, generation_config)
+        model = self._models.get(key)
+        if model is None:
+            self.init()
+            from vertexai.generative_models import GenerativeModel
+
+            model = GenerativeModel(model_id, tools=list(tools) if tools else None, generation_config=generation_config)
+            self._models[key] = model
+            logger.info(f"ModelRegistry: Built handle for {model_id} (tools={len(tools or ())}, config={key[2]})")
+        return model
+
+    def stats(self) -> dict:
+        return {"initialized": self._initialized, "init_seconds": self.init_seconds, "handles": len(self._models)}
+
+
+# Global instance shared by graph nodes, the vision interface and the orchestrator
+model_registry = ModelRegistry(
+    project=settings.PROJECT_ID,
+    location=settings.GCP_REGION,
+    default_model_id=settings.GEMINI_MODEL_ID,
+)
@@ -1,21 +1,38 @@
-from fastapi import FastAPI, Depends, HTTPException, Security, Request, status
+from fastapi import FastAPI, Depends, HTTPException, Security, Request, Query, status
 from fastapi.security import APIKeyHeader
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 from app.config import settings, logger
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, text
+from sqlalchemy import select, delete, text, tuple_, and_, or_
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
 import time
+import json
+import hashlib
 from langchain_core.messages import HumanMessage
 import os
-from app.webhooks import router as webhook_router
+from app.webhooks import router as webhook_router, whatsapp_queue
+from app.ingest import event_log_buffer
+from app.biometrics import extract_samples, record_samples
+from app.media import MediaError, UploadedMedia, receive_media
+from app.vision_cache import vision_cache
+from app.llm import model_registry
+from app.image_prep import image_preprocessor
+from app.keyframes import keyframe_sampler
+from rag.retriever import KB_CHANNEL, retriever
 from app.workouts import router as workout_router
-from app.users import router as users_router, get_trainer_client_ids
+from app.users import router as users_router, get_trainer_client_ids, trainer_clients_subquery
 from app.analytics import router as analytics_router
 from app.database import get_db, init_connection_pool, create_tables
-from app.models import User, EventLog
+from app.event_bus import event_bus, serialize_event
+from app.messaging import outbox
+from app.notifications import notifier
+from app.models import User, EventLog, BiometricSample, BiometricRollup, UserState
 from app.schema import AgentResponse, WearableEvent, VisionEvent, ChatEvent, UserUpdate
-from app.auth import get_current_user, get_current_user_optional, AuthenticatedUser, require_trainer, require_admin
+from app.auth import invalidate_user, token_verifier, get_current_user, get_current_user_optional, get_current_user_stream, AuthenticatedUser, require_trainer, require_admin
 # AI Graph
 from app.graph import app_graph
 
@@ -47,10 +64,26 @@ async def lifespan(app: FastAPI):
     # Startup
     await init_connection_pool()
     await create_tables() # Auto-create tables for MVP
+    # Re-ingests in other processes (scripts/ingest_knowledge.py) NOTIFY every instance
+    event_bus.listen(KB_CHANNEL, lambda changes: retriever.invalidate_cache(f"(knowledge base changed: {changes or 'unknown'})"))
+    await event_bus.start()
+    if settings.AUTH_LOCAL_VERIFY:
+        await token_verifier.start()
+    await outbox.start()
+    if settings.PROJECT_ID:
+        await model_registry.start()  # vertexai.init once + default model handle, not per request
+    await image_preprocessor.start()
     logger.info("Startup complete: DB connected and tables verified.")
         
     yield
     # Shutdown
+    await event_log_buffer.flush()
+    await whatsapp_queue.stop(drain_timeout=settings.MESSAGING_DRAIN_TIMEOUT_SECONDS)  # Before the outbox: it queues replies
+    await notifier.stop()
+    await outbox.stop()
+    await token_verifier.stop()
+    await event_bus.stop()
+    image_preprocessor.shutdown()
     # (Optional) close engine
 
 
@@ -94,44 +127,181 @@ async def health_check(db: AsyncSession = Depends(get_db)):
         # Return 503 Service Unavailable if DB is down
         raise HTTPException(status_code=503, detail="Database Unavailable")
 
+@app.get("/metrics/queues")
+async def queue_metrics(auth: str = Depends(get_api_key)):
+    """Depth and throughput of the in-process background queues on this instance."""
+    return {
+        "notifications": notifier.stats(),
+        "outbound_messages": outbox.stats(),
+        "whatsapp_inbound": whatsapp_queue.stats(),
+        "event_ingest": event_log_buffer.stats(),
+        "event_stream_subscribers": event_bus.subscriber_count,
+        "vision_cache": vision_cache.stats(),
+        "llm_models": model_registry.stats(),
+        "image_prep": image_preprocessor.stats(),
+        "keyframes": keyframe_sampler.stats(),
+    }
+
 @app.get("/events")
 async def list_events(
-    limit: int = 50,
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+    since: Optional[datetime] = None,
     db: AsyncSession = Depends(get_db),
     current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """
-    Returns recent events for the Trainer 'God Mode' Dashboard.
+    Returns recent events for the Trainer 'God Mode' Dashboard, newest first.
     If authenticated as trainer, only shows events from their assigned clients.
+    Keyset pagination: pass the last id seen as `before_id` for older pages,
+    or the newest id seen as `after_id` / `since_id` (or a `since` timestamp)
+    to receive only rows added since. Responses carry an ETag; a matching
+    If-None-Match returns 304 with no body.
     """
+    if since_id is not None and after_id is None:
+        after_id = since_id  # Polling clients' name for the same cursor
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)  # created_at is naive UTC
+
     if not db:
         # Mock empty response if no DB
         return []
     
     try:
-        # Filter by trainer's clients if trainer role
+        # Filter by trainer's clients if trainer role (roster resolved in the same query)
         if current_user and current_user.is_trainer and not current_user.is_admin:
-            client_ids = await get_trainer_client_ids(db, current_user.uid)
-            if not client_ids:
-                return []  # No clients assigned yet
-            stmt = select(EventLog).where(EventLog.user_id.in_(client_ids)).order_by(EventLog.created_at.desc()).limit(limit)
+            stmt = select(EventLog).where(EventLog.user_id.in_(trainer_clients_subquery(current_user.uid)))
         
         # Filter for single client (Self)
         elif current_user and current_user.is_client:
-            stmt = select(EventLog).where(EventLog.user_id == current_user.uid).order_by(EventLog.created_at.desc()).limit(limit)
+            stmt = select(EventLog).where(EventLog.user_id == current_user.uid)
             
         else:
             # Admin sees all (God Mode)
             # OR dev mode with loose permissions
-            stmt = select(EventLog).order_by(EventLog.created_at.desc()).limit(limit)
+            stmt = select(EventLog)
         
+        stmt = paginate_events(stmt, limit=limit, before_id=before_id, after_id=after_id, since=since)
         result = await db.execute(stmt)
         events = result.scalars().all()
-        return events
+        if after_id is not None or since is not None:
+            events = list(reversed(events))  # Fetched oldest-first; keep the feed newest-first
     except Exception as e:
          logger.error(f"Error listing events: {e}")
          raise HTTPException(status_code=500, detail="Database query failed")
 
+    return conditional_json_response(request, jsonable_encoder(events))
+
+def conditional_json_response(request: Request, content) -> Response:
+    """
+    Serializes once, tags the body with a content-hash ETag, and answers 304
+    when the client already holds that exact body (If-None-Match).
+    """
+    body = json.dumps(content, separators=(",", ":")).encode("utf-8")
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def paginate_events(
+    stmt,
+    limit: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+):
+    """
+    Applies keyset pagination on (created_at, id) to an EventLog select.
+    Row-value comparison lets the (user_id, created_at DESC, id DESC) index serve
+    each page as a range scan, unlike OFFSET which re-reads every skipped row.
+    If the cursor row no longer exists (e.g. wiped), ids alone order the feed.
+    """
+    key = tuple_(EventLog.created_at, EventLog.id)
+
+    def cursor_ts(event_id: int):
+        return select(EventLog.created_at).where(EventLog.id == event_id).correlate(None).scalar_subquery()
+
+    if before_id is not None:
+        ts = cursor_ts(before_id)
+        stmt = stmt.where(or_(key < tuple_(ts, before_id), and_(ts.is_(None), EventLog.id < before_id)))
+    if after_id is not None or since is not None:
+        if after_id is not None:
+            ts = cursor_ts(after_id)
+            stmt = stmt.where(or_(key > tuple_(ts, after_id), and_(ts.is_(None), EventLog.id > after_id)))
+        if since is not None:
+            stmt = stmt.where(EventLog.created_at > since)
+        return stmt.order_by(
+            EventLog.created_at.asc(), EventLog.id.asc()
+        ).limit(limit)
+    return stmt.order_by(EventLog.created_at.desc(), EventLog.id.desc()).limit(limit)
+
+@app.get("/events/stream")
+async def stream_events(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: AuthenticatedUser = Depends(get_current_user_stream)
+):
+    """
+    Server-Sent Events feed of new events, scoped like GET /events.
+    Replaces dashboard polling: each committed EventLog row is pushed once.
+    On reconnect the browser sends Last-Event-ID and missed rows are replayed.
+    """
+    if current_user and current_user.is_trainer and not current_user.is_admin:
+        client_ids = set(await get_trainer_client_ids(db, current_user.uid)) if db else set()
+        predicate = lambda event: event["user_id"] in client_ids
+    elif current_user and current_user.is_client:
+        predicate = lambda event: event["user_id"] == current_user.uid
+    else:
+        predicate = lambda event: True
+
+    # Subscribe before the backfill query so nothing committed in between is lost
+    subscription = event_bus.subscribe(predicate)
+
+    backlog = []
+    last_event_id = request.headers.get("last-event-id")
+    if db and last_event_id and last_event_id.isdigit():
+        stmt = select(EventLog)
+        if current_user and current_user.is_trainer and not current_user.is_admin:
+            stmt = stmt.where(EventLog.user_id.in_(client_ids))
+        elif current_user and current_user.is_client:
+            stmt = stmt.where(EventLog.user_id == current_user.uid)
+        stmt = paginate_events(stmt, limit=500, after_id=int(last_event_id))
+        result = await db.execute(stmt)
+        backlog = [serialize_event(e) for e in result.scalars().all()]
+    if db:
+        await db.close()  # Don't hold a pooled connection for the stream's lifetime
+
+    async def frames():
+        replayed = {event["id"] for event in backlog}
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=settings.EVENT_STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event["id"] not in replayed:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def format_sse(event: dict) -> str:
+    data = json.dumps(event, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: event_log\ndata: {data}\n\n"
+
 @app.post("/events/wearable", response_model=AgentResponse)
 async def handle_wearable(event: WearableEvent, db: AsyncSession = Depends(get_db)):
     logger.info(f"Event: Wearable, Device: {event.device_type}, Score: {event.recovery_score}")
@@ -141,7 +311,8 @@ async def handle_wearable(event: WearableEvent, db: AsyncSession = Depends(get_d
         "messages": [],
         "wearable_data": event,
         "vision_data": None,
-        "next_agent": ""
+        "next_agent": "",
+        "user_id": "1" # Demo Client, as persisted below
     }
     
     try:
@@ -161,15 +332,18 @@ async def handle_wearable(event: WearableEvent, db: AsyncSession = Depends(get_d
                 agent_message=response.message
             )
             db.add(log_entry)
+            await db.flush()
+            await record_samples(db, extract_samples(log_entry.user_id, "wearable", log_entry.payload, log_entry.created_at))
             await db.commit()
+            await event_bus.publish(log_entry)
             
-            # Phase 3: Push Notification for RED Alerts
+            # Phase 3: Push Notification for RED Alerts (queued, batched, deduplicated per user)
             if "RED" in response.suggested_action or "ALERT" in response.suggested_action:
-                from app.notifications import send_topic_notification
-                send_topic_notification(
+                notifier.notify_topic(
                     topic="user_1", # Hardcoded for Demo
                     title="⚠️ Biometric Alert",
-                    body=f"Action Required: {response.message}"
+                    body=f"Action Required: {response.message}",
+                    dedupe_key=f"{response.suggested_action}:user_1",
                 )
             
         return response
@@ -180,7 +354,30 @@ async def handle_wearable(event: WearableEvent, db: AsyncSession = Depends(get_d
 @app.post("/events/vision", response_model=AgentResponse)
 async def handle_vision(event: VisionEvent, db: AsyncSession = Depends(get_db)):
     logger.info(f"Event: Vision, Equipment Count: {len(event.detected_equipment)}")
-    
+    return await run_vision_event(event, db)
+
+@app.post("/events/vision/upload", response_model=AgentResponse)
+async def handle_vision_upload(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Multipart variant of /events/vision for photos and form-check clips: a `media` file
+    part plus optional `user_query` and comma-separated `detected_equipment` fields.
+    The file is streamed to a spooled temp file (size-capped while reading), never base64'd.
+    """
+    try:
+        media = await receive_media(request)
+    except MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    with media:
+        equipment = media.fields.get("detected_equipment", "")
+        event = VisionEvent(
+            detected_equipment=[item.strip() for item in equipment.split(",") if item.strip()],
+            user_query=media.fields.get("user_query"),
+        )
+        logger.info(f"Event: Vision Upload, {media.kind} {media.content_type}, {media.size} bytes")
+        return await run_vision_event(event, db, media=media)
+
+async def run_vision_event(event: VisionEvent, db: AsyncSession, media: Optional[UploadedMedia] = None) -> AgentResponse:
     # Run Agent
     state = {
         "messages": [],
@@ -188,6 +385,8 @@ async def handle_vision(event: VisionEvent, db: AsyncSession = Depends(get_db)):
         "vision_data": event,
         "next_agent": ""
     }
+    if media is not None:
+        state["media"] = media
 
     try:
         result = await app_graph.ainvoke(state)
@@ -201,7 +400,7 @@ async def handle_vision(event: VisionEvent, db: AsyncSession = Depends(get_db)):
             log_entry = EventLog(
                 user_id="1", # Demo Client
                 event_type="vision",
-                payload=sanitize_payload(event.model_dump()),
+                payload=sanitize_payload(event.model_dump(), media),
                 agent_decision=response.suggested_action,
                 agent_message=response.message
             )
@@ -213,17 +412,21 @@ async def handle_vision(event: VisionEvent, db: AsyncSession = Depends(get_db)):
 
             db.add(log_entry)
             await db.commit()
+            await event_bus.publish(log_entry)
 
         return response
     except Exception as e:
         logger.error(f"Error processing vision event: {e}")
         raise HTTPException(status_code=500, detail="Internal processing error")
 
-def sanitize_payload(payload: dict) -> dict:
+def sanitize_payload(payload: dict, media: Optional[UploadedMedia] = None) -> dict:
     """
     GDPR Helper: Removes sensitive raw biometric data (images/video) from logs.
+    Uploaded media is only described (kind, type, size), never stored.
     """
     safe_payload = payload.copy()
+    if media is not None:
+        safe_payload["media"] = {"kind": media.kind, "content_type": media.content_type, "size": media.size}
     if "image_base64" in safe_payload and safe_payload["image_base64"]:
         safe_payload["image_base64"] = "[REDACTED_GDPR_MEDIA]"
     if "video_base64" in safe_payload and safe_payload["video_base64"]:
@@ -246,12 +449,18 @@ async def wipe_user_data(user_id: str, db: AsyncSession = Depends(get_db), auth:
         result = await db.execute(stmt_user)
         user = result.scalar_one_or_none()
         
+        # Biometric time series and the latest-state projection are personal data too
+        await db.execute(delete(BiometricSample).where(BiometricSample.user_id == user_id))
+        await db.execute(delete(BiometricRollup).where(BiometricRollup.user_id == user_id))
+        await db.execute(delete(UserState).where(UserState.user_id == user_id))
+        
         if user:
             user.coach_style = "standard"
             user.is_traveling = False
             # Wipe any other sensitive fields here
         
         await db.commit()
+        invalidate_user(user_id)  # Cached lookups must not keep serving the pre-wipe profile
         logger.info(f"GDPR WIPE COMPLETED for User {user_id}")
         return {"status": "success", "message": "All user data scrubbed."}
         
@@ -289,6 +498,7 @@ async def handle_chat(event: ChatEvent, db: AsyncSession = Depends(get_db)):
             )
             db.add(log_entry)
             await db.commit()
+            await event_bus.publish(log_entry)
 
         return response
     except Exception as e:
@@ -329,6 +539,7 @@ async def trigger_intervention(client_id: str, db: AsyncSession = Depends(get_db
             )
             db.add(log_entry)
             await db.commit()
+            await event_bus.publish(log_entry)
             
         return {"status": "ok", "message": ai_msg, "decision": decision}
     except Exception as e:
@@ -348,7 +559,7 @@ async def subscribe_notifications(payload: dict, current_user: AuthenticatedUser
     from app.notifications import subscribe_to_topic
     topic = f"user_{current_user.uid}"
     
-    result = subscribe_to_topic(token, topic)
+    result = await asyncio.to_thread(subscribe_to_topic, token, topic)  # Blocking Firebase HTTP call
     if not result or result.failure_count > 0:
          logger.warning(f"Subscription failed for {current_user.uid}")
          # We typically don't fail the request, just log
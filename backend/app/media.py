@@ -0,0 +1,129 @@
+"""
+Media uploads for Elite Concierge AI.
+
+Provides:
+- receive_media: streams a multipart upload into a spooled temp file, enforcing the
+  size limit while reading (no base64, no full-body buffering)
+- UploadedMedia: the spooled file plus a zero-copy view for the vision interface
+  (mmap once the upload has rolled over to disk)
+"""
+import mmap
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import Request
+
+from app.config import settings
+
+IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+VIDEO_TYPES = {"video/mp4", "video/quicktime", "video/webm", "video/mpeg"}
+FORM_OVERHEAD_BYTES = 64 * 1024  # Boundaries, part headers and the small text fields
+
+
+class MediaError(ValueError):
+    status_code = 400
+
+
+class MediaTooLargeError(MediaError):
+    status_code = 413
+
+
+class UnsupportedMediaError(MediaError):
+    status_code = 415
+
+
+@dataclass
+class UploadedMedia:
+    kind: str  # "image" or "video"
+    content_type: str
+    size: int
+    file: BinaryIO
+    fields: Dict[str, str] = field(default_factory=dict)
+    _map: Optional[mmap.mmap] = None
+    _view: Optional[memoryview] = None
+
+    def view(self) -> memoryview:
+        """
+        Read-only view of the upload. Small uploads are still in memory; larger ones
+        were spooled to disk and are mapped, so the bytes are paged in, not copied.
+        """
+        if self._view is None:
+            if self.size > MultiPartParser.spool_max_size:
+                self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+            else:
+                self.file.seek(0)
+                self._view = memoryview(self.file.read())
+        return self._view
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def max_upload_bytes(kind: str) -> int:
+    return settings.MEDIA_MAX_VIDEO_BYTES if kind == "video" else settings.MEDIA_MAX_IMAGE_BYTES
+
+
+async def _limited(stream: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise MediaTooLargeError(f"Upload exceeds {limit} bytes")
+        yield chunk
+
+
+async def receive_media(request: Request, file_field: str = "media") -> UploadedMedia:
+    """
+    Parses a multipart/form-data body with one file part (`file_field`) plus optional
+    text fields. Raises MediaError subclasses (carrying the HTTP status) on bad input.
+    """
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise UnsupportedMediaError("Expected multipart/form-data")
+
+    # Reject oversized bodies before reading them; chunked bodies are capped while streaming
+    limit = max(settings.MEDIA_MAX_IMAGE_BYTES, settings.MEDIA_MAX_VIDEO_BYTES) + FORM_OVERHEAD_BYTES
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise MediaTooLargeError(f"Upload exceeds {limit} bytes")
+
+    parser = MultiPartParser(request.headers, _limited(request.stream(), limit), max_files=1, max_fields=10)
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise MediaError(e.message)
+
+    upload = form.get(file_field)
+    if not isinstance(upload, UploadFile):
+        await form.close()
+        raise MediaError(f"Missing '{file_field}' file part")
+
+    content_type = (upload.content_type or "").split(";")[0].strip().lower()
+    kind = "image" if content_type in IMAGE_TYPES else "video" if content_type in VIDEO_TYPES else None
+    error = None
+    if kind is None:
+        error = UnsupportedMediaError(f"Unsupported media type '{content_type}'")
+    elif not upload.size:
+        error = MediaError("Empty upload")
+    elif upload.size > max_upload_bytes(kind):
+        error = MediaTooLargeError(f"{kind.capitalize()} exceeds {max_upload_bytes(kind)} bytes")
+    if error is not None:
+        await form.close()
+        raise error
+
+    fields = {key: value for key, value in form.multi_items() if isinstance(value, str)}
+    return UploadedMedia(kind=kind, content_type=content_type, size=upload.size, file=upload.file, fields=fields)
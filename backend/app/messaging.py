@@ -1,69 +1,213 @@
 """
-Messaging Module - Outbound WhatsApp via Twilio.
+Messaging Module - Outbound WhatsApp/SMS via Twilio.
+
+Sends go through an outbound queue (app.task_queue) so request handlers never
+wait on Twilio:
+- Per-recipient ordering: a recipient's messages share one worker
+- Retries with exponential backoff for throttling, 5xx and network errors
+- Pluggable transport: Twilio (shared pooled async HTTP client), a logging mock
+  when Twilio is not configured, and an in-memory fake for tests
 """
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List
+
 from app.config import settings, logger
+from app.task_queue import ShardedWorkerQueue, QueueFullError
+
+NOT_CONFIGURED_SID = "MOCK_SID_NOT_CONFIGURED"
+
+
+@dataclass
+class OutboundMessage:
+    channel: str  # "whatsapp" or "sms"
+    to: str
+    body: str
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class TransientSendError(Exception):
+    """A send failure worth retrying (throttled, provider 5xx, network)."""
+
+
+# --- Transports ---
+
+class TwilioTransport:
+    """Twilio REST over one shared, connection-pooled async HTTP client."""
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self._client = None
+        self._http_client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from twilio.rest import Client
+            from twilio.http.async_http_client import AsyncTwilioHttpClient
+
+            self._http_client = AsyncTwilioHttpClient(timeout=settings.MESSAGING_SEND_TIMEOUT_SECONDS)
+            self._client = Client(self.account_sid, self.auth_token, http_client=self._http_client)
+        return self._client
+
+    async def send(self, message: OutboundMessage) -> str:
+        from twilio.base.exceptions import TwilioRestException
+
+        if message.channel == "whatsapp":
+            from_number = f"whatsapp:{self.from_number}"
+            to_number = message.to if message.to.startswith("whatsapp:") else f"whatsapp:{message.to}"
+        else:
+            from_number = self.from_number  # Use same number for SMS
+            to_number = message.to
+
+        try:
+            sent = await self._get_client().messages.create_async(body=message.body, from_=from_number, to=to_number)
+        except TwilioRestException as e:
+            if e.status == 429 or e.status >= 500:
+                raise TransientSendError(str(e))
+            raise
+        except (OSError, asyncio.TimeoutError) as e:
+            raise TransientSendError(str(e))
+        return sent.sid
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.close()
+            self._http_client = None
+            self._client = None
+
+
+class LoggingTransport:
+    """Used when Twilio is not configured: logs instead of sending."""
+
+    async def send(self, message: OutboundMessage) -> str:
+        logger.warning(f"Twilio not configured, skipping outbound {message.channel} to {message.to}")
+        return NOT_CONFIGURED_SID
+
+    async def close(self):
+        pass
+
 
+class FakeTransport:
+    """In-memory transport for tests. `fail_times` transient failures precede each success."""
 
-def send_whatsapp(to: str, body: str) -> str:
+    def __init__(self, fail_times: int = 0, delay: float = 0.0):
+        self.fail_times = fail_times
+        self.delay = delay
+        self.sent: List[OutboundMessage] = []
+        self.failures = 0
+
+    async def send(self, message: OutboundMessage) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if message.attempts <= self.fail_times:
+            self.failures += 1
+            raise TransientSendError("fake transient failure")
+        self.sent.append(message)
+        return f"FAKE_SID_{len(self.sent)}"
+
+    async def close(self):
+        pass
+
+
+def default_transport():
+    if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
+        return TwilioTransport(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_WHATSAPP_NUMBER)
+    return LoggingTransport()
+
+
+# --- Outbound queue ---
+
+class MessageOutbox:
+    def __init__(
+        self,
+        transport=None,
+        workers: int = 4,
+        maxsize: int = 1000,
+        max_attempts: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.transport = transport or default_transport()
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.delivered = 0
+        self.dropped = 0
+        self.queue = ShardedWorkerQueue("outbound-messages", self._deliver, workers=workers, maxsize=maxsize)
+
+    def enqueue(self, channel: str, to: str, body: str) -> bool:
+        """Queues a message for background delivery. Returns False if the outbox is full."""
+        try:
+            self.queue.submit(OutboundMessage(channel=channel, to=to, body=body), key=to)
+            return True
+        except QueueFullError:
+            self.dropped += 1
+            logger.error(f"Outbox full, dropping {channel} message to {to}")
+            return False
+
+    def enqueue_whatsapp(self, to: str, body: str) -> bool:
+        return self.enqueue("whatsapp", to, body)
+
+    def enqueue_sms(self, to: str, body: str) -> bool:
+        return self.enqueue("sms", to, body)
+
+    async def send_now(self, message: OutboundMessage) -> str:
+        """Delivers with retries and returns the provider SID. Raises after the last attempt."""
+        while True:
+            message.attempts += 1
+            try:
+                return await self.transport.send(message)
+            except TransientSendError as e:
+                if message.attempts >= self.max_attempts:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (message.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)  # Jitter so throttled senders don't retry in lockstep
+                logger.warning(f"Send to {message.to} failed (attempt {message.attempts}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _deliver(self, message: OutboundMessage):
+        try:
+            sid = await self.send_now(message)
+        except Exception as e:
+            logger.error(f"Failed to send {message.channel} to {message.to} after {message.attempts} attempts: {e}")
+            raise
+        self.delivered += 1
+        logger.info(f"Sent {message.channel} to {message.to}, SID: {sid}")
+
+    async def start(self):
+        await self.queue.start()
+
+    async def stop(self):
+        await self.queue.stop(drain_timeout=settings.MESSAGING_DRAIN_TIMEOUT_SECONDS)
+        await self.transport.close()
+
+    def stats(self) -> dict:
+        return {**self.queue.stats(), "delivered": self.delivered, "dropped": self.dropped}
+
+
+# Global instance
+outbox = MessageOutbox(
+    workers=settings.MESSAGING_WORKERS,
+    maxsize=settings.MESSAGING_QUEUE_SIZE,
+    max_attempts=settings.MESSAGING_MAX_ATTEMPTS,
+)
+
+
+async def send_whatsapp(to: str, body: str) -> str:
     """
-    Send a WhatsApp message via Twilio.
-    
-    Args:
-        to: Recipient phone number (with or without 'whatsapp:' prefix)
-        body: Message content
-        
-    Returns:
-        Message SID from Twilio, or "MOCK_SID" if not configured
+    Send a WhatsApp message immediately (with retries) and return the Twilio SID.
+    Request handlers should prefer `outbox.enqueue_whatsapp`.
     """
-    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
-        logger.warning("Twilio not configured, skipping outbound WhatsApp")
-        return "MOCK_SID_NOT_CONFIGURED"
-    
-    try:
-        from twilio.rest import Client
-        
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        # Ensure proper WhatsApp format
-        from_number = f"whatsapp:{settings.TWILIO_WHATSAPP_NUMBER}"
-        to_number = to if to.startswith("whatsapp:") else f"whatsapp:{to}"
-        
-        message = client.messages.create(
-            body=body,
-            from_=from_number,
-            to=to_number
-        )
-        
-        logger.info(f"Sent WhatsApp to {to_number}, SID: {message.sid}")
-        return message.sid
-        
-    except Exception as e:
-        logger.error(f"Failed to send WhatsApp: {e}")
-        raise
-
-
-def send_sms(to: str, body: str) -> str:
+    return await outbox.send_now(OutboundMessage(channel="whatsapp", to=to, body=body))
+
+
+async def send_sms(to: str, body: str) -> str:
     """
-    Send an SMS via Twilio (fallback for non-WhatsApp users).
+    Send an SMS immediately (fallback for non-WhatsApp users).
     """
-    if not settings.TWILIO_ACCOUNT_SID:
-        logger.warning("Twilio not configured, skipping SMS")
-        return "MOCK_SID_NOT_CONFIGURED"
-    
-    try:
-        from twilio.rest import Client
-        
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        message = client.messages.create(
-            body=body,
-            from_=settings.TWILIO_WHATSAPP_NUMBER,  # Use same number for SMS
-            to=to
-        )
-        
-        logger.info(f"Sent SMS to {to}, SID: {message.sid}")
-        return message.sid
-        
-    except Exception as e:
-        logger.error(f"Failed to send SMS: {e}")
-        raise
+    return await outbox.send_now(OutboundMessage(channel="sms", to=to, body=body))
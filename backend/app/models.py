@@ -1,7 +1,7 @@
 from datetime import datetime
 import uuid
 from typing import Optional
-from sqlalchemy import String, DateTime, JSON, ForeignKey, Text
+from sqlalchemy import String, DateTime, JSON, ForeignKey, Text, UniqueConstraint, Index, BigInteger, Integer, Float
 from sqlalchemy.orm import Mapped, mapped_column
 from app.database import Base
 
@@ -27,10 +27,73 @@ class EventLog(Base):
     payload: Mapped[dict] = mapped_column(JSON, default={})
     agent_decision: Mapped[Optional[str]] = mapped_column(String, nullable=True) # "RED", "WORKOUT_GENERATED"
     agent_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    
+    external_id: Mapped[Optional[str]] = mapped_column(String, nullable=True, unique=True) # Provider message id (e.g. Twilio MessageSid)
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+# Feed queries: WHERE user_id [IN ...] ORDER BY created_at DESC, id DESC (keyset paging)
+Index("ix_events_user_created", EventLog.user_id, EventLog.created_at.desc(), EventLog.id.desc())
+Index("ix_events_type_created", EventLog.event_type, EventLog.created_at)
+
+class BiometricSample(Base):
+    """One wearable reading (e.g. recovery=45 at 08:00 from OURA). Raw payloads stay in events."""
+    __tablename__ = "biometric_samples"
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id: Mapped[str] = mapped_column(String)
+    metric: Mapped[str] = mapped_column(String) # "recovery", "strain", "sleep", "hrv", ...
+    ts: Mapped[datetime] = mapped_column(DateTime) # Naive UTC, when the reading was taken
+    value: Mapped[float] = mapped_column(Float)
+    source: Mapped[str] = mapped_column(String, default="") # Device / provider
+
+    # Redelivered readings are ignored (ON CONFLICT DO NOTHING) so rollups never double count
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", "ts", "source", name="uq_biometric_samples_reading"),
+        Index("ix_biometric_samples_user_metric_ts", "user_id", "metric", "ts"),
+    )
+
+class BiometricRollup(Base):
+    """Hourly / daily aggregates per user and metric, upserted incrementally on ingest."""
+    __tablename__ = "biometric_rollups"
+
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    metric: Mapped[str] = mapped_column(String, primary_key=True)
+    bucket: Mapped[str] = mapped_column(String, primary_key=True) # "hour" or "day"
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer)
+    sum: Mapped[float] = mapped_column(Float)
+    min: Mapped[float] = mapped_column(Float)
+    max: Mapped[float] = mapped_column(Float)
+    last_value: Mapped[float] = mapped_column(Float) # Value of the latest reading in the bucket
+    last_ts: Mapped[datetime] = mapped_column(DateTime)
+
+class UserState(Base):
+    """
+    Latest-state projection per user, written through on wearable / metric / profile writes
+    so hot paths (workout planning, biometric alerts) need one primary-key lookup.
+    NULL means "not projected yet"; readers fall back to the source tables.
+    """
+    __tablename__ = "user_state"
+
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    recovery: Mapped[Optional[float]] = mapped_column(Float, nullable=True) # Latest recovery reading
+    recovery_ts: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    is_traveling: Mapped[Optional[bool]] = mapped_column(nullable=True)
+    coach_style: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    latest_metrics: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True) # {category: {name, value, unit, timestamp}}
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class VisionCacheEntry(Base):
+    """Persistent tier of app.vision_cache: one Gemini vision result per content hash."""
+    __tablename__ = "vision_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True) # sha256(kind|model|prompt version|media sha256)
+    kind: Mapped[str] = mapped_column(String) # "equipment" or "form"
+    model_id: Mapped[str] = mapped_column(String)
+    prompt_version: Mapped[str] = mapped_column(String)
+    result: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class Exercise(Base):
     __tablename__ = "exercises"
 
@@ -69,20 +132,30 @@ class PerformanceMetric(Base):
     name: Mapped[str] = mapped_column(String) # "squat", "bench", "weight", "10k"
     value: Mapped[float] = mapped_column()
     unit: Mapped[str] = mapped_column(String) # "kg", "sec", "%"
+    reps: Mapped[Optional[int]] = mapped_column(Integer, nullable=True) # Strength sets: reps at `value`, for e1RM
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     logged_by: Mapped[str] = mapped_column(String) # uid of person who logged it
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+# Analytics: WHERE user_id AND category [AND name] ORDER BY timestamp
+Index("ix_performance_metrics_user_category_ts", PerformanceMetric.user_id, PerformanceMetric.category, PerformanceMetric.timestamp)
+
 from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import JSONB
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        # Incremental ingestion: one row per distinct chunk per source file
+        UniqueConstraint("source", "content_hash", name="uq_document_chunks_source_hash"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     content: Mapped[str] = mapped_column(Text)
     embedding: Mapped[Vector] = mapped_column(Vector(768)) # Vertex AI 004 dim
     source: Mapped[str] = mapped_column(String)
-    tags: Mapped[list] = mapped_column(JSON, default=[]) # Strings
+    tags: Mapped[list] = mapped_column(JSON().with_variant(JSONB(), "postgresql"), default=[]) # Strings; GIN-indexed on Postgres
     metadata_json: Mapped[dict] = mapped_column(JSON, default={})
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True) # sha256 of tags + content
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,5 +1,13 @@
-from firebase_admin import messaging
-from app.config import logger
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from firebase_admin import messaging, exceptions as firebase_exceptions
+
+from app.auth import get_firebase_app
+from app.cache import TTLCache
+from app.config import settings, logger
 
 def send_fcm_notification(token: str, title: str, body: str, data: dict = None):
     """
@@ -55,3 +63,196 @@ def subscribe_to_topic(token: str, topic: str):
     except Exception as e:
         logger.error(f"FCM: Error subscribing to topic {topic}: {e}")
         return None
+
+
+# --- Background dispatcher ---
+
+TRANSIENT_FCM_ERRORS = (
+    firebase_exceptions.UnavailableError,
+    firebase_exceptions.InternalError,
+    firebase_exceptions.ResourceExhaustedError,
+    firebase_exceptions.DeadlineExceededError,
+    firebase_exceptions.UnknownError,
+)
+
+
+@dataclass
+class PendingNotification:
+    topic: str
+    title: str
+    body: str
+    data: Dict[str, str] = field(default_factory=dict)
+    count: int = 1  # Notifications coalesced into this one
+    attempts: int = 0
+
+
+def _fcm_send_each(messages: List[messaging.Message]) -> List[Optional[Exception]]:
+    """One FCM batch call; returns the per-message error (None on success)."""
+    get_firebase_app()  # Ensure initialized
+    batch = messaging.send_each(messages)
+    return [None if r.success else r.exception for r in batch.responses]
+
+
+class NotificationDispatcher:
+    """
+    Non-blocking FCM topic notifications.
+    - Coalesces: everything queued within `batch_window` goes out in one send_each call,
+      and repeated notifications to the same topic in a batch merge into one push
+    - De-duplicates: a `dedupe_key` seen within `dedupe_window` is dropped
+    - Retries transient per-message failures with exponential backoff
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[messaging.Message]], List[Optional[Exception]]] = _fcm_send_each,
+        batch_window: float = 0.5,
+        max_batch: int = 500,  # FCM send_each limit
+        dedupe_window: float = 300.0,
+        max_attempts: int = 3,
+        backoff_base: float = 1.0,
+        maxsize: int = 10000,
+    ):
+        self.send_batch = send_batch
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.maxsize = maxsize
+        self._recent = TTLCache(maxsize=maxsize, ttl=dedupe_window)
+        self._pending: "OrderedDict[str, PendingNotification]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.sent = 0
+        self.failed = 0
+        self.deduped = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def notify_topic(
+        self,
+        topic: str,
+        title: str,
+        body: str,
+        data: Optional[Dict[str, str]] = None,
+        dedupe_key: Optional[str] = None,
+    ) -> bool:
+        """Queues a topic push without blocking. Returns False if deduplicated or dropped."""
+        if dedupe_key is not None:
+            if dedupe_key in self._recent:
+                self.deduped += 1
+                return False
+            self._recent.set(dedupe_key, True)
+
+        pending = self._pending.get(topic)
+        if pending is not None:
+            # Same device(s) already have a push waiting: merge rather than send twice
+            pending.count += 1
+            pending.title = f"{title} (+{pending.count - 1} more)"
+            pending.body = body
+            pending.data.update(data or {})
+            self.coalesced += 1
+        elif len(self._pending) >= self.maxsize:
+            self.dropped += 1
+            logger.error(f"FCM: Dispatcher full, dropping notification to {topic}")
+            return False
+        else:
+            self._pending[topic] = PendingNotification(topic=topic, title=title, body=body, data=dict(data or {}))
+
+        self._ensure_running()
+        self._wakeup.set()
+        return True
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            if not self._stopping:
+                await asyncio.sleep(self.batch_window)  # Let a burst accumulate
+            self._wakeup.clear()
+            await self.flush()
+
+    def _take_batch(self) -> List[PendingNotification]:
+        batch = []
+        while self._pending and len(batch) < self.max_batch:
+            batch.append(self._pending.popitem(last=False)[1])
+        return batch
+
+    async def flush(self):
+        """Sends everything pending now, in batches of at most `max_batch`."""
+        while self._pending:
+            await self._send_with_retries(self._take_batch())
+
+    async def _send_with_retries(self, batch: List[PendingNotification]):
+        while batch:
+            for item in batch:
+                item.attempts += 1
+            messages = [
+                messaging.Message(
+                    notification=messaging.Notification(title=item.title, body=item.body),
+                    data=item.data,
+                    topic=item.topic,
+                )
+                for item in batch
+            ]
+            self.batches += 1
+            try:
+                errors = await asyncio.to_thread(self.send_batch, messages)
+            except Exception as e:
+                # Whole call failed (network, auth); treat every message alike
+                errors = [e] * len(batch)
+
+            retry = []
+            for item, error in zip(batch, errors):
+                if error is None:
+                    self.sent += 1
+                elif isinstance(error, TRANSIENT_FCM_ERRORS + (OSError,)) and item.attempts < self.max_attempts:
+                    retry.append(item)
+                else:
+                    self.failed += 1
+                    logger.error(f"FCM: Error sending to topic {item.topic}: {error}")
+
+            if retry:
+                delay = self.backoff_base * 2 ** (retry[0].attempts - 1)
+                logger.warning(f"FCM: {len(retry)} transient failures, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            batch = retry
+
+    async def stop(self):
+        """Sends whatever is pending (an in-flight batch is never abandoned mid-send)."""
+        if self._task is not None and not self._task.done():
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+        self._task = None
+        self._stopping = False
+        await self.flush()
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "running": self._task is not None and not self._task.done(),
+            "batches": self.batches,
+            "sent": self.sent,
+            "failed": self.failed,
+            "deduped": self.deduped,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
+# Global instance
+notifier = NotificationDispatcher(
+    batch_window=settings.NOTIFY_BATCH_WINDOW_SECONDS,
+    dedupe_window=settings.NOTIFY_DEDUPE_WINDOW_SECONDS,
+    max_attempts=settings.NOTIFY_MAX_ATTEMPTS,
+)
@@ -32,6 +32,7 @@ class MetricCreate(BaseModel):
     name: str # e.g. "squat"
     value: float
     unit: str
+    reps: Optional[int] = None # Strength: reps performed at `value` (omit for a true 1RM)
     timestamp: Optional[datetime] = None
     notes: Optional[str] = None
 
@@ -44,16 +45,33 @@ class StrengthMetric(BaseModel):
     estimated_1rm: float
     exercise: str
     trend: str # "up", "down", "stable"
-    history: List[Dict[str, Any]] # Date, Value
+    history: List[Dict[str, Any]] # Date, Value, Rolling avg
+    formula: str = "epley"
+    slope_per_week: float = 0.0 # Regression slope over the daily history
+    percentiles: Dict[str, float] = {}
 
 class EngineMetric(BaseModel):
     ftp: float # Functional Threshold Power or Pace
     vo2_max: Optional[float]
     history: List[Dict[str, Any]]
+    trend: str = "stable"
+    slope_per_week: float = 0.0
+    percentiles: Dict[str, float] = {}
 
 class ReadinessMetric(BaseModel):
     score: int # 0-100
     hrv: int
     sleep_score: int
     history: List[Dict[str, Any]]
+    trend: str = "stable"
+    slope_per_week: float = 0.0
+    percentiles: Dict[str, float] = {}
 
+
+class BiometricBucket(BaseModel):
+    bucket_start: datetime
+    avg: float
+    min: float
+    max: float
+    last: float
+    count: int
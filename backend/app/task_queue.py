@@ -0,0 +1,117 @@
+"""
+Background work queues for Elite Concierge AI.
+
+Provides:
+- ShardedWorkerQueue: bounded in-process queue drained by a pool of workers.
+  Items with the same key always land on the same worker, so they are handled
+  one at a time and in submission order, while different keys run in parallel.
+"""
+import asyncio
+import zlib
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+from app.config import logger
+
+
+class QueueFullError(RuntimeError):
+    """The target shard is at capacity; the caller decides whether to drop or fail."""
+
+
+class ShardedWorkerQueue:
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = 4,
+        maxsize: int = 1000,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.processed = 0
+        self.failed = 0
+        self._shards: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _shard_for(self, key: Hashable) -> int:
+        # Stable across processes (unlike hash() on str), cheap, good enough spread
+        return zlib.crc32(str(key).encode("utf-8")) % self.workers
+
+    async def start(self):
+        self._start_workers()
+
+    def _start_workers(self):
+        if self._tasks:
+            return
+        # Each shard's share of the total capacity; 0 means unbounded
+        per_shard = max(1, self.maxsize // self.workers) if self.maxsize else 0
+        self._shards = [asyncio.Queue(maxsize=per_shard) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._work(shard), name=f"{self.name}-worker-{i}")
+            for i, shard in enumerate(self._shards)
+        ]
+        logger.info(f"TaskQueue[{self.name}]: Started {self.workers} workers")
+
+    def submit(self, item: Any, key: Hashable = None):
+        """
+        Enqueues without blocking. Starts the workers on first use so scripts and
+        tests work without an app lifespan. Raises QueueFullError when saturated.
+        """
+        self._start_workers()
+        shard = self._shards[self._shard_for(key)]
+        try:
+            shard.put_nowait(item)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"TaskQueue[{self.name}] is full")
+
+    async def _work(self, shard: asyncio.Queue):
+        while True:
+            item = await shard.get()
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"TaskQueue[{self.name}]: Handler failed: {e}")
+            finally:
+                shard.task_done()
+
+    async def join(self):
+        """Waits until everything submitted so far has been handled."""
+        for shard in self._shards:
+            await shard.join()
+
+    async def stop(self, drain_timeout: Optional[float] = 10.0):
+        """Drains pending work (up to `drain_timeout`), then cancels the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"TaskQueue[{self.name}]: Dropping {self.depth} undelivered items on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._shards = []
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "depth": self.depth,
+            "shard_depths": [shard.qsize() for shard in self._shards],
+            "processed": self.processed,
+            "failed": self.failed,
+        }
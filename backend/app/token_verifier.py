@@ -0,0 +1,200 @@
+"""
+Local Firebase ID token verification for Elite Concierge AI.
+
+Keeps Google's securetoken signing keys (JWKS) in memory as precompiled RSA
+public keys, refreshes them in a background task before their Cache-Control
+max-age runs out, and verifies RS256 signatures in-process. No network call
+sits on the request path once the first key set has loaded.
+"""
+import asyncio
+import base64
+import binascii
+import json
+import re
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from app.config import logger
+
+FIREBASE_JWKS_URL = "https://www.googleapis.com/service_accounts/v1/jwk/securetoken@system.gserviceaccount.com"
+ISSUER_PREFIX = "https://securetoken.google.com/"
+ON_DEMAND_REFRESH_INTERVAL = 60.0  # Min seconds between unknown-kid refreshes
+
+
+class InvalidTokenError(ValueError):
+    """The token is malformed, badly signed, or its claims don't validate."""
+
+
+class UnknownSigningKeyError(InvalidTokenError):
+    """The token's `kid` is not in the loaded key set (e.g. keys rotated since the last refresh)."""
+
+
+def _b64url_decode(segment: str) -> bytes:
+    try:
+        return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidTokenError(f"Malformed token segment: {e}")
+
+
+def _b64url_uint(value: str) -> int:
+    return int.from_bytes(_b64url_decode(value), "big")
+
+
+class FirebaseTokenVerifier:
+    def __init__(
+        self,
+        project_id: str,
+        jwks_url: str = FIREBASE_JWKS_URL,
+        refresh_margin: float = 300.0,
+        leeway: float = 10.0,
+    ):
+        self.project_id = project_id
+        self.jwks_url = jwks_url
+        self.refresh_margin = refresh_margin
+        self.leeway = leeway
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._last_refresh_request = float("-inf")
+        self._on_demand_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._keys)
+
+    # --- Key management ---
+
+    def load_jwks(self, jwks: dict, max_age: float):
+        """Precompiles a JWKS document's RSA keys and swaps them in atomically."""
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kty") == "RSA" and jwk.get("kid"):
+                numbers = rsa.RSAPublicNumbers(_b64url_uint(jwk["e"]), _b64url_uint(jwk["n"]))
+                keys[jwk["kid"]] = numbers.public_key()
+        if not keys:
+            raise ValueError("JWKS contained no RSA signing keys")
+        self._keys = keys
+        self._expires_at = time.time() + max_age
+
+    async def refresh(self):
+        """Fetches the current key set. Concurrent callers share one fetch."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.get(self.jwks_url)
+                response.raise_for_status()
+            match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+            max_age = float(match.group(1)) if match else 3600.0
+            self.load_jwks(response.json(), max_age)
+            logger.info(f"TokenVerifier: Loaded {len(self._keys)} signing keys (max-age {max_age:.0f}s)")
+
+    def request_refresh(self):
+        """
+        Schedules an out-of-band refresh (unknown kid) without blocking the caller.
+        Rate-limited so tokens with made-up kids cannot trigger a fetch storm.
+        """
+        now = time.monotonic()
+        if now - self._last_refresh_request < ON_DEMAND_REFRESH_INTERVAL:
+            return
+        self._last_refresh_request = now
+
+        async def run():
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"TokenVerifier: On-demand key refresh failed: {e}")
+
+        self._on_demand_task = asyncio.get_running_loop().create_task(run())
+
+    async def _refresh_forever(self):
+        delay = 5.0
+        while True:
+            try:
+                await self.refresh()
+                delay = 5.0
+                wait = max(self._expires_at - time.time() - self.refresh_margin, 60.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"TokenVerifier: Key refresh failed, retrying in {delay:.0f}s: {e}")
+                wait = delay
+                delay = min(delay * 2, 300.0)
+            await asyncio.sleep(wait)
+
+    async def start(self):
+        """Starts background refresh; the first fetch happens off the startup path."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    # --- Verification (CPU only) ---
+
+    def verify(self, token: str) -> dict:
+        """
+        Verifies a Firebase ID token against the cached keys.
+        Returns the claims with `uid` set, like firebase_auth.verify_id_token.
+        Raises InvalidTokenError (UnknownSigningKeyError for an unknown kid).
+        """
+        parts = token.split(".")
+        if len(parts) != 3:
+            raise InvalidTokenError("Token must have three segments")
+        try:
+            header = json.loads(_b64url_decode(parts[0]))
+            claims = json.loads(_b64url_decode(parts[1]))
+        except ValueError as e:
+            raise InvalidTokenError(f"Malformed token: {e}")
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise InvalidTokenError("Malformed token")
+
+        if header.get("alg") != "RS256":
+            raise InvalidTokenError(f"Unexpected algorithm: {header.get('alg')}")
+        key = self._keys.get(header.get("kid"))
+        if key is None:
+            raise UnknownSigningKeyError(f"Unknown signing key: {header.get('kid')}")
+
+        try:
+            key.verify(
+                _b64url_decode(parts[2]),
+                f"{parts[0]}.{parts[1]}".encode("ascii"),
+                padding.PKCS1v15(),
+                hashes.SHA256(),
+            )
+        except (InvalidSignature, UnicodeEncodeError):
+            raise InvalidTokenError("Invalid signature")
+
+        self._validate_claims(claims)
+        claims["uid"] = claims["sub"]
+        return claims
+
+    def _validate_claims(self, claims: dict):
+        now = time.time()
+        if claims.get("aud") != self.project_id:
+            raise InvalidTokenError(f"Incorrect 'aud' claim: {claims.get('aud')}")
+        if claims.get("iss") != ISSUER_PREFIX + self.project_id:
+            raise InvalidTokenError(f"Incorrect 'iss' claim: {claims.get('iss')}")
+
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise InvalidTokenError("Invalid 'sub' claim")
+
+        for name in ("exp", "iat"):
+            if not isinstance(claims.get(name), (int, float)):
+                raise InvalidTokenError(f"Missing '{name}' claim")
+        if claims["exp"] <= now - self.leeway:
+            raise InvalidTokenError("Token has expired")
+        if claims["iat"] > now + self.leeway:
+            raise InvalidTokenError("Token issued in the future")
+        auth_time = claims.get("auth_time")
+        if isinstance(auth_time, (int, float)) and auth_time > now + self.leeway:
+            raise InvalidTokenError("'auth_time' is in the future")
@@ -0,0 +1,122 @@
+"""
+Latest-state projection for Elite Concierge AI.
+
+Provides:
+- record_recovery: folds the newest recovery reading per user into user_state (ingest path)
+- sync_profile: copies is_traveling / coach_style on profile writes
+- record_metric: latest logged performance metric per category
+- get_user_state / load_user_state: the read API (one primary-key lookup)
+- describe_latest_metrics: latest_metrics as prompt lines (workout plans, biometric node)
+
+All writers run in the caller's transaction, so the projection commits (or rolls
+back) together with the source rows.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, select
+
+from app import database
+from app.config import logger
+from app.database import dialect_insert
+from app.models import PerformanceMetric, User, UserState
+
+STATE_COLUMNS = UserState.__table__.c
+
+
+async def record_recovery(session, readings: Iterable[tuple]):
+    """
+    `readings` are (user_id, metric, ts, value) rows just written to biometric_samples.
+    Keeps the newest recovery per user; out-of-order (older) readings never win.
+    """
+    newest = {}
+    for user_id, metric, ts, value in readings:
+        if metric == "recovery" and (user_id not in newest or ts >= newest[user_id][0]):
+            newest[user_id] = (ts, value)
+    if not newest:
+        return
+
+    now = datetime.utcnow()
+    upsert = dialect_insert(session, UserState)
+    excluded = upsert.excluded
+    is_newer = (STATE_COLUMNS.recovery_ts.is_(None)) | (excluded.recovery_ts >= STATE_COLUMNS.recovery_ts)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "recovery": case((is_newer, excluded.recovery), else_=STATE_COLUMNS.recovery),
+            "recovery_ts": case((is_newer, excluded.recovery_ts), else_=STATE_COLUMNS.recovery_ts),
+            "updated_at": excluded.updated_at,
+        },
+    )
+    rows = [
+        {"user_id": user_id, "recovery": value, "recovery_ts": ts, "updated_at": now}
+        for user_id, (ts, value) in sorted(newest.items())
+    ]
+    await session.execute(upsert, rows)
+
+
+async def sync_profile(session, user: User):
+    """Call after the users row is flushed, before commit."""
+    upsert = dialect_insert(session, UserState)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "is_traveling": upsert.excluded.is_traveling,
+            "coach_style": upsert.excluded.coach_style,
+            "updated_at": upsert.excluded.updated_at,
+        },
+    )
+    await session.execute(upsert, {
+        "user_id": user.id,
+        "is_traveling": user.is_traveling,
+        "coach_style": user.coach_style,
+        "updated_at": datetime.utcnow(),
+    })
+
+
+async def record_metric(session, metric: PerformanceMetric):
+    """Low write rate (manual logging), so a locked read-modify-write of the JSON column is enough."""
+    state = await session.get(UserState, metric.user_id, with_for_update=True)
+    if state is None:
+        state = UserState(user_id=metric.user_id)
+        session.add(state)
+
+    latest = dict(state.latest_metrics or {})
+    current = latest.get(metric.category)
+    timestamp = metric.timestamp.isoformat()
+    if current is None or timestamp >= current["timestamp"]:
+        latest[metric.category] = {
+            "name": metric.name,
+            "value": metric.value,
+            "unit": metric.unit,
+            "timestamp": timestamp,
+        }
+        state.latest_metrics = latest  # New object so the JSON change is detected
+
+
+def describe_latest_metrics(state: Optional[dict]) -> str:
+    """One line per category, e.g. "- strength: squat 140 kg (2026-03-02)". Empty if none."""
+    latest = (state or {}).get("latest_metrics") or {}
+    return "\n".join(
+        f"- {category}: {m['name']} {m['value']:g} {m.get('unit') or ''}".rstrip() + f" ({m['timestamp'][:10]})"
+        for category, m in sorted(latest.items())
+    )
+
+
+async def get_user_state(conn, user_id: str) -> Optional[dict]:
+    """Primary-key lookup; works with a connection or a session. None if never projected."""
+    result = await conn.execute(select(UserState.__table__).where(STATE_COLUMNS.user_id == user_id))
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+async def load_user_state(user_id: str) -> Optional[dict]:
+    """For callers without a session (graph nodes). Never raises: state is advisory there."""
+    if not database.async_engine:
+        return None
+    try:
+        async with database.async_engine.connect() as conn:
+            return await get_user_state(conn, user_id)
+    except Exception as e:
+        logger.warning(f"UserState: Lookup failed for {user_id}: {e}")
+        return None
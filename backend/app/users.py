@@ -9,9 +9,12 @@ from pydantic import BaseModel
 
 from app.database import get_db
 from app.models import User
-from app.auth import get_current_user, AuthenticatedUser, require_trainer, require_admin
-from app.config import logger
+from app.auth import get_current_user, AuthenticatedUser, require_trainer, require_admin, invalidate_user
+from app.cache import TTLCache
+from app.config import settings, logger
 from app.schema import UserUpdate
+from app.event_bus import event_bus
+from app.user_state import sync_profile
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -123,6 +126,8 @@ async def assign_client_to_trainer(
     client.trainer_id = current_user.uid
     await db.commit()
     await db.refresh(client)
+    invalidate_roster(current_user.uid)
+    invalidate_user(client.id)
     
     logger.info(f"Assigned client {client.id} to trainer {current_user.uid}")
     return client
@@ -146,8 +151,11 @@ async def unassign_client(
     if not current_user.is_admin and client.trainer_id != current_user.uid:
         raise HTTPException(status_code=403, detail="Not your client")
     
+    previous_trainer_id = client.trainer_id
     client.trainer_id = None
     await db.commit()
+    invalidate_roster(previous_trainer_id)
+    invalidate_user(client.id)
     
     return {"status": "ok", "message": f"Client {client_id} unassigned"}
 
@@ -176,6 +184,8 @@ async def update_user_role(
     old_role = user.role
     user.role = role
     await db.commit()
+    invalidate_roster()  # Role changes can reshape any roster; cheap to rebuild
+    invalidate_user(user_id)
     
     logger.info(f"Admin {current_user.uid} changed {user_id} role: {old_role} -> {role}")
     return {"status": "ok", "old_role": old_role, "new_role": role}
@@ -233,23 +243,20 @@ async def send_message_to_client(
     )
     db.add(log_entry)
     await db.commit()
+    await event_bus.publish(log_entry)
     
-    # Optionally send via WhatsApp
-    whatsapp_sid = None
+    # Optionally send via WhatsApp (queued; delivered in the background)
+    whatsapp_queued = False
     if msg.send_whatsapp and client.id.startswith("whatsapp:"):
-        try:
-            from app.messaging import send_whatsapp
-            whatsapp_sid = send_whatsapp(to=client.id, body=msg.message)
-            logger.info(f"Trainer message sent via WhatsApp: {whatsapp_sid}")
-        except Exception as e:
-            logger.error(f"WhatsApp send failed: {e}")
+        from app.messaging import outbox
+        whatsapp_queued = outbox.enqueue_whatsapp(to=client.id, body=msg.message)
     
     logger.info(f"Trainer {current_user.uid} messaged client {client_id}")
     
     return {
         "status": "ok",
         "message_id": log_entry.id if hasattr(log_entry, 'id') else None,
-        "whatsapp_sid": whatsapp_sid
+        "whatsapp_queued": whatsapp_queued
     }
 
 
@@ -319,10 +326,12 @@ async def toggle_travel(db: AsyncSession = Depends(get_db)):
     if not user:
         user = User(id="1", role="client", is_traveling=True)
         db.add(user)
-        await db.commit()
     else:
         user.is_traveling = not user.is_traveling
-        await db.commit()
+    await db.flush()
+    await sync_profile(db, user)
+    await db.commit()
+    invalidate_user(user.id)
         
     return {"is_traveling": user.is_traveling}
 
@@ -348,8 +357,11 @@ async def update_user_profile(update_data: UserUpdate, db: AsyncSession = Depend
     if update_data.coach_style is not None:
         user.coach_style = update_data.coach_style
         
+    await db.flush()
+    await sync_profile(db, user)
     await db.commit()
     await db.refresh(user)
+    invalidate_user(user.id)
     
     return {
         "status": "updated",
@@ -400,19 +412,45 @@ async def provision_trainer(
         db.add(user)
         await db.commit()
         await db.refresh(user)
+        invalidate_user(user.id)
         
         logger.info(f"Admin {current_user.uid} created + promoted {email} (UID: {resolved_uid}) to TRAINER")
         return {"status": "ok", "message": f"User {email} created and promoted to TRAINER"}
         
     user.role = "trainer"
     await db.commit()
+    invalidate_user(user.id)
     
     logger.info(f"Admin {current_user.uid} promoted {email} to TRAINER")
     return {"status": "ok", "message": f"User {email} is now a TRAINER"}
 
+# trainer_id -> client ids. Invalidated by the roster endpoints above; the TTL
+# bounds staleness on instances that didn't serve the change.
+_roster_cache = TTLCache(maxsize=settings.ROSTER_CACHE_SIZE, ttl=settings.ROSTER_CACHE_TTL_SECONDS)
+
+
+def trainer_clients_subquery(trainer_id: str):
+    """Roster as a subquery, so scoped reads filter in the same round trip."""
+    return select(User.id).where(User.trainer_id == trainer_id).scalar_subquery()
+
+
+def invalidate_roster(trainer_id: Optional[str] = None):
+    """Drops one trainer's cached roster, or all of them."""
+    if trainer_id is None:
+        _roster_cache.clear()
+    else:
+        _roster_cache.pop(trainer_id)
+
+
 async def get_trainer_client_ids(db: AsyncSession, trainer_id: str) -> List[str]:
-    """Helper: Get list of client IDs for a trainer."""
+    """Helper: Get list of client IDs for a trainer (cached)."""
+    client_ids = _roster_cache.get(trainer_id)
+    if client_ids is not None:
+        return list(client_ids)
+
     stmt = select(User.id).where(User.trainer_id == trainer_id)
     result = await db.execute(stmt)
-    return [row[0] for row in result.fetchall()]
+    client_ids = tuple(row[0] for row in result.fetchall())
+    _roster_cache.set(trainer_id, client_ids)
+    return list(client_ids)
 
@@ -0,0 +1,152 @@
+"""
+Content-addressed cache for vision results (Elite Concierge AI).
+
+Keys are sha256(kind | model id | prompt version | sha256(media bytes)), so a
+re-sent photo hits, while a model or prompt change misses naturally.
+
+Tiers:
+- memory: TTLCache (LRU) per instance
+- database: vision_cache table, shared across instances and restarts
+Concurrent requests for the same key share one computation (single flight).
+"""
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from sqlalchemy import select
+
+import app.database
+from app.cache import TTLCache
+from app.config import settings, logger
+from app.models import VisionCacheEntry
+
+HASH_IN_THREAD_BYTES = 1024 * 1024  # hashlib releases the GIL; keep big videos off the event loop
+
+
+async def media_digest(media: Union[bytes, memoryview]) -> str:
+    if len(media) > HASH_IN_THREAD_BYTES:
+        return await asyncio.to_thread(lambda: hashlib.sha256(media).hexdigest())
+    return hashlib.sha256(media).hexdigest()
+
+
+def cache_key(kind: str, digest: str, model_id: str, prompt_version: str) -> str:
+    return hashlib.sha256(f"{kind}|{model_id}|{prompt_version}|{digest}".encode("utf-8")).hexdigest()
+
+
+class VisionResultCache:
+    def __init__(
+        self,
+        maxsize: int = 512,
+        memory_ttl: Optional[float] = 24 * 3600,
+        db_ttl: Optional[float] = 30 * 24 * 3600,
+        session_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.memory = TTLCache(maxsize=maxsize, ttl=memory_ttl)
+        self.db_ttl = db_ttl
+        self._session_factory = session_factory
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.db_hits = 0
+        self.computed = 0
+
+    def _sessions(self):
+        return self._session_factory or app.database.AsyncSessionLocal
+
+    async def _db_get(self, key: str) -> Optional[Any]:
+        sessions = self._sessions()
+        if sessions is None:
+            return None
+        stmt = select(VisionCacheEntry.result).where(VisionCacheEntry.key == key)
+        if self.db_ttl is not None:
+            stmt = stmt.where(VisionCacheEntry.created_at >= datetime.utcnow() - timedelta(seconds=self.db_ttl))
+        try:
+            async with sessions() as session:
+                return (await session.execute(stmt)).scalar_one_or_none()
+        except Exception as e:
+            logger.warning(f"VisionCache: DB read failed, treating as miss: {e}")
+            return None
+
+    async def _db_set(self, key: str, kind: str, model_id: str, prompt_version: str, result: Any):
+        sessions = self._sessions()
+        if sessions is None:
+            return
+        try:
+            async with sessions() as session:
+                upsert = app.database.dialect_insert(session, VisionCacheEntry).values(
+                    key=key, kind=kind, model_id=model_id, prompt_version=prompt_version,
+                    result=result, created_at=datetime.utcnow(),
+                )
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={"result": upsert.excluded.result, "created_at": upsert.excluded.created_at},
+                )
+                await session.execute(upsert)
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"VisionCache: DB write failed: {e}")
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        media: Union[bytes, memoryview],
+        model_id: str,
+        prompt_version: str,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Returns the cached result for this media, or awaits `compute()` once and stores
+        it. Results must be JSON-serializable. If `compute` raises, nothing is cached.
+        If the caller running the computation is cancelled (client disconnect), the next
+        waiter takes over with its own `compute` instead of failing too.
+        """
+        key = cache_key(kind, await media_digest(media), model_id, prompt_version)
+
+        while True:
+            cached = self.memory.get(key)
+            if cached is not None:
+                return cached
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leader was cancelled, not us: retry (and likely lead) with our compute
+                if inflight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._db_get(key)
+            if result is not None:
+                self.db_hits += 1
+            else:
+                result = await compute()
+                self.computed += 1
+                await self._db_set(key, kind, model_id, prompt_version, result)
+            self.memory.set(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()  # Hands the key over to a waiter (see above)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so failures without waiters don't log noise
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {**self.memory.stats(), "db_hits": self.db_hits, "computed": self.computed, "inflight": len(self._inflight)}
+
+
+# Global instance
+vision_cache = VisionResultCache(
+    maxsize=settings.VISION_CACHE_SIZE,
+    memory_ttl=settings.VISION_CACHE_MEMORY_TTL_SECONDS,
+    db_ttl=settings.VISION_CACHE_DB_TTL_SECONDS,
+)
@@ -1,4 +1,4 @@
-from typing import List, Optional, TypedDict
+from typing import List, Optional, TypedDict, Union
 
 class GymEquipmentDescription(TypedDict):
     detected_equipment: List[str]
@@ -7,17 +7,56 @@ class GymEquipmentDescription(TypedDict):
 import json
 import base64
 from app.config import settings, logger
+from app.llm import llm_gate, model_registry
+from app.vision_cache import vision_cache
+from app.image_prep import image_preprocessor
+from app.keyframes import keyframe_sampler
 
 # Vertex AI (Lazy import to avoid startup crash if env vars missing in dev)
 try:
-    import vertexai
-    from vertexai.generative_models import GenerativeModel, Part, Image
+    from vertexai.generative_models import Part, Image
 except ImportError:
-    vertexai = None
+    Part = Image = None
 
-def describe_gym_equipment(image_bytes: Optional[bytes]) -> GymEquipmentDescription:
+# Bump when a prompt changes so cached results from the old prompt stop matching
+EQUIPMENT_PROMPT_VERSION = "equipment-v1"
+FORM_PROMPT_VERSION = "form-v1"
+
+EQUIPMENT_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+EQUIPMENT_PROMPT = """
+        You are an expert fitness equipment identifier.
+        Analyze this image and list the visible gym equipment available for a workout.
+        Do not list people or minor objects (water bottles, towels).
+        Focus on: Racks, Dumbbells, Machines, Cardio Equipment.
+        
+        Output stricly valid JSON with this schema:
+        {
+            "detected_equipment": ["item1", "item2"],
+            "confidence_score": 0.95
+        }
+        """
+
+FORM_PROMPT = """
+        You are an elite Strength & Conditioning Coach.
+        Analyze this video clip of a client performing an exercise.
+        Identify the exercise.
+        Critique their form (Technique, Stability, Tempo).
+        Provide 1-2 actionable cues to improve.
+        Be encouraging but technical.
+        """
+
+# Precedes sampled keyframes (app.keyframes) in place of the clip; FORM_PROMPT follows
+SAMPLED_FRAMES_NOTE = (
+    "The video clip is provided as {count} keyframes in time order, each preceded by its "
+    "timestamp. Treat them as one continuous movement."
+)
+
+async def describe_gym_equipment(image_bytes: Optional[Union[bytes, memoryview]]) -> GymEquipmentDescription:
     """
     Analyzes gym image using Gemini Vision to detect equipment.
+    Accepts bytes or a memoryview over an upload (app.media).
+    Results are cached by image content hash (app.vision_cache), so re-sent photos are instant.
     """
     if not image_bytes:
         return GymEquipmentDescription(detected_equipment=[], confidence_score=0.0)
@@ -30,33 +69,14 @@ def describe_gym_equipment(image_bytes: Optional[bytes]) -> GymEquipmentDescript
             confidence_score=0.5
         )
 
-    try:
-        # Initialize Vertex AI (Idempotent)
-        vertexai.init(project=settings.PROJECT_ID, location=settings.GCP_REGION)
-        
-        # Use the configured model ID (e.g. gumini-2.0-flash-exp or stable)
-        model = GenerativeModel(settings.GEMINI_MODEL_ID) 
+    async def compute() -> dict:
+        # Shared handle for the configured model ID, JSON output bound at construction
+        model = model_registry.get(generation_config=EQUIPMENT_GENERATION_CONFIG)
 
-        # Create Image Part
-        image = Image.from_bytes(image_bytes)
-        
-        prompt = """
-        You are an expert fitness equipment identifier.
-        Analyze this image and list the visible gym equipment available for a workout.
-        Do not list people or minor objects (water bottles, towels).
-        Focus on: Racks, Dumbbells, Machines, Cardio Equipment.
-        
-        Output stricly valid JSON with this schema:
-        {
-            "detected_equipment": ["item1", "item2"],
-            "confidence_score": 0.95
-        }
-        """
+        # Downsized, EXIF-free JPEG from the process pool (original bytes if Pillow is unavailable)
+        image = Image.from_bytes(await image_preprocessor.process(image_bytes))
 
-        response = model.generate_content(
-            [image, prompt],
-            generation_config={"response_mime_type": "application/json"} 
-        )
+        response = await llm_gate.run(lambda: model.generate_content_async([image, EQUIPMENT_PROMPT]))
         
         # Parse JSON
         result = json.loads(response.text)
@@ -66,38 +86,48 @@ def describe_gym_equipment(image_bytes: Optional[bytes]) -> GymEquipmentDescript
             confidence_score=result.get("confidence_score", 0.0)
         )
 
+    try:
+        # Errors are raised out of compute(), so fallbacks are never cached
+        # Keyed on the original bytes (hits skip pre-processing) plus the pipeline settings
+        return await vision_cache.get_or_compute(
+            "equipment", image_bytes, settings.GEMINI_MODEL_ID,
+            f"{EQUIPMENT_PROMPT_VERSION}/{image_preprocessor.version}", compute
+        )
     except Exception as e:
         logger.error(f"Gemini Vision Error: {e}")
         # Fallback to avoid breaking flow
         return GymEquipmentDescription(detected_equipment=["Unavailable - Vision Error"], confidence_score=0.0)
 
-def analyze_form(video_bytes: bytes) -> str:
+async def analyze_form(video_bytes: Union[bytes, memoryview], mime_type: str = "video/mp4") -> str:
     """
     Analyzes a video clip of an exercise and provides form feedback.
+    Accepts bytes or a memoryview over an upload (app.media). Cached like describe_gym_equipment.
     """
     if not settings.is_production() and not settings.PROJECT_ID:
         return "MOCK: Your squat depth looks good, but keep your chest up. (Dev Mode)"
 
-    try:
-        # Initialize Vertex AI
-        vertexai.init(project=settings.PROJECT_ID, location=settings.GCP_REGION)
-        model = GenerativeModel(settings.GEMINI_MODEL_ID)
+    async def compute() -> dict:
+        model = model_registry.get()
 
-        # Create Video Part (Gemini 1.5/2.0 supports inline data for small clips)
-        video_part = Part.from_data(data=video_bytes, mime_type="video/mp4")
-        
-        prompt = """
-        You are an elite Strength & Conditioning Coach.
-        Analyze this video clip of a client performing an exercise.
-        Identify the exercise.
-        Critique their form (Technique, Stability, Tempo).
-        Provide 1-2 actionable cues to improve.
-        Be encouraging but technical.
-        """
+        keyframes = await keyframe_sampler.sample(video_bytes, mime_type)
+        if keyframes:
+            # A few timestamped stills instead of the clip: bounded size regardless of length
+            contents = [SAMPLED_FRAMES_NOTE.format(count=len(keyframes))]
+            for frame in keyframes:
+                contents += [f"t={frame.timestamp:.1f}s", Part.from_data(data=frame.jpeg, mime_type="image/jpeg")]
+        else:
+            # Create Video Part (Gemini 1.5/2.0 supports inline data for small clips)
+            contents = [Part.from_data(data=bytes(video_bytes), mime_type=mime_type)] # One copy, at the SDK boundary
 
-        response = model.generate_content([video_part, prompt])
+        response = await llm_gate.run(lambda: model.generate_content_async([*contents, FORM_PROMPT]))
         logger.info("Video Analysis Success")
-        return response.text
+        return {"feedback": response.text}
+
+    try:
+        result = await vision_cache.get_or_compute(
+            "form", video_bytes, settings.GEMINI_MODEL_ID, f"{FORM_PROMPT_VERSION}/{keyframe_sampler.version}", compute
+        )
+        return result["feedback"]
 
     except Exception as e:
         logger.error(f"Gemini Video Error: {e}")
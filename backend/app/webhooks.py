@@ -1,13 +1,23 @@
+import hashlib
+import hmac
+import time
 from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from typing import Dict, Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-from app.database import get_db
+import app.database
+from app.config import settings, logger
+from app.database import dialect_insert, get_db
 from app.models import EventLog, User
 from app.schema import ChatEvent, WearableEvent, AgentResponse
 from app.graph import app_graph
+from app.event_bus import event_bus
+from app.ingest import event_log_buffer, terra_event_rows
+from app.messaging import outbox
+from app.task_queue import ShardedWorkerQueue, QueueFullError
 from langchain_core.messages import HumanMessage
 
 router = APIRouter(prefix="/webhooks", tags=["integrations"])
@@ -18,6 +28,7 @@ class WhatsAppPayload(BaseModel):
     From: str
     Body: str
     Timestamp: Optional[str] = None
+    MessageSid: Optional[str] = None  # Provider message id; makes redeliveries idempotent
 
 class TerraPayload(BaseModel):
     type: str # 'daily', 'activity', etc
@@ -30,146 +41,183 @@ class TerraPayload(BaseModel):
 async def whatsapp_webhook(payload: WhatsAppPayload, db: AsyncSession = Depends(get_db)):
     """
     Ingests WhatsApp messages (mocked as JSON for MVP).
-    Processes via AI agent and sends reply via Twilio.
+    Fast path: persists the inbound message and acks immediately; the AI agent
+    and the Twilio reply run on a background worker (see process_whatsapp_message).
+    Provider retries carrying an already-seen MessageSid are acknowledged, not reprocessed.
+    A full worker queue answers 503 with nothing stored, so the provider's retry is processed.
     """
-    from app.config import logger
-    from app.messaging import send_whatsapp
-    
     logger.info(f"Webhook (WhatsApp): From {payload.From}, Msg: {payload.Body[:20]}...")
 
-    # 1. Map to Internal Event
-    chat_event = ChatEvent(
-        user_id=payload.From,
-        message=payload.Body
-    )
-    
-    # 0. Ensure User Exists (Auto-create)
-    # This is critical for new WhatsApp users AND E2E testing seeding
-    if db:
-        stmt = select(User).where(User.id == payload.From)
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
-        if not user:
-            user = User(id=payload.From, role="client")
-            db.add(user)
-            await db.commit()
-            logger.info(f"Auto-created new WhatsApp user: {payload.From}")
+    if not db:
+        # No DB: nothing to persist or deduplicate against, just process in the background
+        try:
+            whatsapp_queue.submit((None, payload), key=payload.From)
+        except QueueFullError:
+            logger.error(f"WhatsApp processing queue full, message from {payload.From} dropped")
+            raise HTTPException(status_code=503, detail="Processing queue full")
+        return {"status": "accepted", "event_id": None}
+
+    try:
+        # 0. Ensure User Exists (Auto-create)
+        # This is critical for new WhatsApp users AND E2E testing seeding.
+        # An upsert, so two first messages from a new sender can't collide on the users PK.
+        created = await db.execute(
+            dialect_insert(db, User).values(id=payload.From, role="client").on_conflict_do_nothing(index_elements=["id"])
+        )
+        if created.rowcount:
+            logger.info(f"Auto-creating new WhatsApp user: {payload.From}")
+
+        # 1. Persist the inbound message; the agent fills in the decision later
+        log_entry = EventLog(
+            user_id=payload.From,
+            event_type="chat", # captured as chat
+            payload=payload.model_dump(),
+            agent_decision="PENDING_PROCESSING",
+            external_id=payload.MessageSid,
+        )
+        db.add(log_entry)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # Only a conflict on events.external_id is a redelivery; anything else is a real failure
+        if payload.MessageSid and await db.scalar(select(EventLog.id).where(EventLog.external_id == payload.MessageSid)):
+            logger.info(f"Duplicate WhatsApp delivery {payload.MessageSid}, already accepted")
+            return {"status": "duplicate", "event_id": None}
+        logger.error(f"WhatsApp Ingest Error: {e}")
+        raise HTTPException(status_code=500, detail="Ingest failed")
+    except Exception as e:
+        logger.error(f"WhatsApp Ingest Error: {e}")
+        raise HTTPException(status_code=500, detail="Ingest failed")
+
+    # 2. Hand off to the bounded worker pool (one sender's messages stay in order)
+    try:
+        whatsapp_queue.submit((log_entry.id, payload), key=payload.From)
+    except QueueFullError:
+        # Nothing would ever pick the row up: remove it and let the provider redeliver,
+        # so the retry is ingested afresh instead of being answered as a duplicate
+        logger.error(f"WhatsApp processing queue full, event {log_entry.id} withdrawn for redelivery")
+        await db.delete(log_entry)
+        await db.commit()
+        raise HTTPException(status_code=503, detail="Processing queue full")
+
+    await event_bus.publish(log_entry)
+
+    return {"status": "accepted", "event_id": log_entry.id}
+
+
+async def process_whatsapp_message(job):
+    """Background stage: runs the Concierge agent, records its answer, queues the reply."""
+    event_id, payload = job
 
     # 2. Invoke Agent (Concierge)
     state = {
-        "messages": [HumanMessage(content=chat_event.message)],
+        "messages": [HumanMessage(content=payload.Body)],
         "wearable_data": None,
         "vision_data": None,
         "next_agent": ""
     }
-
     try:
         result = await app_graph.ainvoke(state)
         response = result.get("final_response")
-        
-        # Fallback if agent returns None
-        if not response:
-            response = AgentResponse(
-                 agent_name="System",
-                 message="I received your message! Processing...",
-                 suggested_action="ACK"
-            )
-
-        # 3. Persist Log
-        if db:
-            log_entry = EventLog(
-                user_id=chat_event.user_id,
-                event_type="chat", # captured as chat
-                payload=payload.model_dump(),
-                agent_decision=response.suggested_action,
-                agent_message=response.message
-            )
-            db.add(log_entry)
-            await db.commit()
-
-        # 4. Send Outbound Reply via Twilio
-        try:
-            message_sid = send_whatsapp(to=payload.From, body=response.message)
-            logger.info(f"WhatsApp reply sent, SID: {message_sid}")
-        except Exception as twilio_err:
-            logger.error(f"Failed to send WhatsApp reply: {twilio_err}")
-            # Don't fail the whole request if Twilio fails
-        
-        return {"status": "ok", "reply": response.message}
-
     except Exception as e:
         logger.error(f"WhatsApp Processing Error: {e}")
-        raise HTTPException(status_code=500, detail="Processing failed")
+        response = None
+
+    # Fallback if agent returns None
+    if not response:
+        response = AgentResponse(
+             agent_name="System",
+             message="I received your message! Processing...",
+             suggested_action="ACK"
+        )
+
+    # 3. Record the decision on the ingested row
+    if event_id is not None and app.database.AsyncSessionLocal:
+        async with app.database.AsyncSessionLocal() as session:
+            log_entry = await session.get(EventLog, event_id)
+            if log_entry is not None:
+                log_entry.agent_decision = response.suggested_action
+                log_entry.agent_message = response.message
+                await session.commit()
+                await event_bus.publish(log_entry)
+
+    # 4. Queue Outbound Reply via Twilio (delivered in the background, with retries)
+    outbox.enqueue_whatsapp(to=payload.From, body=response.message)
+
+
+whatsapp_queue = ShardedWorkerQueue(
+    "whatsapp-inbound",
+    process_whatsapp_message,
+    workers=settings.WHATSAPP_WORKERS,
+    maxsize=settings.WHATSAPP_QUEUE_SIZE,
+)
+
+
+def verify_terra_signature(header: str, body: bytes, secret: str, tolerance: float, now: Optional[float] = None):
+    """
+    Checks a `terra-signature: t=<unix ts>,v1=<hex hmac>` header against the raw body.
+    The HMAC-SHA256 is computed incrementally over `t` + "." + body, so the (possibly
+    large) body is never decoded or copied. Raises ValueError on any mismatch.
+    """
+    parts = dict(item.split("=", 1) for item in header.split(",") if "=" in item)
+    timestamp, signature = parts.get("t", ""), parts.get("v1", "")
+    if not timestamp.isdigit() or not signature:
+        raise ValueError("Malformed signature header")
+
+    # Replay window: a captured delivery cannot be re-sent later
+    if abs((now or time.time()) - int(timestamp)) > tolerance:
+        raise ValueError("Signature timestamp outside tolerance")
+
+    mac = hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+    mac.update(timestamp.encode("ascii"))
+    mac.update(b".")
+    mac.update(body)
+    # Bytes, not str: compare_digest raises TypeError on non-ASCII strings
+    if not hmac.compare_digest(signature.encode("utf-8", "replace"), mac.hexdigest().encode("ascii")):
+        raise ValueError("Signature mismatch")
 
 
 @router.post("/terra")
-async def terra_webhook(request: Request, payload: TerraPayload, db: AsyncSession = Depends(get_db)):
+async def terra_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Ingests Terra Wearable Data (Raw).
-    Verifies signature and logs to DB. No processing yet.
+    Reads the body once, verifies its signature, then parses it straight from bytes.
+    Logs one events row per sample. No processing yet.
     """
-    # 1. Signature Validation
-    terra_sig = request.headers.get("terra-signature", "")
-    # Note: parsing payload twice (FastAPI dependency injection vs raw body for HMAC) is tricky.
-    # Ideally we use just Request and parse body manually, or trust that Pydantic parsing doesn't alter fields.
-    # For HMAC, we need the raw bytes.
     body_bytes = await request.body()
-    # Simple check for now (mock logic if secret is placeholder)
-    from app.config import settings
-    import hmac
-    import hashlib
 
+    # 1. Signature Validation (skipped while the secret is the dev placeholder)
     if settings.TERRA_API_SECRET != "terra-secret-placeholder":
-        # Calculate t=timestamp,v1=signature
-        # Terra format: t=123456,v1=abcdef...
         try:
-            timestamp_part, signature_part = terra_sig.split(',')
-            t_value = timestamp_part.split('=')[1]
-            v1_value = signature_part.split('=')[1]
-            
-            # Construct string to sign: t_value + "." + body
-            message = f"{t_value}.{body_bytes.decode('utf-8')}"
-            expected_sig = hmac.new(
-                bytes(settings.TERRA_API_SECRET, 'utf-8'),
-                msg=bytes(message, 'utf-8'),
-                digestmod=hashlib.sha256
-            ).hexdigest()
-            
-            if not hmac.compare_digest(v1_value, expected_sig):
-                 logger.warning("Invalid Terra Signature")
-                 # raise HTTPException(status_code=403, detail="Invalid Signature") 
-                 # For MVP dev flow, we log warning but might proceed if debugging, otherwise block.
-                 pass 
-        except Exception as e:
-            logger.warning(f"Signature verification failed: {e}")
-            pass
-
-    logger.info(f"Webhook (Terra): Type {payload.type}, User {payload.user.get('user_id')}")
-
-    # 2. Routing & Category Mapping
-    category_map = {
-        "activity": "workout",
-        "sleep": "recovery",
-        "body": "biometrics",
-        "daily": "daily_summary"
-    }
-    
-    event_category = category_map.get(payload.type, "unknown_terra")
+            verify_terra_signature(
+                request.headers.get("terra-signature", ""),
+                body_bytes,
+                settings.TERRA_API_SECRET,
+                settings.TERRA_SIGNATURE_TOLERANCE_SECONDS,
+            )
+        except ValueError as e:
+            logger.warning(f"Invalid Terra Signature: {e}")
+            raise HTTPException(status_code=403, detail="Invalid Signature")
 
+    # Only authenticated bodies get parsed; pydantic-core decodes and validates in one pass
     try:
-        # 3. Persist Raw Log (No Agent Invocation)
+        payload = TerraPayload.model_validate_json(body_bytes)
+    except ValidationError as e:
+        # No `input`: it is raw bytes for undecodable bodies (not JSON-encodable) and echoes the client's body
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+
+    logger.info(f"Webhook (Terra): Type {payload.type}, User {payload.user.get('user_id')}, Samples {len(payload.data)}")
+
+    # 2. Explode into one row per sample (category mapping in app.ingest)
+    rows = terra_event_rows(payload.type, payload.user, payload.data)
+
+    try:
+        # 3. Persist Raw Samples (No Agent Invocation). Concurrent deliveries are
+        # group-committed: one multi-row INSERT and one transaction per micro-batch.
         if db:
-            log_entry = EventLog(
-                user_id=payload.user.get("user_id", "unknown"),
-                event_type=event_category,
-                payload=payload.model_dump(),
-                agent_decision="PENDING_PROCESSING",
-                agent_message="Raw data received from Terra."
-            )
-            db.add(log_entry)
-            await db.commit()
+            await event_log_buffer.submit(rows)
             
-        return {"status": "ok", "action": "logged_raw"}
+        return {"status": "ok", "action": "logged_raw", "samples": len(rows)}
 
     except Exception as e:
         logger.error(f"Terra Storage Error: {e}")
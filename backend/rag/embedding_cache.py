@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+import unicodedata
+from array import array
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.cache import TTLCache
+from app.config import logger
+
+
+VECTOR_TYPECODE = "d"  # float64: same values as the in-memory tier and a fresh embedding
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFKC, collapsed whitespace, trimmed."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+    1. In-process LRU with TTL (always on).
+    2. Optional SQLite file shared across restarts (enabled when `path` is set).
+       Vectors are stored as float64, so a disk hit equals the original embedding.
+    Concurrent misses for the same key share a single embedding call (counted as
+    `joined`, not as hits).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400.0, path: Optional[str] = None):
+        self.ttl = ttl
+        self.path = path or None
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.joined = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        if self.path:
+            self._init_disk()
+
+    @staticmethod
+    def make_key(text: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    async def get_or_compute(
+        self,
+        text: str,
+        model_name: str,
+        compute: Callable[[str], Awaitable[List[float]]],
+    ) -> List[float]:
+        key = self.make_key(text, model_name)
+
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load_or_embed(key, text, compute))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.joined += 1
+
+        return await asyncio.shield(pending)
+
+    async def _load_or_embed(self, key: str, text: str, compute: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        if self.path:
+            vector = await asyncio.to_thread(self._disk_get, key)
+            if vector is not None:
+                self.disk_hits += 1
+                self.memory.set(key, vector)
+                return vector
+
+        self.misses += 1
+        vector = list(await compute(text))
+        self.memory.set(key, vector)
+        if self.path:
+            await asyncio.to_thread(self._disk_set, key, vector)
+        return vector
+
+    def clear(self):
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "joined": self.joined,
+            "memory_size": len(self.memory),
+            "disk_enabled": bool(self.path),
+        }
+
+    # --- SQLite tier (runs in worker threads) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _init_disk(self):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    f"key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL, typecode TEXT NOT NULL DEFAULT '{VECTOR_TYPECODE}')"
+                )
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(embeddings)")]
+                if "typecode" not in columns:
+                    # Files from before float64 storage: their float32 rows read as misses and get replaced
+                    conn.execute("ALTER TABLE embeddings ADD COLUMN typecode TEXT NOT NULL DEFAULT 'f'")
+            logger.info(f"EmbeddingCache: Persistent tier enabled at {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"EmbeddingCache: Disabling persistent tier ({e})")
+            self.path = None
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT vector, created_at, typecode FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"EmbeddingCache: Disk read failed: {e}")
+            return None
+
+        if row is None or row[1] + self.ttl <= time.time() or row[2] != VECTOR_TYPECODE:
+            return None
+        return array(VECTOR_TYPECODE, row[0]).tolist()
+
+    def _disk_set(self, key: str, vector: List[float]):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at, typecode) VALUES (?, ?, ?, ?)",
+                    (key, array(VECTOR_TYPECODE, vector).tobytes(), time.time(), VECTOR_TYPECODE),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"EmbeddingCache: Disk write failed: {e}")
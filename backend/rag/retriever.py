@@ -1,22 +1,36 @@
+import asyncio
 import logging
 from typing import List, Optional
-from sqlalchemy import select, text
+from sqlalchemy import select, text, type_coerce, literal, Text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_google_vertexai import VertexAIEmbeddings
 
 import app.database
 from app.models import DocumentChunk
 from app.config import settings, logger
+from app.cache import TTLCache
+from rag.embedding_cache import EmbeddingCache
+
+# NOTIFY channel: scripts/ingest_knowledge.py announces document_chunks changes on it
+KB_CHANNEL = "knowledge_base"
 
 class Retriever:
     def __init__(self):
         self.embeddings_model = None
+        self._result_cache = TTLCache(maxsize=settings.RAG_CACHE_SIZE, ttl=settings.RAG_CACHE_TTL_SECONDS)
+        self._inflight = {}
+        self.embedding_cache = EmbeddingCache(
+            maxsize=settings.EMBEDDING_CACHE_SIZE,
+            ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            path=settings.EMBEDDING_CACHE_PATH,
+        )
         self._init_embeddings()
 
     def _init_embeddings(self):
         try:
             if settings.is_production():
-                self.embeddings_model = VertexAIEmbeddings(model_name="text-embedding-004")
+                self.embeddings_model = VertexAIEmbeddings(model_name=settings.EMBEDDING_MODEL_ID)
             else:
                 try: 
                     # Try to init mock if available, or just set None
@@ -29,58 +43,88 @@ class Retriever:
 
     async def get_embedding(self, text: str) -> List[float]:
         if self.embeddings_model:
-            return self.embeddings_model.embed_query(text)
+            # aembed_query runs the Vertex call off the event loop
+            return await self.embedding_cache.get_or_compute(
+                text, settings.EMBEDDING_MODEL_ID, self.embeddings_model.aembed_query
+            )
         else:
             # Mock vector
             return [0.1] * 768
 
-    async def retrieve_protocol(self, query: str, tags: List[str] = [], k: int = 3) -> str:
+    async def retrieve_protocol(self, query: str, tags: List[str] = [], k: int = 3, match_all: bool = False) -> str:
         """
         Retrieves relevant context strings.
+        If tags are given, only chunks carrying any of them (all of them if match_all) are ranked.
+        Results are cached per (query, tags, k); concurrent misses share one search.
         """
+        cache_key = (query, tuple(sorted(tags)), k, match_all)
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(cache_key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._search(query, tags, k, match_all))
+            self._inflight[cache_key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+
         try:
-            # 1. Embed Query
-            query_vector = await self.get_embedding(query)
-            
-            # 2. DB Search
-            if not app.database.AsyncSessionLocal:
-                return "Error: Database not initialized."
-
-            async with app.database.AsyncSessionLocal() as session:
-                stmt = select(DocumentChunk)
-                
-                # Hybrid Filter: Tags
-                # Note: pgvector + complex filters can be tricky. 
-                # For MVP, we filter strictly if tags provided, OR just boost?
-                # Let's filter strictly if tags are present
-                if tags:
-                    # JSONB/Array containment? 
-                    # Our model 'tags' is JSON, so we can use JSON operators if database supports it.
-                    # Or simple ILIKE for MVP if tags are stored as text string? 
-                    # Model has `tags = mapped_column(JSON)`. 
-                    # Let's Skip complex tag filtering for step 1, focus on semantic.
-                    pass
-                
-                # Semantic Search
-                # Check pgvector syntax: order_by(DocumentChunk.embedding.cosine_distance(query_vector))
-                stmt = stmt.order_by(DocumentChunk.embedding.cosine_distance(query_vector)).limit(k)
-                
-                result = await session.execute(stmt)
-                chunks = result.scalars().all()
-                
-                if not chunks:
-                    return ""
-                
-                # Format
-                context_parts = []
-                for c in chunks:
-                    context_parts.append(f"Source: {c.source}\nContent: {c.content}")
-                
-                return "\n\n".join(context_parts)
-                
+            context = await asyncio.shield(pending)
         except Exception as e:
             logger.error(f"Retrieval Error: {e}")
             return ""
 
+        self._result_cache.set(cache_key, context)
+        return context
+
+    def invalidate_cache(self, reason: str = ""):
+        """Drops cached retrieval results (on KB_CHANNEL notifications, see app.main's lifespan)."""
+        self._result_cache.clear()
+        logger.info(f"Retriever: Result cache invalidated {reason}".rstrip())
+
+    @staticmethod
+    def build_search_statement(query_vector: List[float], tags: List[str], k: int, match_all: bool = False):
+        """
+        Tag-filtered vector search. The filter uses JSONB operators served by the
+        GIN index on document_chunks.tags: `?|` (any tag) or `@>` (all tags).
+        """
+        stmt = select(DocumentChunk)
+
+        # Hybrid Filter: Tags
+        if tags:
+            tags_jsonb = type_coerce(DocumentChunk.tags, JSONB)
+            if match_all:
+                stmt = stmt.where(tags_jsonb.contains(list(tags)))
+            else:
+                stmt = stmt.where(tags_jsonb.has_any(literal(list(tags), type_=ARRAY(Text))))
+
+        # Semantic Search
+        return stmt.order_by(DocumentChunk.embedding.cosine_distance(query_vector)).limit(k)
+
+    async def _search(self, query: str, tags: List[str], k: int, match_all: bool = False) -> str:
+        # 1. Embed Query
+        query_vector = await self.get_embedding(query)
+        
+        # 2. DB Search
+        if not app.database.AsyncSessionLocal:
+            raise RuntimeError("Database not initialized.")
+
+        async with app.database.AsyncSessionLocal() as session:
+            await app.database.apply_vector_search_settings(session)
+            stmt = self.build_search_statement(query_vector, tags, k, match_all)
+            
+            result = await session.execute(stmt)
+            chunks = result.scalars().all()
+            
+            if not chunks:
+                return ""
+            
+            # Format
+            context_parts = []
+            for c in chunks:
+                context_parts.append(f"Source: {c.source}\nContent: {c.content}")
+            
+            return "\n\n".join(context_parts)
+
 # Global Instance
 retriever = Retriever()
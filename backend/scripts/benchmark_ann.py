@@ -0,0 +1,154 @@
+"""
+ANN Recall vs Latency Benchmark
+Builds synthetic document_chunks-shaped corpora (10k-1M vectors) in a scratch table,
+then measures recall@k and query latency for HNSW ef_search / IVFFlat probes values
+against an exact (sequential scan) baseline.
+
+Usage:
+    DATABASE_URL=postgresql+asyncpg://... python scripts/benchmark_ann.py \
+        --rows 10000 100000 1000000 --index hnsw --knobs 20 40 80 160
+
+The scratch table (ann_benchmark_chunks) is dropped at the end of each corpus run.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the parent directory (backend) to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncpg
+from pgvector.asyncpg import register_vector
+
+from app.config import settings
+
+TABLE = "ann_benchmark_chunks"
+INSERT_BATCH = 10_000
+
+
+def make_corpus_batches(rows: int, dim: int, clusters: int, seed: int):
+    """Yields L2-normalized, clustered vectors (embeddings are rarely uniform)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    for start in range(0, rows, INSERT_BATCH):
+        n = min(INSERT_BATCH, rows - start)
+        assignment = rng.integers(0, clusters, size=n)
+        batch = centers[assignment] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+        batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+        yield start, batch
+
+
+def make_queries(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    centers = np.random.default_rng(seed).normal(size=(clusters, dim)).astype(np.float32)
+    q = centers[rng.integers(0, clusters, size=count)] + 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+async def load_corpus(conn, rows: int, dim: int, clusters: int, seed: int):
+    await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    await conn.execute(f"CREATE TABLE {TABLE} (id integer PRIMARY KEY, embedding vector({dim}))")
+    started = time.perf_counter()
+    for start, batch in make_corpus_batches(rows, dim, clusters, seed):
+        records = [(start + i, vec) for i, vec in enumerate(batch)]
+        await conn.copy_records_to_table(TABLE, records=records, columns=["id", "embedding"])
+    print(f"  loaded {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+async def build_index(conn, index: str, rows: int):
+    started = time.perf_counter()
+    if index == "hnsw":
+        await conn.execute(
+            f"CREATE INDEX ON {TABLE} USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {settings.RAG_HNSW_M}, ef_construction = {settings.RAG_HNSW_EF_CONSTRUCTION})"
+        )
+    else:
+        lists = max(1, rows // 1000)
+        await conn.execute(
+            f"CREATE INDEX ON {TABLE} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})"
+        )
+    await conn.execute(f"ANALYZE {TABLE}")
+    print(f"  built {index} index in {time.perf_counter() - started:.1f}s")
+
+
+async def search(conn, query: np.ndarray, k: int, setup_sql: str):
+    async with conn.transaction():
+        await conn.execute(setup_sql)
+        started = time.perf_counter()
+        rows = await conn.fetch(
+            f"SELECT id FROM {TABLE} ORDER BY embedding <=> $1 LIMIT {k}", query
+        )
+        elapsed = time.perf_counter() - started
+    return [r["id"] for r in rows], elapsed
+
+
+async def run_corpus(conn, args, rows: int):
+    print(f"\n=== Corpus: {rows} vectors x {args.dim} dims ({args.index}) ===")
+    await load_corpus(conn, rows, args.dim, args.clusters, args.seed)
+    queries = make_queries(args.queries, args.dim, args.clusters, args.seed)
+
+    # Ground truth: exact search with index scans disabled
+    exact, exact_times = [], []
+    for q in queries:
+        ids, elapsed = await search(conn, q, args.k, "SET LOCAL enable_indexscan = off")
+        exact.append(set(ids))
+        exact_times.append(elapsed)
+
+    await build_index(conn, args.index, rows)
+
+    knob = "hnsw.ef_search" if args.index == "hnsw" else "ivfflat.probes"
+    print(f"  {'setting':<22}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"  {'exact (seq scan)':<22}{1.0:>10.3f}{np.percentile(exact_times, 50) * 1000:>10.2f}"
+          f"{np.percentile(exact_times, 95) * 1000:>10.2f}")
+
+    for value in args.knobs:
+        recalls, times = [], []
+        for q, truth in zip(queries, exact):
+            ids, elapsed = await search(conn, q, args.k, f"SET LOCAL {knob} = {int(value)}")
+            recalls.append(len(truth.intersection(ids)) / args.k)
+            times.append(elapsed)
+        print(f"  {knob + '=' + str(value):<22}{np.mean(recalls):>10.3f}"
+              f"{np.percentile(times, 50) * 1000:>10.2f}{np.percentile(times, 95) * 1000:>10.2f}")
+
+    await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], default=settings.RAG_VECTOR_INDEX)
+    parser.add_argument("--knobs", type=int, nargs="+", default=None,
+                        help="ef_search (hnsw) or probes (ivfflat) values to sweep")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if args.knobs is None:
+        args.knobs = [10, 20, 40, 80, 160] if args.index == "hnsw" else [1, 5, 10, 20, 50]
+
+    if not settings.DATABASE_URL:
+        print("DATABASE_URL not set.")
+        return
+
+    dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        await register_vector(conn)
+        for rows in args.rows:
+            await run_corpus(conn, args, rows)
+    finally:
+        await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    if os.name == 'nt':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Vertex AI Model Setup Benchmark
+Compares the per-request setup cost of:
+  1. The old pattern: vertexai.init + GenerativeModel(...) + a fresh async prediction
+     client on every request (what vision_interface / the orchestrator used to do)
+  2. app.llm.model_registry: one init at startup, then a cached handle whose client is reused
+Also reports the one-off startup cost (SDK import + init + first handle).
+
+No network or credentials needed: anonymous credentials are used and no RPC is sent,
+so the numbers exclude the channel/TLS/token setup a fresh client also pays on its
+first real call (typically the larger share in production).
+
+Usage:
+    python scripts/benchmark_model_registry.py --iterations 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import warnings
+
+# Add the parent directory (backend) to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+warnings.filterwarnings("ignore")  # SDK deprecation notices
+
+MODEL_ID = "gemini-2.0-flash"
+PROJECT = "benchmark-project"
+LOCATION = "us-central1"
+
+
+def report(label: str, seconds: float, iterations: int = 1):
+    per_op = seconds / iterations
+    print(f"  {label:<52}{per_op * 1000:>10.3f} ms/op")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    import vertexai
+    from google.auth.credentials import AnonymousCredentials
+    from vertexai.generative_models import GenerativeModel
+    from app.llm import ModelRegistry
+    import_seconds = time.perf_counter() - started
+
+    credentials = AnonymousCredentials()
+    registry = ModelRegistry(PROJECT, LOCATION, MODEL_ID)
+
+    print("=== Startup (once per process) ===")
+    report("import vertexai SDK", import_seconds)
+    started = time.perf_counter()
+    registry.init()
+    vertexai.init(project=PROJECT, location=LOCATION, credentials=credentials)
+    handle = registry.get()
+    handle._prediction_async_client  # Build the client as the first request would
+    report("registry init + first handle + client", time.perf_counter() - started)
+
+    print(f"\n=== Per request ({args.iterations} iterations) ===")
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        vertexai.init(project=PROJECT, location=LOCATION, credentials=credentials)
+        model = GenerativeModel(MODEL_ID)
+        model._prediction_async_client
+    per_request = time.perf_counter() - started
+    report("init + GenerativeModel + new client (old)", per_request, args.iterations)
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        model = registry.get()
+        model._prediction_async_client
+    pooled = time.perf_counter() - started
+    report("model_registry.get() (cached handle + client)", pooled, args.iterations)
+
+    print(f"\n  Saving per request: {(per_request - pooled) / args.iterations * 1000:.3f} ms "
+          f"({per_request / max(pooled, 1e-9):,.0f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+ID Token Verification Benchmark
+Compares verifications/sec for:
+  1. app.token_verifier (precompiled RSA public keys, cryptography)
+  2. The Admin SDK's verification step (google.auth.jwt.decode against PEM certs,
+     which re-parses the X.509 certificate on every call) - network excluded
+  3. Optionally, firebase_auth.verify_id_token end to end with a real token (--token)
+
+Tokens for 1 and 2 are signed with a throwaway key, so no Firebase project is needed.
+
+Usage:
+    python scripts/benchmark_token_verify.py --iterations 5000
+    python scripts/benchmark_token_verify.py --token "$ID_TOKEN" --iterations 200
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+# Add the parent directory (backend) to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import jwt as google_jwt
+
+from app.token_verifier import FirebaseTokenVerifier, ISSUER_PREFIX
+
+PROJECT_ID = "benchmark-project"
+KID = "bench-key"
+
+
+def make_key_material():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(private_key, hashes.SHA256())
+    )
+    pem = cert.public_bytes(serialization.Encoding.PEM).decode("ascii")
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    return private_key, pem, {**jwk, "kid": KID, "alg": "RS256", "use": "sig"}
+
+
+def make_token(private_key) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER_PREFIX + PROJECT_ID,
+        "aud": PROJECT_ID,
+        "sub": "benchmark_user",
+        "iat": now,
+        "exp": now + 3600,
+        "auth_time": now,
+    }
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": KID})
+
+
+def measure(label: str, fn, iterations: int):
+    fn()  # Warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<44}{iterations / elapsed:>12,.0f} /s{elapsed / iterations * 1e6:>10.1f} us/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--token", default=os.getenv("ID_TOKEN", ""),
+                        help="Real Firebase ID token for the end-to-end SDK measurement")
+    args = parser.parse_args()
+
+    private_key, pem, jwk = make_key_material()
+    token = make_token(private_key)
+
+    verifier = FirebaseTokenVerifier(PROJECT_ID)
+    verifier.load_jwks({"keys": [jwk]}, max_age=3600)
+
+    print(f"=== ID token verification ({args.iterations} iterations) ===")
+    measure("local verifier (precompiled JWKS)", lambda: verifier.verify(token), args.iterations)
+    measure("SDK verify step (PEM parsed per call)",
+            lambda: google_jwt.decode(token, certs={KID: pem}, audience=PROJECT_ID), args.iterations)
+
+    if args.token:
+        from firebase_admin import auth as firebase_auth
+        from app.auth import get_firebase_app
+        get_firebase_app()
+        measure("firebase_auth.verify_id_token (real token)",
+                lambda: firebase_auth.verify_id_token(args.token), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
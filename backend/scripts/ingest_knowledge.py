@@ -1,7 +1,15 @@
+import argparse
 import asyncio
+import hashlib
 import os
 import glob
-import app.database 
+import time
+from typing import List, Optional
+
+from sqlalchemy import select, delete, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import app.database
 from app.models import DocumentChunk
 from app.config import settings, logger
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -11,29 +19,194 @@ from langchain_google_vertexai import VertexAIEmbeddings
 KB_DIR = os.path.join(os.path.dirname(__file__), "../docs/knowledge_base")
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+EMBED_BATCH_SIZE = 50  # Texts per embed_documents call (Vertex allows up to 250)
+EMBED_CONCURRENCY = 4  # In-flight embedding calls across all files
+FILE_CONCURRENCY = 4  # Files processed (and DB sessions held) at once
+INSERT_BATCH_SIZE = 200  # Rows per multi-row INSERT
+
+
+class IngestStats:
+    def __init__(self):
+        self.files = 0
+        self.files_skipped = 0
+        self.chunks_embedded = 0
+        self.chunks_unchanged = 0
+        self.chunks_removed = 0
+        self.embed_calls = 0
+        self.started = time.perf_counter()
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.chunks_embedded / elapsed if elapsed else 0.0
+        return (
+            f"{self.files} files ({self.files_skipped} unchanged), "
+            f"{self.chunks_embedded} chunks embedded, {self.chunks_unchanged} unchanged, "
+            f"{self.chunks_removed} removed, {self.embed_calls} embedding calls "
+            f"in {elapsed:.1f}s ({rate:.1f} chunks/s)"
+        )
+
+
+def chunk_hash(text_chunk: str, tags: List[str]) -> str:
+    """Identity of a stored chunk: content plus the tags it is filtered by."""
+    return hashlib.sha256(("\x1f".join(tags) + "\0" + text_chunk).encode("utf-8")).hexdigest()
+
+
+def extract_tags(content: str) -> List[str]:
+    if "**Tags**:" in content:
+        for line in content.split("\n"):
+            if line.startswith("**Tags**:"):
+                raw_tags = line.split(":", 1)[1].strip()
+                return [t.strip() for t in raw_tags.split(",")]
+    return []
+
+
+async def embed_texts(
+    embeddings_model: Optional[VertexAIEmbeddings],
+    texts: List[str],
+    semaphore: asyncio.Semaphore,
+    stats: IngestStats,
+) -> List[List[float]]:
+    """Embeds texts in batches of EMBED_BATCH_SIZE; batches run concurrently up to the semaphore."""
+    if not embeddings_model:
+        # Mock Vector (768 dims) - Deterministic mock for testing
+        # Slightly different per text to avoid identical vectors
+        return [[(i + 1) * 0.001] * 768 for i in range(len(texts))]
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            stats.embed_calls += 1
+            return await embeddings_model.aembed_documents(batch)
 
-async def ingest_knowledge_base():
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    results = await asyncio.gather(*[embed_batch(b) for b in batches])
+    return [vector for batch in results for vector in batch]
+
+
+async def ingest_file(
+    file_path: str,
+    embeddings_model: Optional[VertexAIEmbeddings],
+    embed_semaphore: asyncio.Semaphore,
+    stats: IngestStats,
+    force: bool = False,
+) -> int:
+    """
+    Syncs one markdown file into document_chunks.
+    Only chunks whose hash is new are embedded and inserted; chunks that no longer
+    exist in the file are deleted. Returns the number of rows written or removed.
+    """
+    filename = os.path.basename(file_path)
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    tags = extract_tags(content)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_text(content)
+
+    # Deduplicate identical chunks within the file, keeping first position
+    by_hash = {}
+    for i, text_chunk in enumerate(chunks):
+        by_hash.setdefault(chunk_hash(text_chunk, tags), (i, text_chunk))
+
+    # 1. Change detection against what is already stored for this source
+    async with app.database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DocumentChunk.content_hash).where(DocumentChunk.source == filename)
+        )
+        stored = [row[0] for row in result.all()]
+
+    stored_hashes = set(h for h in stored if h) if not force else set()
+    new_hashes = [h for h in by_hash if h not in stored_hashes]
+    stale_hashes = [h for h in stored_hashes if h not in by_hash]
+    has_legacy_rows = force or len(stored_hashes) != len(stored)  # rows from before content_hash existed
+
+    stats.files += 1
+    stats.chunks_unchanged += len(by_hash) - len(new_hashes)
+    if not new_hashes and not stale_hashes and not has_legacy_rows:
+        stats.files_skipped += 1
+        logger.info(f"{filename}: unchanged ({len(by_hash)} chunks), skipping")
+        return 0
+
+    # 2. Embed only the new chunks
+    texts = [by_hash[h][1] for h in new_hashes]
+    vectors = await embed_texts(embeddings_model, texts, embed_semaphore, stats)
+
+    rows = [
+        {
+            "content": by_hash[h][1],
+            "source": filename,
+            "embedding": vector,
+            "tags": tags,
+            "metadata_json": {"chunk_index": by_hash[h][0], "total_chunks": len(chunks)},
+            "content_hash": h,
+        }
+        for h, vector in zip(new_hashes, vectors)
+    ]
+
+    # 3. Apply the diff in one short transaction
+    async with app.database.AsyncSessionLocal() as session:
+        removed = 0
+        if stale_hashes or has_legacy_rows:
+            stmt = delete(DocumentChunk).where(DocumentChunk.source == filename)
+            if not force:
+                stmt = stmt.where(or_(
+                    DocumentChunk.content_hash.is_(None),
+                    DocumentChunk.content_hash.in_(stale_hashes),
+                ))
+            result = await session.execute(stmt)
+            removed = result.rowcount or 0
+
+        insert_stmt = pg_insert(DocumentChunk).on_conflict_do_nothing(
+            index_elements=["source", "content_hash"]
+        )
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            await session.execute(insert_stmt, rows[i:i + INSERT_BATCH_SIZE])
+        await session.commit()
+
+    stats.chunks_embedded += len(rows)
+    stats.chunks_removed += removed
+    logger.info(f"{filename}: {len(rows)} new, {len(by_hash) - len(new_hashes)} unchanged, {removed} removed")
+    return len(rows) + removed
+
+
+async def prune_missing_sources(current_sources: set, stats: IngestStats) -> int:
+    """Deletes chunks whose source file was deleted or renamed. Returns rows removed."""
+    async with app.database.AsyncSessionLocal() as session:
+        result = await session.execute(select(DocumentChunk.source).distinct())
+        missing = sorted(source for (source,) in result.all() if source not in current_sources)
+        if not missing:
+            return 0
+        result = await session.execute(delete(DocumentChunk).where(DocumentChunk.source.in_(missing)))
+        await session.commit()
+
+    removed = result.rowcount or 0
+    stats.chunks_removed += removed
+    logger.info(f"Pruned {removed} chunks from {len(missing)} missing sources: {', '.join(missing)}")
+    return removed
+
+
+async def ingest_knowledge_base(force: bool = False, prune: bool = True):
     """
     Main ingestion loop.
     1. Load MD files.
-    2. Split text.
-    3. Embed.
-    4. Store.
+    2. Split text and hash chunks.
+    3. Embed new chunks (batched, bounded concurrency).
+    4. Upsert/delete the per-file diff.
+    5. Delete chunks of sources no longer on disk (unless prune=False).
     """
     logger.info("Starting Knowledge Base Ingestion...")
-    
+
     # Check DB Connection String
     db_url = os.getenv("DATABASE_URL")
     logger.info(f"Target Database: {db_url}")
-    
+
     await app.database.init_connection_pool()
     logger.info("Creating tables if they don't exist...")
     await app.database.create_tables()
-    
+
     # 1. Initialize Vertex AI Embeddings
     try:
         if settings.is_production():
-             embeddings_model = VertexAIEmbeddings(model_name="text-embedding-004")
+             embeddings_model = VertexAIEmbeddings(model_name=settings.EMBEDDING_MODEL_ID)
         else:
             logger.warning("Running in MOCK mode for embeddings.")
             embeddings_model = None
@@ -47,73 +220,51 @@ async def ingest_knowledge_base():
     files = glob.glob(os.path.join(kb_dir_abs, "*.md"))
     logger.info(f"Found {len(files)} documents in {kb_dir_abs}")
 
-    total_chunks = 0
-    
     if not app.database.AsyncSessionLocal:
         logger.error("Database connection failed - AsyncSessionLocal is None.")
         return
 
-    async with app.database.AsyncSessionLocal() as session:
-        for file_path in files:
-            filename = os.path.basename(file_path)
-            logger.info(f"Processing {filename}...")
-            
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                
-            # Extract Metadata 
-            tags = []
-            if "**Tags**:" in content:
-                for line in content.split("\n"):
-                    if line.startswith("**Tags**:"):
-                        raw_tags = line.split(":", 1)[1].strip()
-                        tags = [t.strip() for t in raw_tags.split(",")]
-                        break
-            
-            # Split
-            splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-            chunks = splitter.split_text(content)
-            
-            # Embed & Store
-            batch_models = []
-            for i, text_chunk in enumerate(chunks):
-                # Embed
-                vector = []
-                if embeddings_model:
-                    try:
-                        vector = embeddings_model.embed_query(text_chunk)
-                    except Exception as e:
-                        logger.error(f"Embedding failed for chunk {i}: {e}")
-                        continue
-                else:
-                    # Mock Vector (768 dims) - Deterministic mock for testing
-                    # Generate a slightly different vector based on chunk index to avoid identical vectors
-                    # but keep it normalized-ish
-                    base_val = (i + 1) * 0.001
-                    vector = [base_val] * 768
-
-                doc = DocumentChunk(
-                    content=text_chunk,
-                    source=filename,
-                    embedding=vector,
-                    tags=tags,
-                    metadata_json={"chunk_index": i, "total_chunks": len(chunks)}
-                )
-                batch_models.append(doc)
-            
-            # Clear old chunks for this source (Idempotency) - Optional
-            # await session.execute(delete(DocumentChunk).where(DocumentChunk.source == filename))
-            
-            session.add_all(batch_models)
-            total_chunks += len(batch_models)
-            
-        await session.commit()
-    
-    logger.info(f"Ingestion Complete. Added {total_chunks} chunks.")
+    stats = IngestStats()
+    embed_semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+    file_semaphore = asyncio.Semaphore(FILE_CONCURRENCY)
+
+    async def process(file_path: str) -> int:
+        async with file_semaphore:
+            try:
+                return await ingest_file(file_path, embeddings_model, embed_semaphore, stats, force=force)
+            except Exception as e:
+                logger.error(f"Ingestion failed for {os.path.basename(file_path)}: {e}")
+                return 0
+            finally:
+                logger.info(f"Progress: {stats.files}/{len(files)} files")
+
+    changes = sum(await asyncio.gather(*[process(f) for f in files]))
+    if prune and not files:
+        logger.warning("No documents found; not pruning (would delete the whole knowledge base)")
+    elif prune:
+        changes += await prune_missing_sources({os.path.basename(f) for f in files}, stats)
+
+    # Tell the API instances to drop cached retrieval results. They LISTEN through
+    # app.event_bus (EVENT_BUS_BACKEND=postgres); otherwise RAG_CACHE_TTL_SECONDS bounds staleness.
+    if changes:
+        from app.event_bus import EventBus
+        from rag.retriever import KB_CHANNEL
+        try:
+            await EventBus.notify(KB_CHANNEL, str(changes))
+        except Exception as e:
+            logger.warning(f"Could not notify API instances of the change: {e}")
+
+    logger.info(f"Ingestion Complete. {stats.summary()}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync docs/knowledge_base into document_chunks.")
+    parser.add_argument("--force", action="store_true", help="Re-embed and rewrite every chunk")
+    parser.add_argument("--no-prune", action="store_true",
+                        help="Keep chunks whose source file no longer exists in the knowledge base")
+    args = parser.parse_args()
+
     # Fix for Windows loop
     if os.name == 'nt':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-        
-    asyncio.run(ingest_knowledge_base())
+
+    asyncio.run(ingest_knowledge_base(force=args.force, prune=not args.no_prune))
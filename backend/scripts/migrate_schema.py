@@ -11,7 +11,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import database
-from app.database import init_connection_pool
+import app.models  # Registers every table on Base.metadata
+from app.database import (
+    Base, init_connection_pool, ensure_vector_index, ensure_tag_index, ensure_chunk_hash_column, ensure_event_indexes,
+    ensure_event_external_id, ensure_performance_metric_reps, backfill_user_state,
+    rebuild_vector_index
+)
 from sqlalchemy import text
 
 async def migrate():
@@ -22,8 +27,14 @@ async def migrate():
         print("Failed to initialize database connection. Check config.")
         return
 
+    failed = []
     async with database.async_engine.begin() as conn:
         print("Running schema migrations...")
+
+        # Tables added since the last deploy (user_state, biometric_*, ...); existing ones are left alone
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all)
+        print("✓ Created missing tables")
         
         # Add coach_style column to users table if it doesn't exist
         try:
@@ -92,6 +103,31 @@ async def migrate():
         except Exception as e:
             print(f"  indexes: {e}")
         
+        # Each helper runs in a savepoint and logs (rather than raises) its failure
+        steps = [
+            # ANN index for RAG retrieval (type/params from RAG_VECTOR_INDEX settings)
+            (ensure_vector_index, "Verified vector index on document_chunks.embedding"),
+            (ensure_tag_index, "Verified JSONB tags + GIN index on document_chunks.tags"),
+            (ensure_chunk_hash_column, "Added content_hash column + unique index to document_chunks"),
+            (ensure_event_indexes, "Created events indexes (user_id, created_at) and (event_type, created_at)"),
+            (ensure_event_external_id, "Added external_id column + unique index to events"),
+            (ensure_performance_metric_reps, "Added reps column + (user_id, category, timestamp) index to performance_metrics"),
+            (backfill_user_state, "Backfilled user_state from users + recovery rollups"),
+        ]
+        for step, done in steps:
+            if await step(conn):
+                print(f"✓ {done}")
+            else:
+                print(f"✗ {step.__name__} failed (see warning above)")
+                failed.append(step.__name__)
+        
+        if "--reindex-vectors" in sys.argv:
+            try:
+                await rebuild_vector_index(conn)
+                print("✓ Rebuilt vector index")
+            except Exception as e:
+                print(f"  vector reindex: {e}")
+        
         # Update existing demo user to admin role
         try:
             await conn.execute(text("""
@@ -100,8 +136,11 @@ async def migrate():
             print("✓ Updated demo user to admin role")
         except Exception as e:
             print(f"  demo user update: {e}")
-            
-        print("Schema migration complete!")
+
+    if failed:
+        print(f"Schema migration incomplete, failed: {', '.join(failed)}")
+        sys.exit(1)
+    print("Schema migration complete!")
 
 if __name__ == "__main__":
     asyncio.run(migrate())
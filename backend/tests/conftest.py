@@ -1,8 +1,9 @@
 import pytest
 import asyncio
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy import text
 from app.database import Base
+import app.models  # Registers every table on Base.metadata
 
 @pytest.fixture(scope="session")
 def postgres_container():
@@ -30,3 +31,13 @@ def db_engine(postgres_container):
     
     # Sync wrapper for async teardown
     asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+async def session_factory():
+    """In-memory SQLite with the full schema (no Postgres needed); one fresh database per test."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
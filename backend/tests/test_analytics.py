@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+
+from app.aggregation import brzycki, daily, epley, linear_trend, rolling_mean, summarize
+from app.models import PerformanceMetric
+
+
+def test_e1rm_formulas():
+    weight = np.array([100.0, 100.0, 100.0])
+    reps = np.array([1.0, 5.0, np.nan])
+    np.testing.assert_allclose(epley(weight, reps), [100.0, 100 * (1 + 5 / 30), 100.0])
+    np.testing.assert_allclose(brzycki(weight, reps), [100.0, 100 * 36 / 32, 100.0])
+    assert np.isfinite(brzycki(np.array([50.0]), np.array([40.0]))).all()
+
+
+def test_windowing_helpers():
+    ts = np.array(["2026-01-01T08:00", "2026-01-01T18:00", "2026-01-02T09:00", "2026-01-04T07:00"], dtype="datetime64[us]")
+    values = np.array([10.0, 12.0, 11.0, 15.0])
+
+    days, last = daily(ts, values)
+    assert [str(d) for d in days] == ["2026-01-01", "2026-01-02", "2026-01-04"]
+    np.testing.assert_allclose(last, [12.0, 11.0, 15.0])
+    np.testing.assert_allclose(daily(ts, values, how="max")[1], [12.0, 11.0, 15.0])
+
+    np.testing.assert_allclose(rolling_mean(np.array([1.0, 2.0, 3.0, 4.0]), 2), [1.0, 1.5, 2.5, 3.5])
+    # Slope is per calendar day, so the gap before Jan 4 counts
+    assert linear_trend(np.array(["2026-01-01", "2026-01-03"], dtype="datetime64[D]"), np.array([10.0, 14.0])) == pytest.approx(2.0)
+
+    summary = summarize(ts, values)
+    assert summary["trend"] == "up" and summary["latest"] == 15.0
+    assert summary["history"][-1] == {"date": "2026-01-04", "value": 15.0, "rolling_avg": round((12 + 11 + 15) / 3, 2)}
+    assert summary["percentiles"]["p50"] == 12.0
+    assert summarize(ts[:0], values[:0])["history"] == []
+
+
+async def test_strength_endpoint_aggregates_per_exercise(session_factory):
+    from httpx import AsyncClient, ASGITransport
+    from app.main import app
+    from app.database import get_db
+    from app.auth import get_current_user, AuthenticatedUser
+
+    base = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=10)
+    async with session_factory() as session:
+        for day, (value, reps) in enumerate([(100, 5), (105, 5), (110, 3), (112, 1)]):
+            session.add(PerformanceMetric(user_id="u", category="strength", name="squat", value=value, unit="kg",
+                                          reps=reps, logged_by="u", timestamp=base + timedelta(days=day)))
+        session.add(PerformanceMetric(user_id="u", category="strength", name="bench", value=80, unit="kg",
+                                      logged_by="u", timestamp=base))
+        await session.commit()
+
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(uid="u", email=None, role="client")
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            body = (await ac.get("/analytics/strength")).json()
+            brzycki_body = (await ac.get("/analytics/strength", params={"exercise": "squat", "formula": "brzycki"})).json()
+    finally:
+        app.dependency_overrides.clear()
+
+    # Most recent exercise by default; bench is not mixed into the squat history
+    assert body["exercise"] == "squat" and len(body["history"]) == 4
+    assert body["history"][0]["value"] == pytest.approx(116.67, abs=0.01)  # Epley: 100 x 5
+    assert body["estimated_1rm"] == 112.0 and body["trend"] == "down"
+    assert brzycki_body["formula"] == "brzycki"
+    assert brzycki_body["history"][0]["value"] == pytest.approx(112.5)
+
+
+async def test_load_series_buckets_by_day_in_sql_within_window(session_factory):
+    from app.aggregation import load_series
+
+    rows = [
+        (datetime(2025, 1, 1, 9), 90, 5),  # Outside the window
+        (datetime(2026, 1, 1, 8), 100, 5),
+        (datetime(2026, 1, 1, 9), 95, 5),
+        (datetime(2026, 1, 1, 18), 110, 1),
+        (datetime(2026, 1, 2, 7), 105, 3),
+    ]
+    async with session_factory() as session:
+        for ts, value, reps in rows:
+            session.add(PerformanceMetric(user_id="u", category="strength", name="squat", value=value, unit="kg",
+                                          reps=reps, logged_by="u", timestamp=ts))
+        await session.commit()
+
+        since = datetime(2025, 12, 1)
+        last = await load_series(session, "u", "strength", name="squat", since=since)
+        best = await load_series(session, "u", "strength", name="squat", since=since, how="max")
+
+    assert [str(d) for d in last.timestamps.astype("datetime64[D]")] == ["2026-01-01", "2026-01-02"]
+    np.testing.assert_allclose(last.values, [110.0, 105.0])  # Latest entry of each day
+    # One row per (day, reps), keeping the heaviest: 100x5 beats 95x5
+    assert sorted(zip(best.values.tolist(), best.reps.tolist())) == [(100.0, 5.0), (105.0, 3.0), (110.0, 1.0)]
+    days, e1rm = daily(best.timestamps, epley(best.values, best.reps), how="max")
+    np.testing.assert_allclose(e1rm, [100 * (1 + 5 / 30), 105 * (1 + 3 / 30)])
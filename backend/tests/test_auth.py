@@ -71,3 +71,72 @@ async def test_auth_firebase_token_invalid(mock_settings, mock_db):
         with pytest.raises(HTTPException) as exc:
             await get_current_user(credentials=creds, api_key=None, db=mock_db)
         assert exc.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_auth_verified_token_and_user_row_cached(mock_settings, mock_db):
+    """Repeat requests with the same token skip both verification and the users lookup"""
+    import time
+    from app.auth import invalidate_user
+    from app.models import User
+
+    with patch("app.auth.firebase_auth.verify_id_token") as mock_verify:
+        mock_verify.return_value = {"uid": "cached_user", "email": "c@example.com", "exp": time.time() + 3600}
+        mock_result = MagicMock()
+        mock_result.scalar_one_or_none.return_value = User(id="cached_user", email="c@example.com", role="trainer")
+        mock_db.execute.return_value = mock_result
+
+        creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials="cacheable_token")
+        first = await get_current_user(credentials=creds, api_key=None, db=mock_db)
+        second = await get_current_user(credentials=creds, api_key=None, db=mock_db)
+
+        assert first.role == second.role == "trainer"
+        assert mock_verify.call_count == 1
+        assert mock_db.execute.call_count == 1
+
+        # A role change drops the cached row
+        invalidate_user("cached_user")
+        await get_current_user(credentials=creds, api_key=None, db=mock_db)
+        assert mock_db.execute.call_count == 2
+        invalidate_user()
+
+
+def _signed_token(private_key, kid="k1", **overrides):
+    import time
+    import jwt
+    now = int(time.time())
+    claims = {
+        "iss": "https://securetoken.google.com/test-project",
+        "aud": "test-project",
+        "sub": "local_user",
+        "iat": now,
+        "exp": now + 3600,
+        "auth_time": now,
+        **overrides,
+    }
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def test_local_token_verifier():
+    """JWKS-backed verifier accepts well-formed tokens and rejects wrong audience / unknown keys"""
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from app.token_verifier import FirebaseTokenVerifier, InvalidTokenError, UnknownSigningKeyError
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    verifier = FirebaseTokenVerifier("test-project")
+    assert not verifier.ready
+    verifier.load_jwks({"keys": [{**jwk, "kid": "k1", "alg": "RS256", "use": "sig"}]}, max_age=3600)
+
+    claims = verifier.verify(_signed_token(private_key))
+    assert claims["uid"] == "local_user"
+
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(_signed_token(private_key, aud="other-project"))
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(_signed_token(private_key, exp=1))
+    tampered = _signed_token(private_key).split(".")
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(".".join([tampered[0], _signed_token(private_key, sub="intruder").split(".")[1], tampered[2]]))
+    with pytest.raises(UnknownSigningKeyError):
+        verifier.verify(_signed_token(private_key, kid="rotated"))
@@ -0,0 +1,66 @@
+from datetime import datetime
+from unittest.mock import patch
+from sqlalchemy import select, func
+
+from app.biometrics import extract_samples, record_samples, latest_value, metric_trend
+from app.models import BiometricSample
+
+
+def _terra_sample(end_time: str, recovery: float) -> dict:
+    return {"metadata": {"end_time": end_time}, "scores": {"recovery": recovery, "label": "n/a"}}
+
+
+def test_extract_samples_wearable_and_terra():
+    at = datetime(2026, 3, 1, 8, 0)
+    wearable = extract_samples("1", "wearable", {"device_type": "oura", "recovery_score": 45, "data": {"hrv": 31, "note": "x"}}, at)
+    assert {(s["metric"], s["value"], s["source"]) for s in wearable} == {("recovery", 45.0, "oura"), ("hrv", 31.0, "oura")}
+
+    terra = extract_samples("u", "daily_summary", {"user": {"provider": "WHOOP"}, "data": [_terra_sample("2026-03-01T09:30:00+01:00", 61)]}, at)
+    assert terra == [{"metric": "recovery", "value": 61.0, "ts": datetime(2026, 3, 1, 8, 30), "source": "WHOOP", "user_id": "u"}]
+
+    assert extract_samples("1", "vision", {"detected_equipment": ["Mat"]}, at) == []
+
+
+async def test_rollups_are_incremental_and_ignore_redelivery(session_factory):
+    samples = [
+        {"user_id": "u", "metric": "recovery", "ts": datetime(2026, 3, 1, 7, 10), "value": 40.0, "source": "oura"},
+        {"user_id": "u", "metric": "recovery", "ts": datetime(2026, 3, 1, 7, 50), "value": 60.0, "source": "oura"},
+        {"user_id": "u", "metric": "recovery", "ts": datetime(2026, 3, 2, 6, 0), "value": 55.0, "source": "oura"},
+    ]
+    async with session_factory() as session:
+        assert await record_samples(session, samples[:2]) == 2
+        await session.commit()
+    async with session_factory() as session:
+        # Second batch repeats a reading: only the new one is folded in
+        assert await record_samples(session, samples[1:]) == 1
+        late = {"user_id": "u", "metric": "recovery", "ts": datetime(2026, 3, 1, 7, 0), "value": 90.0, "source": "whoop"}
+        assert await record_samples(session, [late]) == 1
+        await session.commit()
+
+    async with session_factory() as session:
+        days = await metric_trend(session, "u", "recovery")
+        hours = await metric_trend(session, "u", "recovery", bucket="hour", since=datetime(2026, 3, 1, 7, 30))
+        latest = await latest_value(session, "u", "recovery")
+        assert await session.scalar(select(func.count()).select_from(BiometricSample)) == 4
+
+    assert [(d["count"], d["avg"], d["min"], d["max"], d["last"]) for d in days] == [
+        (3, 190 / 3, 40.0, 90.0, 60.0),  # Out-of-order reading does not replace the latest
+        (1, 55.0, 55.0, 55.0, 55.0),
+    ]
+    assert [h["bucket_start"] for h in hours] == [datetime(2026, 3, 1, 7), datetime(2026, 3, 2, 6)]
+    assert latest == 55.0
+
+
+async def test_event_ingest_records_biometrics(session_factory):
+    from app.ingest import write_event_rows, terra_event_rows
+
+    rows = terra_event_rows("daily", {"user_id": "terra-1", "provider": "OURA"}, [
+        _terra_sample("2026-03-01T08:00:00Z", 50),
+        _terra_sample("2026-03-02T08:00:00Z", 70),
+    ])
+    with patch("app.database.AsyncSessionLocal", session_factory):
+        await write_event_rows(rows)
+
+    async with session_factory() as session:
+        assert await latest_value(session, "terra-1", "recovery") == 70.0
+        assert len(await metric_trend(session, "terra-1", "recovery")) == 2
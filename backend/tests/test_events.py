@@ -0,0 +1,136 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.main import paginate_events
+from app.models import EventLog
+
+
+@pytest.fixture
+async def events_db(session_factory):
+    """A session on the shared in-memory database, seeded with seven events."""
+    base = datetime(2026, 1, 1)
+    async with session_factory() as session:
+        # Two rows share a timestamp to exercise the id tie-break
+        for i in range(1, 8):
+            ts = base + timedelta(minutes=min(i, 6))
+            session.add(EventLog(id=i, user_id="c1" if i % 2 else "c2", event_type="wearable", payload={}, created_at=ts))
+        await session.commit()
+        yield session
+
+
+async def fetch_ids(session, stmt):
+    return [row.id for row in (await session.execute(stmt)).scalars().all()]
+
+
+async def test_keyset_pages_cover_feed_without_gaps(events_db):
+    first = await fetch_ids(events_db, paginate_events(select(EventLog), limit=3))
+    second = await fetch_ids(events_db, paginate_events(select(EventLog), limit=3, before_id=first[-1]))
+    third = await fetch_ids(events_db, paginate_events(select(EventLog), limit=3, before_id=second[-1]))
+
+    assert first == [7, 6, 5]
+    assert second == [4, 3, 2]
+    assert third == [1]
+
+
+async def test_after_id_returns_only_newer_rows(events_db):
+    newer = await fetch_ids(events_db, paginate_events(select(EventLog), limit=10, after_id=5))
+    assert sorted(newer) == [6, 7]
+
+    scoped = await fetch_ids(
+        events_db, paginate_events(select(EventLog).where(EventLog.user_id == "c1"), limit=10, before_id=7)
+    )
+    assert scoped == [5, 3, 1]
+
+
+async def test_cursor_survives_deleted_cursor_row(events_db):
+    await events_db.delete(await events_db.get(EventLog, 5))
+    await events_db.commit()
+
+    assert sorted(await fetch_ids(events_db, paginate_events(select(EventLog), limit=10, after_id=5))) == [6, 7]
+    assert await fetch_ids(events_db, paginate_events(select(EventLog), limit=10, before_id=5)) == [4, 3, 2, 1]
+
+
+async def test_events_endpoint_delta_and_etag(events_db):
+    from httpx import AsyncClient, ASGITransport
+    from app.main import app
+    from app.database import get_db
+    from app.auth import get_current_user, AuthenticatedUser
+
+    async def override_db():
+        yield events_db
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(uid="admin", email=None, role="admin")
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            full = await ac.get("/events", params={"limit": 50})
+            assert [e["id"] for e in full.json()] == [7, 6, 5, 4, 3, 2, 1]
+            etag = full.headers["etag"]
+
+            unchanged = await ac.get("/events", params={"limit": 50}, headers={"If-None-Match": etag})
+            assert unchanged.status_code == 304
+            assert unchanged.content == b""
+
+            delta = await ac.get("/events", params={"since_id": 5})
+            assert [e["id"] for e in delta.json()] == [7, 6]
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def test_event_bus_fans_out_to_matching_subscribers():
+    from app.event_bus import EventBus
+
+    bus = EventBus(queue_size=2)
+    everyone = bus.subscribe()
+    c1_only = bus.subscribe(lambda event: event["user_id"] == "c1")
+
+    for i, user in enumerate(["c1", "c2", "c1"], start=1):
+        await bus.publish(EventLog(id=i, user_id=user, event_type="chat", payload={}))
+
+    # Bounded queue keeps the newest events for slow consumers
+    assert [(await everyone.get(0.1))["id"] for _ in range(2)] == [2, 3]
+    assert everyone.dropped == 1
+    assert [(await c1_only.get(0.1))["id"] for _ in range(2)] == [1, 3]
+    assert await c1_only.get(0.01) is None
+
+    everyone.close()
+    c1_only.close()
+    assert bus.subscriber_count == 0
+
+
+def test_event_bus_channel_handlers_receive_notify_payloads():
+    from app.event_bus import EventBus
+
+    bus = EventBus(backend="postgres")
+    received = []
+    bus.listen("knowledge_base", received.append)
+
+    listener = bus._channel_listener(bus._channel_handlers["knowledge_base"])
+    listener(None, 1234, "knowledge_base", "12")
+    assert received == ["12"]
+
+    # A failing handler must not break the LISTEN connection's callback loop
+    bus._channel_listener(lambda payload: 1 / 0)(None, 1234, "knowledge_base", "")
+
+
+async def test_trainer_roster_cached_until_invalidated(events_db):
+    from app.models import User
+    from app.users import get_trainer_client_ids, invalidate_roster, trainer_clients_subquery
+
+    events_db.add_all([User(id="t1", role="trainer"), User(id="c1", role="client", trainer_id="t1")])
+    await events_db.commit()
+    invalidate_roster()
+
+    assert await get_trainer_client_ids(events_db, "t1") == ["c1"]
+
+    # Scoped events resolve the roster inside the same statement
+    scoped = select(EventLog).where(EventLog.user_id.in_(trainer_clients_subquery("t1")))
+    assert await fetch_ids(events_db, paginate_events(scoped, limit=10)) == [7, 5, 3, 1]
+
+    events_db.add(User(id="c2", role="client", trainer_id="t1"))
+    await events_db.commit()
+    assert await get_trainer_client_ids(events_db, "t1") == ["c1"]  # Served from cache
+
+    invalidate_roster("t1")
+    assert sorted(await get_trainer_client_ids(events_db, "t1")) == ["c1", "c2"]
+    invalidate_roster()
@@ -15,7 +15,7 @@ async def test_wearable_graph_flow():
     Verifies that the LangGraph logic works (Graph Isolation).
     Does NOT write to DB.
     """
-    with patch('app.graph.gemini_client.generate_content') as mock_gen:
+    with patch('app.graph.gemini_client.generate_content_async', new_callable=AsyncMock) as mock_gen:
         mock_gen.return_value = "Take a rest day, boss. (Mocked)"
         
         from app.graph import app_graph
@@ -38,7 +38,7 @@ async def test_vision_graph_flow():
     """
     Verifies Vision Agent graph logic.
     """
-    with patch('app.graph.gemini_client.generate_content') as mock_gen:
+    with patch('app.graph.gemini_client.generate_content_async', new_callable=AsyncMock) as mock_gen:
         mock_gen.return_value = "Hypertrophy Bench Press Plan (Mocked)"
         
         from app.graph import app_graph
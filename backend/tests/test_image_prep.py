@@ -0,0 +1,65 @@
+import io
+import pytest
+from PIL import Image
+
+from app.image_prep import ImagePreprocessor, prepare_image
+
+
+def phone_photo(size=(4032, 3024), orientation=None) -> bytes:
+    img = Image.new("RGB", size, (120, 80, 40))
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=95, exif=exif.tobytes())
+    return out.getvalue()
+
+
+def test_downsizes_and_strips_exif():
+    result = prepare_image(phone_photo(), max_edge=1024, quality=80)
+
+    with Image.open(io.BytesIO(result)) as img:
+        assert max(img.size) == 1024
+        assert img.size == (1024, 768)
+        assert not img.getexif()
+        assert "exif" not in img.info
+
+
+def test_applies_orientation_before_dropping_it():
+    # Orientation 6 = rotate 90° CW: a landscape sensor image is a portrait photo
+    result = prepare_image(phone_photo(size=(800, 600), orientation=6), max_edge=1024, quality=80)
+
+    with Image.open(io.BytesIO(result)) as img:
+        assert img.size == (600, 800)
+        assert not img.getexif()
+
+
+def test_small_clean_image_is_kept_when_reencoding_would_grow_it():
+    out = io.BytesIO()
+    Image.effect_noise((64, 64), 100).convert("RGB").save(out, format="JPEG", quality=10)
+    small = out.getvalue()
+
+    assert prepare_image(small, max_edge=1024, quality=95) is small
+
+
+async def test_preprocessor_runs_in_pool_and_falls_back_on_bad_input():
+    prep = ImagePreprocessor(max_edge=512, quality=80, workers=1)
+    try:
+        photo = phone_photo()
+        result = await prep.process(memoryview(photo))
+        with Image.open(io.BytesIO(result)) as img:
+            assert max(img.size) == 512
+        assert len(result) < len(photo)
+
+        assert await prep.process(b"not an image") == b"not an image"
+        assert prep.stats()["processed"] == 1
+        assert prep.stats()["failed"] == 1
+    finally:
+        prep.shutdown()
+
+
+async def test_disabled_preprocessor_passes_bytes_through():
+    prep = ImagePreprocessor(enabled=False)
+    assert await prep.process(memoryview(b"raw")) == b"raw"
+    assert prep.version == "original"
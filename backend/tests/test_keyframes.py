@@ -0,0 +1,100 @@
+import pytest
+import numpy as np
+
+cv2 = pytest.importorskip("cv2")
+
+from app.keyframes import KeyframeSampler, extract_keyframes
+
+
+def make_clip(tmp_path, seconds=4, fps=10, still_until=None) -> bytes:
+    """A 320x240 clip with a white square moving left to right (static until `still_until` s)."""
+    path = str(tmp_path / "rep.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (320, 240))
+    for i in range(seconds * fps):
+        t = i / fps
+        moving = still_until is None or t >= still_until
+        x = int(10 + (t * 60 if moving else 0)) % 260
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        frame[90:150, x:x + 60] = 255
+        writer.write(frame)
+    writer.release()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def decode(jpeg: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_fixed_mode_samples_at_fps(tmp_path):
+    frames = extract_keyframes(make_clip(tmp_path), mode="fixed", sample_fps=2, max_frames=16, max_edge=160)
+
+    assert [f.timestamp for f in frames] == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5]
+    assert decode(frames[0].jpeg).shape[:2] == (120, 160)
+
+
+def test_fixed_mode_spreads_long_clips_over_max_frames(tmp_path):
+    frames = extract_keyframes(make_clip(tmp_path, seconds=8), mode="fixed", sample_fps=4, max_frames=4)
+
+    assert len(frames) == 4
+    assert frames[0].timestamp == 0.0
+    assert frames[-1].timestamp >= 6.0  # Covers the end of the clip, not just the first second
+
+
+def test_fixed_mode_covers_clips_without_a_frame_count(tmp_path, monkeypatch):
+    real_capture = cv2.VideoCapture
+
+    class NoFrameCount:
+        """Like a MediaRecorder WebM: the container doesn't report its length."""
+        def __init__(self, path):
+            self._capture = real_capture(path)
+
+        def get(self, prop):
+            return 0.0 if prop == cv2.CAP_PROP_FRAME_COUNT else self._capture.get(prop)
+
+        def __getattr__(self, name):
+            return getattr(self._capture, name)
+
+    monkeypatch.setattr(cv2, "VideoCapture", NoFrameCount)
+    frames = extract_keyframes(make_clip(tmp_path, seconds=8), mode="fixed", sample_fps=4, max_frames=4)
+
+    assert len(frames) == 4
+    assert frames[0].timestamp == 0.0
+    assert frames[-1].timestamp >= 6.0  # Not truncated to the first max_frames / sample_fps seconds
+    gaps = np.diff([f.timestamp for f in frames])
+    assert gaps.max() - gaps.min() <= 1.0  # Still evenly spread
+
+
+def test_motion_mode_skips_static_frames(tmp_path):
+    clip = make_clip(tmp_path, seconds=4, still_until=2)
+    frames = extract_keyframes(clip, mode="motion", max_frames=16, motion_threshold=2.0)
+
+    assert frames[0].timestamp == 0.0
+    # Nothing moves in the first two seconds, so the next keyframe comes after that
+    assert frames[1].timestamp >= 2.0
+    assert len(frames) <= 16
+
+
+async def test_sampler_falls_back_to_full_video():
+    sampler = KeyframeSampler(mode="fixed")
+    assert await sampler.sample(b"not a video") is None
+    assert sampler.stats()["failed"] == 1
+
+    assert await KeyframeSampler(mode="full").sample(b"anything") is None
+    assert KeyframeSampler(mode="full").version == "full"
+
+
+async def test_sampler_reports_bytes(tmp_path):
+    clip = make_clip(tmp_path)
+    sampler = KeyframeSampler(mode="fixed", sample_fps=1, max_frames=4, max_edge=160)
+
+    frames = await sampler.sample(memoryview(clip))
+
+    assert len(frames) == 4
+    assert sampler.stats()["frames"] == 4
+    assert sampler.stats()["bytes_out"] < sampler.stats()["bytes_in"]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        KeyframeSampler(mode="every-frame")
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from app.llm import LLMGate
+
+
+@pytest.mark.asyncio
+async def test_gate_caps_concurrency():
+    """No more than max_concurrency calls should be in flight at once."""
+    gate = LLMGate(max_concurrency=2, timeout=5)
+    peak = 0
+
+    async def fake_call():
+        nonlocal peak
+        peak = max(peak, gate.in_flight)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    results = await asyncio.gather(*[gate.run(fake_call) for _ in range(6)])
+
+    assert results == ["ok"] * 6
+    assert peak == 2
+    assert gate.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_gate_times_out_slow_call():
+    gate = LLMGate(max_concurrency=1, timeout=0.01)
+
+    async def slow_call():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await gate.run(slow_call)
+    assert gate.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_gemini_client_async_timeout_returns_error_text():
+    """A timed-out generation degrades to an error string instead of failing the graph."""
+    from app.graph import GeminiClient
+
+    client = GeminiClient()
+    client._initialized = True
+    client.model = MagicMock()
+    client.model.generate_content_async = AsyncMock(side_effect=asyncio.TimeoutError())
+
+    result = await client.generate_content_async("How is my recovery?")
+    assert result.startswith("[LLM_ERROR]")
+
+
+def test_model_registry_inits_once_and_reuses_handles():
+    from unittest.mock import patch
+    from app.llm import ModelRegistry
+
+    registry = ModelRegistry("proj", "us-central1", "gemini-test")
+    tools = [object()]
+    with patch("vertexai.init") as init, \
+         patch("vertexai.generative_models.GenerativeModel", side_effect=lambda *a, **kw: MagicMock()) as model_cls:
+        default = registry.get()
+        assert registry.get() is default
+        assert registry.get("gemini-test", tools=tools) is registry.get(tools=tools)
+        json_cfg = registry.get(generation_config={"response_mime_type": "application/json"})
+        assert json_cfg is registry.get(generation_config={"response_mime_type": "application/json"})
+        assert len({id(default), id(json_cfg), id(registry.get(tools=tools))}) == 3
+
+    init.assert_called_once()
+    assert model_cls.call_count == 3
+    assert registry.stats()["handles"] == 3
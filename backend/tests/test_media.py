@@ -0,0 +1,73 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.main import app
+from app.database import get_db
+
+
+async def _no_db():
+    yield None
+
+
+@pytest.fixture
+async def client():
+    app.dependency_overrides[get_db] = _no_db
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            yield ac
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def test_video_upload_is_spooled_and_passed_as_view(client):
+    clip = bytes(range(256)) * 8192  # 2 MiB: past the in-memory spool, so it is mmapped
+    received = {}
+
+    async def fake_analyze_form(video, mime_type="video/mp4"):
+        received.update(kind=type(video), size=len(video), head=bytes(video[:4]), mime_type=mime_type)
+        return "Chest up."
+
+    with patch("app.graph.analyze_form", side_effect=fake_analyze_form):
+        res = await client.post(
+            "/events/vision/upload",
+            files={"media": ("squat.webm", clip, "video/webm")},
+            data={"user_query": "Check my squat"},
+        )
+
+    assert res.status_code == 200
+    assert res.json()["suggested_action"] == "FORM_CHECK_COMPLETE"
+    assert received == {"kind": memoryview, "size": len(clip), "head": clip[:4], "mime_type": "video/webm"}
+
+
+async def test_image_upload_feeds_equipment_detection(client):
+    seen = []
+
+    async def describe(image):
+        seen.append(bytes(image))  # The view is released once the request finishes
+        return {"detected_equipment": ["Rack"], "confidence_score": 0.9}
+
+    with patch("app.graph.describe_gym_equipment", side_effect=describe), \
+         patch("app.graph.gemini_client.generate_content_async", AsyncMock(return_value="Plan")):
+        res = await client.post("/events/vision/upload", files={"media": ("gym.jpg", b"\xff\xd8jpeg", "image/jpeg")})
+
+    assert res.status_code == 200
+    assert seen == [b"\xff\xd8jpeg"]
+
+
+async def test_upload_limits_and_types(client):
+    with patch("app.config.settings.MEDIA_MAX_IMAGE_BYTES", 1024), \
+         patch("app.config.settings.MEDIA_MAX_VIDEO_BYTES", 2048):
+        too_big = await client.post("/events/vision/upload", files={"media": ("a.jpg", b"x" * 1500, "image/jpeg")})
+        declared = await client.post(
+            "/events/vision/upload",
+            content=b"--x--",
+            headers={"content-type": "multipart/form-data; boundary=x", "content-length": str(10 * 1024 * 1024)},
+        )
+    unsupported = await client.post("/events/vision/upload", files={"media": ("a.gif", b"GIF89a", "image/gif")})
+    missing = await client.post("/events/vision/upload", data={"user_query": "hi"}, files={"other": ("a.jpg", b"x", "image/jpeg")})
+
+    assert too_big.status_code == 413
+    assert declared.status_code == 413
+    assert unsupported.status_code == 415
+    assert missing.status_code == 400
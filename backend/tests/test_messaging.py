@@ -0,0 +1,72 @@
+import pytest
+from app.messaging import MessageOutbox, FakeTransport, TransientSendError, OutboundMessage
+
+
+@pytest.mark.asyncio
+async def test_outbox_preserves_per_recipient_order():
+    transport = FakeTransport(delay=0.001)
+    outbox = MessageOutbox(transport=transport, workers=3, backoff_base=0)
+
+    for i in range(5):
+        for recipient in ["whatsapp:+1", "whatsapp:+2", "whatsapp:+3"]:
+            assert outbox.enqueue_whatsapp(recipient, f"{recipient} #{i}")
+    await outbox.queue.join()
+
+    for recipient in ["whatsapp:+1", "whatsapp:+2", "whatsapp:+3"]:
+        bodies = [m.body for m in transport.sent if m.to == recipient]
+        assert bodies == [f"{recipient} #{i}" for i in range(5)]
+    assert outbox.delivered == 15
+    await outbox.stop()
+
+
+@pytest.mark.asyncio
+async def test_outbox_retries_transient_failures_then_gives_up():
+    outbox = MessageOutbox(transport=FakeTransport(fail_times=2), max_attempts=3, backoff_base=0)
+    sid = await outbox.send_now(OutboundMessage(channel="sms", to="+44", body="hi"))
+    assert sid == "FAKE_SID_1"
+
+    failing = MessageOutbox(transport=FakeTransport(fail_times=5), max_attempts=3, backoff_base=0)
+    with pytest.raises(TransientSendError):
+        await failing.send_now(OutboundMessage(channel="sms", to="+44", body="hi"))
+    assert failing.transport.failures == 3
+
+
+@pytest.mark.asyncio
+async def test_outbox_rejects_when_full():
+    outbox = MessageOutbox(transport=FakeTransport(delay=0.05), workers=1, maxsize=1, backoff_base=0)
+    assert outbox.enqueue_whatsapp("+1", "a")
+    assert outbox.enqueue_whatsapp("+1", "b") is False  # Worker hasn't picked "a" up yet
+    assert outbox.dropped == 1
+    await outbox.stop()
+
+
+@pytest.mark.asyncio
+async def test_notifier_batches_burst_and_dedupes_alerts():
+    from firebase_admin import exceptions as firebase_exceptions
+    from app.notifications import NotificationDispatcher
+
+    calls = []
+    flaky = {"user_3"}
+
+    def send_batch(messages):
+        calls.append([m.topic for m in messages])
+        errors = []
+        for m in messages:
+            if m.topic in flaky:
+                flaky.discard(m.topic)
+                errors.append(firebase_exceptions.UnavailableError("try again"))
+            else:
+                errors.append(None)
+        return errors
+
+    notifier = NotificationDispatcher(send_batch=send_batch, batch_window=0.01, backoff_base=0)
+    for user in ["user_1", "user_2", "user_3"]:
+        assert notifier.notify_topic(user, "Alert", "RED", dedupe_key=f"RED:{user}")
+    assert notifier.notify_topic("user_1", "Alert", "RED", dedupe_key="RED:user_1") is False
+    assert notifier.notify_topic("user_2", "Alert", "Other")  # Merged into the pending push
+
+    await notifier.stop()
+
+    assert calls == [["user_1", "user_2", "user_3"], ["user_3"]]  # One batch, then the retry
+    assert notifier.stats()["sent"] == 3
+    assert notifier.deduped == 1 and notifier.coalesced == 1
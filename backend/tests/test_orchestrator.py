@@ -0,0 +1,25 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from agents.orchestrator import get_workout_plan
+from app.models import User
+
+
+@pytest.mark.parametrize("is_traveling", [False, True])
+async def test_travel_restriction_only_for_travelling_clients(session_factory, is_traveling):
+    async with session_factory() as session:
+        session.add(User(id="u", role="client", is_traveling=is_traveling))
+        await session.commit()
+
+    chat = MagicMock()
+    chat.send_message_async = AsyncMock(return_value=MagicMock(text="plan"))
+    model = MagicMock()
+    model.start_chat.return_value = chat
+
+    with patch("agents.orchestrator.model_registry.get", return_value=model), \
+         patch("app.database.async_engine", session_factory.kw["bind"]):
+        await get_workout_plan("u")
+
+    prompt = chat.send_message_async.call_args.args[0]
+    assert ("TRAVELING" in prompt) is is_traveling
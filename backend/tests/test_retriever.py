@@ -0,0 +1,230 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.cache import TTLCache
+from rag.retriever import Retriever
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_hits_cache():
+    """The constant Biometric Sentry query should only search once."""
+    r = Retriever()
+    with patch.object(r, "_search", new_callable=AsyncMock) as mock_search:
+        mock_search.return_value = "Source: recovery.md\nContent: Sleep more."
+
+        first = await r.retrieve_protocol(query="recovery low hrv fatigue", tags=["recovery"])
+        second = await r.retrieve_protocol(query="recovery low hrv fatigue", tags=["recovery"])
+
+        assert first == second == "Source: recovery.md\nContent: Sleep more."
+        assert mock_search.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_search():
+    r = Retriever()
+    calls = 0
+
+    async def slow_search(query, tags, k, match_all=False):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "ctx"
+
+    with patch.object(r, "_search", side_effect=slow_search):
+        results = await asyncio.gather(*[r.retrieve_protocol("q", ["recovery"]) for _ in range(5)])
+
+    assert results == ["ctx"] * 5
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_and_errors_are_not_cached():
+    r = Retriever()
+    with patch.object(r, "_search", new_callable=AsyncMock) as mock_search:
+        mock_search.side_effect = RuntimeError("Database not initialized.")
+        assert await r.retrieve_protocol("q") == ""
+
+        mock_search.side_effect = None
+        mock_search.return_value = "ctx"
+        assert await r.retrieve_protocol("q") == "ctx"
+
+        r.invalidate_cache()
+        await r.retrieve_protocol("q")
+        assert mock_search.await_count == 3
+
+
+def test_ttl_cache_expiry_and_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # 'a' is now most recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+
+    cache.set("short", 4, ttl=0)
+    assert cache.get("short") is None
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_normalizes_and_counts(tmp_path):
+    from rag.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(maxsize=8, ttl=60)
+    embed = AsyncMock(return_value=[0.5] * 4)
+
+    await cache.get_or_compute("recovery  low hrv", "text-embedding-004", embed)
+    await cache.get_or_compute(" recovery low\nhrv ", "text-embedding-004", embed)
+    await cache.get_or_compute("recovery low hrv", "other-model", embed)
+
+    assert embed.await_count == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_disk_tier_survives_restart(tmp_path):
+    from rag.embedding_cache import EmbeddingCache
+
+    path = str(tmp_path / "embeddings.sqlite")
+    embed = AsyncMock(return_value=[0.1, 1 / 3])  # Not exactly representable in float32
+
+    first = EmbeddingCache(path=path)
+    fresh = await first.get_or_compute("sleep protocol", "m", embed)
+
+    second = EmbeddingCache(path=path)
+    vector = await second.get_or_compute("sleep protocol", "m", embed)
+
+    assert vector == fresh == [0.1, 1 / 3]
+    assert embed.await_count == 1
+    assert second.stats()["disk_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_replaces_legacy_float32_rows(tmp_path):
+    import sqlite3
+    import time
+    from array import array
+    from rag.embedding_cache import EmbeddingCache
+
+    path = str(tmp_path / "embeddings.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)")
+        conn.execute("INSERT INTO embeddings VALUES (?, ?, ?)",
+                     (EmbeddingCache.make_key("q", "m"), array("f", [0.1]).tobytes(), time.time()))
+
+    embed = AsyncMock(return_value=[0.1])
+    assert await EmbeddingCache(path=path).get_or_compute("q", "m", embed) == [0.1]
+    assert await EmbeddingCache(path=path).get_or_compute("q", "m", embed) == [0.1]
+    assert embed.await_count == 1  # Legacy row re-embedded once, then served from disk as float64
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_counts_joined_calls_separately():
+    from rag.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache()
+
+    async def slow_embed(text):
+        await asyncio.sleep(0.01)
+        return [0.5]
+
+    await asyncio.gather(*[cache.get_or_compute("q", "m", slow_embed) for _ in range(3)])
+    await cache.get_or_compute("q", "m", slow_embed)
+
+    assert (cache.stats()["misses"], cache.stats()["joined"], cache.stats()["hits"]) == (1, 2, 1)
+
+
+def test_tag_filter_uses_indexable_jsonb_operators():
+    from sqlalchemy.dialects import postgresql
+
+    any_sql = str(Retriever.build_search_statement([0.1] * 768, ["recovery"], 3).compile(dialect=postgresql.dialect()))
+    all_sql = str(Retriever.build_search_statement([0.1] * 768, ["recovery", "sleep"], 3, match_all=True).compile(dialect=postgresql.dialect()))
+    untagged_sql = str(Retriever.build_search_statement([0.1] * 768, [], 3).compile(dialect=postgresql.dialect()))
+
+    assert "document_chunks.tags ?|" in any_sql
+    assert "document_chunks.tags @>" in all_sql
+    assert "WHERE" not in untagged_sql
+
+
+@pytest.mark.asyncio
+async def test_ingest_embeds_in_ordered_batches():
+    from scripts.ingest_knowledge import embed_texts, IngestStats, EMBED_BATCH_SIZE
+
+    model = AsyncMock()
+    model.aembed_documents.side_effect = lambda batch: [[float(t)] for t in batch]
+    texts = [str(i) for i in range(EMBED_BATCH_SIZE * 2 + 1)]
+    stats = IngestStats()
+
+    vectors = await embed_texts(model, texts, asyncio.Semaphore(2), stats)
+
+    assert vectors == [[float(t)] for t in texts]
+    assert stats.embed_calls == 3
+
+
+@pytest.mark.asyncio
+async def test_ingest_prunes_chunks_of_deleted_sources(session_factory):
+    from sqlalchemy import select
+    from app.models import DocumentChunk
+    from scripts.ingest_knowledge import prune_missing_sources, IngestStats
+
+    async with session_factory() as session:
+        for source in ["recovery.md", "recovery.md", "old_name.md"]:
+            session.add(DocumentChunk(content="c", embedding=[0.1] * 768, source=source, tags=[]))
+        await session.commit()
+
+    stats = IngestStats()
+    with patch("app.database.AsyncSessionLocal", session_factory):
+        assert await prune_missing_sources({"recovery.md", "new_name.md"}, stats) == 1
+        assert await prune_missing_sources({"recovery.md"}, stats) == 0
+
+    async with session_factory() as session:
+        assert (await session.execute(select(DocumentChunk.source))).scalars().all() == ["recovery.md", "recovery.md"]
+    assert stats.chunks_removed == 1
+
+
+def test_vector_index_options_round_trip_through_indexdef():
+    from app.database import parse_index_options, vector_index_options
+
+    indexdef = ("CREATE INDEX ix_document_chunks_embedding_hnsw ON public.document_chunks "
+                "USING hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64')")
+    assert parse_index_options(indexdef) == {"m": "16", "ef_construction": "64"}
+    assert parse_index_options("CREATE INDEX ix ON t USING btree (id)") == {}
+
+    with patch("app.database.settings.RAG_VECTOR_INDEX", "hnsw"), \
+         patch("app.database.settings.RAG_HNSW_M", 16), \
+         patch("app.database.settings.RAG_HNSW_EF_CONSTRUCTION", 64):
+        assert vector_index_options() == parse_index_options(indexdef)
+        with patch("app.database.settings.RAG_HNSW_M", 32):
+            assert vector_index_options() != parse_index_options(indexdef)  # Triggers a rebuild
+
+
+@pytest.mark.asyncio
+async def test_iterative_scan_setting_is_whitelisted():
+    from unittest.mock import MagicMock
+    from app.database import apply_vector_search_settings
+
+    session = MagicMock()
+    session.bind.dialect.name = "postgresql"
+    session.execute = AsyncMock()
+    with patch("app.database.settings.RAG_VECTOR_INDEX", "hnsw"):
+        with patch("app.database.settings.RAG_HNSW_ITERATIVE_SCAN", "relaxed_order"):
+            await apply_vector_search_settings(session)
+        with patch("app.database.settings.RAG_HNSW_ITERATIVE_SCAN", "off; DROP TABLE users"):
+            await apply_vector_search_settings(session)
+
+    statements = [str(call.args[0]) for call in session.execute.await_args_list]
+    assert "SET LOCAL hnsw.iterative_scan = relaxed_order" in statements
+    assert not any("DROP" in statement for statement in statements)
+
+
+async def test_schema_helpers_report_failures(session_factory):
+    from sqlalchemy import text
+    from app.database import apply_schema_statements
+
+    async with session_factory.kw["bind"].begin() as conn:
+        assert await apply_schema_statements(conn, "ok", ["CREATE TABLE IF NOT EXISTS t (id INTEGER)"])
+        assert not await apply_schema_statements(conn, "broken", ["ALTER TABLE missing ADD COLUMN x INTEGER"])
+        # The failure was contained in its savepoint
+        assert (await conn.execute(text("SELECT count(*) FROM t"))).scalar() == 0
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from app.biometrics import record_samples
+from app.models import PerformanceMetric, User
+from app.user_state import describe_latest_metrics, get_user_state, record_metric, sync_profile
+
+
+def _reading(hour: int, value: float, source: str = "oura") -> dict:
+    return {"user_id": "u", "metric": "recovery", "ts": datetime(2026, 3, 1, hour), "value": value, "source": source}
+
+
+async def test_recovery_projection_keeps_newest_reading(session_factory):
+    async with session_factory() as session:
+        await record_samples(session, [_reading(8, 40), _reading(9, 65)])
+        await session.commit()
+    async with session_factory() as session:
+        # A late-arriving older reading must not replace the latest one
+        await record_samples(session, [_reading(7, 90, source="whoop")])
+        await session.commit()
+
+    async with session_factory() as session:
+        state = await get_user_state(session, "u")
+    assert (state["recovery"], state["recovery_ts"]) == (65.0, datetime(2026, 3, 1, 9))
+    assert state["is_traveling"] is None  # Profile not projected yet
+
+
+async def test_profile_and_metric_write_through(session_factory):
+    async with session_factory() as session:
+        await record_samples(session, [_reading(8, 55)])
+        user = User(id="u", role="client", is_traveling=True)
+        session.add(user)
+        await session.flush()
+        await sync_profile(session, user)
+        await session.commit()
+
+    async with session_factory() as session:
+        for name, value, day in [("squat", 140.0, 2), ("squat", 120.0, 1)]:
+            metric = PerformanceMetric(
+                user_id="u", category="strength", name=name, value=value, unit="kg",
+                logged_by="u", timestamp=datetime(2026, 3, day),
+            )
+            session.add(metric)
+            await record_metric(session, metric)
+        await session.commit()
+
+    async with session_factory() as session:
+        state = await get_user_state(session, "u")
+    assert (state["recovery"], state["is_traveling"], state["coach_style"]) == (55.0, True, "hyrox_competitor")
+    assert state["latest_metrics"]["strength"]["value"] == 140.0  # Backdated entry doesn't win
+    assert describe_latest_metrics(state) == "- strength: squat 140 kg (2026-03-02)"
+    assert describe_latest_metrics(None) == ""
+
+    async with session_factory() as session:
+        assert await get_user_state(session, "missing") is None
+
+
+async def test_gdpr_wipe_clears_projection_and_cached_user(session_factory, monkeypatch):
+    import httpx
+    from app.auth import get_user_row
+    from app.database import get_db
+    from app.main import app
+
+    async with session_factory() as session:
+        user = User(id="u", role="client", is_traveling=True, coach_style="hyrox_competitor")
+        session.add(user)
+        await session.flush()
+        await sync_profile(session, user)
+        await session.commit()
+        assert (await get_user_row(session, "u")).is_traveling  # Now cached
+
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    monkeypatch.setenv("ELITE_API_KEY", "test-key")
+    app.dependency_overrides[get_db] = override_db
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.delete("/users/u/wipe", headers={"X-Elite-Key": "test-key"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    async with session_factory() as session:
+        assert await get_user_state(session, "u") is None
+        assert (await get_user_row(session, "u")).is_traveling is False
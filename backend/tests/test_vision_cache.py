@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from app.vision_cache import VisionResultCache
+
+PHOTO = b"\xff\xd8hotel-gym" * 1000
+RESULT = {"detected_equipment": ["Dumbbells"], "confidence_score": 0.9}
+
+
+async def test_memory_tier_keys_on_content_model_and_prompt(session_factory):
+    cache = VisionResultCache(session_factory=session_factory)
+    compute = AsyncMock(return_value=RESULT)
+
+    assert await cache.get_or_compute("equipment", PHOTO, "gemini-x", "v1", compute) == RESULT
+    # Same bytes via a different buffer type still hit
+    assert await cache.get_or_compute("equipment", memoryview(bytearray(PHOTO)), "gemini-x", "v1", compute) == RESULT
+    assert compute.await_count == 1
+
+    await cache.get_or_compute("equipment", PHOTO, "gemini-x", "v2", compute)
+    await cache.get_or_compute("equipment", PHOTO, "gemini-y", "v1", compute)
+    await cache.get_or_compute("equipment", PHOTO + b"!", "gemini-x", "v1", compute)
+    assert compute.await_count == 4
+
+
+async def test_db_tier_survives_a_new_instance(session_factory):
+    compute = AsyncMock(return_value=RESULT)
+    await VisionResultCache(session_factory=session_factory).get_or_compute("equipment", PHOTO, "m", "v1", compute)
+
+    fresh = VisionResultCache(session_factory=session_factory)
+    assert await fresh.get_or_compute("equipment", PHOTO, "m", "v1", compute) == RESULT
+    assert compute.await_count == 1 and fresh.db_hits == 1
+
+
+async def test_concurrent_misses_share_one_call_and_failures_are_not_cached(session_factory):
+    cache = VisionResultCache(session_factory=session_factory)
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return RESULT
+
+    results = await asyncio.gather(*[cache.get_or_compute("equipment", PHOTO, "m", "v1", slow) for _ in range(5)])
+    assert results == [RESULT] * 5 and calls == 1
+
+    failing = AsyncMock(side_effect=RuntimeError("quota"))
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("form", PHOTO, "m", "v1", failing)
+    recovered = AsyncMock(return_value={"feedback": "ok"})
+    assert await cache.get_or_compute("form", PHOTO, "m", "v1", recovered) == {"feedback": "ok"}
+
+
+async def test_cancelled_leader_hands_over_to_waiters(session_factory):
+    cache = VisionResultCache(session_factory=session_factory)
+    leader_started = asyncio.Event()
+
+    async def leader_compute():
+        leader_started.set()
+        await asyncio.sleep(10)  # Client disconnects before Gemini answers
+
+    follower_compute = AsyncMock(return_value=RESULT)
+
+    leader = asyncio.create_task(cache.get_or_compute("equipment", PHOTO, "m", "v1", leader_compute))
+    await leader_started.wait()
+    followers = [asyncio.create_task(cache.get_or_compute("equipment", PHOTO, "m", "v1", follower_compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await asyncio.gather(*followers) == [RESULT] * 3
+    assert follower_compute.await_count == 1  # One waiter took over; the rest shared its call
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+async def test_cancelled_waiter_does_not_affect_leader(session_factory):
+    cache = VisionResultCache(session_factory=session_factory)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return RESULT
+
+    leader = asyncio.create_task(cache.get_or_compute("equipment", PHOTO, "m", "v1", slow))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(cache.get_or_compute("equipment", PHOTO, "m", "v1", slow))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+
+    assert await leader == RESULT
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
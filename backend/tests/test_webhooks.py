@@ -0,0 +1,210 @@
+import pytest
+import httpx
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import select, func
+
+from app.main import app
+from app.database import get_db
+from app.models import EventLog, User
+from app.schema import AgentResponse
+
+
+async def test_whatsapp_webhook_acks_fast_and_ignores_redelivery(session_factory):
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_db
+    body = {"From": "whatsapp:+447700900000", "Body": "Back hurts", "MessageSid": "SM123"}
+    try:
+        with patch("app.webhooks.whatsapp_queue.submit") as submit, \
+             patch("app.webhooks.app_graph.ainvoke", new_callable=AsyncMock) as agent:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                first = await client.post("/webhooks/whatsapp", json=body)
+                retry = await client.post("/webhooks/whatsapp", json=body)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first.json()["status"] == "accepted"
+    assert retry.json() == {"status": "duplicate", "event_id": None}
+    agent.assert_not_called()  # The agent runs on the worker, not in the request
+    assert submit.call_count == 1
+
+    async with session_factory() as session:
+        rows = (await session.execute(select(EventLog))).scalars().all()
+        assert len(rows) == 1 and rows[0].agent_decision == "PENDING_PROCESSING"
+        assert await session.scalar(select(func.count()).select_from(User)) == 1
+
+
+async def test_whatsapp_webhook_existing_sender_new_message_is_not_a_duplicate(session_factory):
+    async with session_factory() as session:
+        session.add(User(id="whatsapp:+447700900001", role="client"))
+        await session.commit()
+
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_db
+    try:
+        with patch("app.webhooks.whatsapp_queue.submit"):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                responses = [
+                    await client.post("/webhooks/whatsapp", json={"From": "whatsapp:+447700900001", "Body": body, "MessageSid": sid})
+                    for sid, body in [("SM1", "first"), ("SM2", "second")]
+                ]
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [r.json()["status"] for r in responses] == ["accepted", "accepted"]
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(EventLog)) == 2
+        assert await session.scalar(select(func.count()).select_from(User)) == 1
+
+
+async def test_whatsapp_webhook_without_db_reports_full_queue():
+    from app.task_queue import QueueFullError
+
+    async def override_db():
+        yield None
+
+    app.dependency_overrides[get_db] = override_db
+    try:
+        with patch("app.webhooks.whatsapp_queue.submit", side_effect=QueueFullError("full")):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post("/webhooks/whatsapp", json={"From": "+1", "Body": "hi"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+
+
+async def test_whatsapp_webhook_full_queue_lets_provider_redeliver(session_factory):
+    from app.task_queue import QueueFullError
+
+    async def override_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_db
+    body = {"From": "whatsapp:+447700900002", "Body": "Back hurts", "MessageSid": "SM9"}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            with patch("app.webhooks.whatsapp_queue.submit", side_effect=QueueFullError("full")):
+                rejected = await client.post("/webhooks/whatsapp", json=body)
+            with patch("app.webhooks.whatsapp_queue.submit") as submit:
+                retry = await client.post("/webhooks/whatsapp", json=body)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert rejected.status_code == 503
+    assert retry.json()["status"] == "accepted"  # Not swallowed as a duplicate
+    assert submit.call_count == 1
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(EventLog)) == 1
+
+
+async def test_whatsapp_worker_records_decision_and_queues_reply(session_factory):
+    from app.webhooks import process_whatsapp_message, WhatsAppPayload
+
+    async with session_factory() as session:
+        session.add(EventLog(id=1, user_id="+1", event_type="chat", payload={}, agent_decision="PENDING_PROCESSING"))
+        await session.commit()
+
+    response = AgentResponse(agent_name="Concierge", message="Rest today.", suggested_action="REST")
+    with patch("app.webhooks.app_graph.ainvoke", new=AsyncMock(return_value={"final_response": response})), \
+         patch("app.database.AsyncSessionLocal", session_factory), \
+         patch("app.webhooks.outbox.enqueue_whatsapp") as enqueue:
+        await process_whatsapp_message((1, WhatsAppPayload(From="+1", Body="hi")))
+
+    enqueue.assert_called_once_with(to="+1", body="Rest today.")
+    async with session_factory() as session:
+        row = await session.get(EventLog, 1)
+        assert (row.agent_decision, row.agent_message) == ("REST", "Rest today.")
+
+
+async def test_terra_samples_group_committed(session_factory):
+    import asyncio
+    from app.ingest import GroupCommitBuffer, write_event_rows, terra_event_rows
+
+    buffer = GroupCommitBuffer("test-events", write_event_rows, max_rows=1000, max_delay=0.01)
+    deliveries = [
+        terra_event_rows("daily", {"user_id": f"terra-{i}"}, [{"scores": {"recovery": 40 + j}} for j in range(50)])
+        for i in range(10)
+    ]
+    with patch("app.database.AsyncSessionLocal", session_factory):
+        results = await asyncio.gather(*[buffer.submit(rows) for rows in deliveries])
+
+    # Ten concurrent deliveries of 50 samples -> one transaction, each caller gets its own rows back
+    assert buffer.batches == 1 and buffer.rows_written == 500
+    assert [len(r) for r in results] == [50] * 10
+    assert {e.user_id for e in results[3]} == {"terra-3"}
+    assert results[0][0].event_type == "daily_summary"
+    assert results[0][0].payload["data"] == [{"scores": {"recovery": 40}}]
+
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(EventLog)) == 500
+
+
+def _terra_signature(secret: str, body: bytes, ts: int) -> str:
+    import hashlib
+    import hmac
+    return f"t={ts},v1=" + hmac.new(secret.encode(), f"{ts}.".encode() + body, hashlib.sha256).hexdigest()
+
+
+def test_terra_signature_verification():
+    from app.webhooks import verify_terra_signature
+
+    body = b'{"type":"daily","user":{},"data":[]}'
+    now = 1_700_000_000
+    verify_terra_signature(_terra_signature("s3cret", body, now), body, "s3cret", 300, now=now)
+
+    with pytest.raises(ValueError, match="mismatch"):
+        verify_terra_signature(_terra_signature("s3cret", body, now), body + b" ", "s3cret", 300, now=now)
+    with pytest.raises(ValueError, match="tolerance"):
+        verify_terra_signature(_terra_signature("s3cret", body, now - 301), body, "s3cret", 300, now=now)
+    with pytest.raises(ValueError, match="Malformed"):
+        verify_terra_signature("garbage", body, "s3cret", 300, now=now)
+    with pytest.raises(ValueError, match="mismatch"):
+        verify_terra_signature(f"t={now},v1=\u00e9", body, "s3cret", 300, now=now)
+
+
+async def test_terra_webhook_rejects_bad_signature_before_parsing():
+    import time
+    body = b'{"type":"daily","user":{"user_id":"t1"},"data":[]}'
+
+    async def override_db():
+        yield None
+
+    app.dependency_overrides[get_db] = override_db
+    try:
+        with patch("app.webhooks.settings.TERRA_API_SECRET", "s3cret"):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                bad = await client.post("/webhooks/terra", content=body, headers={"terra-signature": "t=1,v1=00"})
+                good = await client.post("/webhooks/terra", content=body,
+                                         headers={"terra-signature": _terra_signature("s3cret", body, int(time.time()))})
+                invalid = await client.post("/webhooks/terra", content=b'{"type": 1}',
+                                            headers={"terra-signature": _terra_signature("s3cret", b'{"type": 1}', int(time.time()))})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert bad.status_code == 403
+    assert good.status_code == 200 and good.json()["samples"] == 1
+    assert invalid.status_code == 422
+
+
+@pytest.mark.parametrize("body", [b'{"type": "daily", "user": ', b"\xff\xfe not utf-8", b'{"type": 1, "user": {"token": "secret"}}'])
+async def test_terra_webhook_rejects_unparseable_body_with_422(body):
+    async def override_db():
+        yield None
+
+    app.dependency_overrides[get_db] = override_db
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/webhooks/terra", content=body)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 422
+    assert all("input" not in error for error in response.json()["detail"])
+    assert "secret" not in response.text
@@ -1,6 +1,6 @@
-import { NextResponse } from 'next/server';
+import { NextRequest, NextResponse } from 'next/server';
 
-export async function GET() {
+export async function GET(request: NextRequest) {
     const mockEvents = [
         {
             id: 101,
@@ -40,5 +40,11 @@ export async function GET() {
         }
     ];
 
-    return NextResponse.json(mockEvents);
+    // Same query contract as the backend's GET /events: since_id returns only newer rows
+    const { searchParams } = request.nextUrl;
+    const sinceId = Number(searchParams.get('since_id') ?? NaN);
+    const limit = Number(searchParams.get('limit') ?? 50);
+    const events = Number.isFinite(sinceId) ? mockEvents.filter((event) => event.id > sinceId) : mockEvents;
+
+    return NextResponse.json(events.slice(0, limit > 0 ? limit : 50));
 }
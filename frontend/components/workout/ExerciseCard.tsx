@@ -4,7 +4,7 @@ import { useState, useEffect, useRef, useCallback } from "react";
 import { CheckCircle, PlayCircle, Camera, X, Zap, Loader2, Video } from "lucide-react";
 import { clsx } from "clsx";
 import Webcam from "react-webcam";
-import { analyzeVision } from "@/lib/api";
+import { uploadVisionMedia } from "@/lib/api";
 
 export type Exercise = {
     id: string;
@@ -90,22 +90,16 @@ export default function ExerciseCard({ exercise, onComplete, isActive }: Exercis
     }, [webcamRef]);
 
     const processVideo = async (blob: Blob) => {
-        // Convert Blob to Base64
-        const reader = new FileReader();
-        reader.readAsDataURL(blob);
-        reader.onloadend = async () => {
-            const base64data = reader.result as string;
-            try {
-                // Send to backend
-                const result = await analyzeVision(base64data, true);
-                setFeedback(result.message);
-            } catch (e) {
-                console.error(e);
-                setFeedback("Failed to analyze video. Try again.");
-            } finally {
-                setAnalyzing(false);
-            }
-        };
+        try {
+            // Stream the clip to the backend as multipart (no base64 copy)
+            const result = await uploadVisionMedia(blob, { filename: "form-check.webm", userQuery: exercise.name });
+            setFeedback(result.message);
+        } catch (e) {
+            console.error(e);
+            setFeedback("Failed to analyze video. Try again.");
+        } finally {
+            setAnalyzing(false);
+        }
     };
 
     if (!isActive) return null;
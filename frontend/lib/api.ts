@@ -20,19 +20,24 @@ const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL;
 // If BACKEND_URL is set, use it. Otherwise use internal BFF (/api/client).
 const API_BASE = BACKEND_URL ? `${BACKEND_URL}` : '/api/client';
 
+async function eventsAuthHeaders(): Promise<Record<string, string>> {
+    const headers: Record<string, string> = {};
+
+    const token = await getIdToken();
+    if (token) {
+        headers['Authorization'] = `Bearer ${token}`;
+    } else if (typeof window !== 'undefined' && window.localStorage.getItem('E2E_BYPASS')) {
+        if (process.env.NEXT_PUBLIC_API_KEY) {
+            headers['X-Elite-Key'] = process.env.NEXT_PUBLIC_API_KEY;
+        }
+    }
+    return headers;
+}
+
 export async function fetchEvents(limit = 50): Promise<EventLog[]> {
     try {
-        const url = BACKEND_URL ? `${API_BASE}/events?limit=${limit}` : `${API_BASE}/events`;
-        const headers: HeadersInit = {};
-
-        const token = await getIdToken();
-        if (token) {
-            headers['Authorization'] = `Bearer ${token}`;
-        } else if (typeof window !== 'undefined' && window.localStorage.getItem('E2E_BYPASS')) {
-            if (process.env.NEXT_PUBLIC_API_KEY) {
-                headers['X-Elite-Key'] = process.env.NEXT_PUBLIC_API_KEY;
-            }
-        }
+        const url = `${API_BASE}/events?limit=${limit}`;
+        const headers = await eventsAuthHeaders();
 
         const res = await fetch(url, { headers });
         if (res.status === 403) throw new Error('AUTH_ERROR');
@@ -44,6 +49,54 @@ export async function fetchEvents(limit = 50): Promise<EventLog[]> {
     }
 }
 
+export type EventsDelta = {
+    events: EventLog[];   // New rows only (newest first) when sinceId is given
+    etag: string | null;
+    notModified: boolean; // Server answered 304: nothing changed since `etag`
+};
+
+/**
+ * Incremental poll: asks only for rows newer than `sinceId` and sends the
+ * previous ETag so an unchanged feed costs a bodyless 304.
+ */
+export async function fetchEventsSince(sinceId: number | null, etag: string | null, limit = 50): Promise<EventsDelta> {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (sinceId !== null) params.set('since_id', String(sinceId));
+    const url = `${API_BASE}/events?${params}`; // The BFF honours since_id/limit too
+
+    const headers = await eventsAuthHeaders();
+    if (etag) headers['If-None-Match'] = etag;
+
+    const res = await fetch(url, { headers, cache: 'no-store' });
+    if (res.status === 304) return { events: [], etag, notModified: true };
+    if (res.status === 403) throw new Error('AUTH_ERROR');
+    if (!res.ok) throw new Error('Failed to fetch events');
+    return { events: await res.json(), etag: res.headers.get('ETag'), notModified: false };
+}
+
+/**
+ * Opens the server-push feed (GET /events/stream). EventSource cannot send
+ * headers, so the ID token travels as a query parameter. Returns null when
+ * streaming is unavailable (no direct backend URL, or SSR); callers keep polling.
+ */
+export async function openEventStream(onEvent: (event: EventLog) => void): Promise<EventSource | null> {
+    if (!BACKEND_URL || typeof window === 'undefined' || typeof EventSource === 'undefined') return null;
+
+    const params = new URLSearchParams();
+    const token = await getIdToken();
+    if (token) params.set('token', token);
+
+    const source = new EventSource(`${API_BASE}/events/stream?${params}`);
+    source.addEventListener('event_log', (message) => {
+        try {
+            onEvent(JSON.parse((message as MessageEvent).data));
+        } catch (error) {
+            console.error(error);
+        }
+    });
+    return source;
+}
+
 export async function triggerOverride(userId: string, action: string) {
     const url = BACKEND_URL ? `${API_BASE}/events/override` : `/api/trainer/override`;
 
@@ -112,6 +165,30 @@ export async function analyzeVision(imageBase64: string, _liveMode?: boolean): P
     }
 }
 
+/**
+ * Uploads a photo or form-check clip as multipart form data: the file is streamed
+ * as-is (no base64 inflation) and the backend spools it to disk.
+ */
+export async function uploadVisionMedia(media: Blob, options: { userQuery?: string; filename?: string } = {}): Promise<AgentResponse> {
+    try {
+        const headers = await getAuthHeaders() as Record<string, string>;
+        delete headers['Content-Type']; // The browser sets the multipart boundary
+        const form = new FormData();
+        form.append('media', media, options.filename || 'upload');
+        if (options.userQuery) form.append('user_query', options.userQuery);
+        const res = await fetch(`${API_BASE}/events/vision/upload`, {
+            method: 'POST',
+            headers,
+            body: form,
+        });
+        if (!res.ok) throw new Error(`Vision upload failed (${res.status})`);
+        return res.json();
+    } catch (error) {
+        console.error('Vision upload error:', error);
+        return { agent_name: 'System', message: 'Vision analysis unavailable.', suggested_action: 'ERROR' };
+    }
+}
+
 export async function sendChatMessage(userId: string, message: string): Promise<AgentResponse> {
     try {
         const headers = await getAuthHeaders();
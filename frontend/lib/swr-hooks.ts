@@ -1,19 +1,75 @@
+import { useEffect, useRef, useState } from 'react';
 import useSWR from 'swr';
-import { fetchEvents, EventLog } from './api';
+import { fetchEventsSince, openEventStream, EventLog } from './api';
 
-// SWR Fetcher wrapper
-const fetcher = async () => {
-    return await fetchEvents();
-};
+const FEED_LIMIT = 50;
+
+// Newest first, de-duplicated by id (later copies win), capped to the feed size
+function mergeEvents(current: EventLog[], incoming: EventLog[]): EventLog[] {
+    const byId = new Map<number, EventLog>();
+    for (const e of current) byId.set(e.id, e);
+    for (const e of incoming) byId.set(e.id, e);
+    return Array.from(byId.values())
+        .sort((a, b) => b.id - a.id)
+        .slice(0, FEED_LIMIT);
+}
 
 export function useEvents(refreshInterval = 5000) {
+    // Cursor state survives re-renders so each poll only asks for new rows
+    const feed = useRef<{ events: EventLog[]; etag: string | null }>({ events: [], etag: null });
+
+    const fetcher = async (): Promise<EventLog[]> => {
+        const { events: current, etag } = feed.current;
+        const sinceId = current.length > 0 ? current[0].id : null;
+        try {
+            const delta = await fetchEventsSince(sinceId, etag, FEED_LIMIT);
+            if (delta.notModified) return current;
+
+            const merged = sinceId === null ? delta.events : mergeEvents(current, delta.events);
+            feed.current = { events: merged, etag: delta.etag };
+            return merged;
+        } catch (error) {
+            console.error(error);
+            return current;
+        }
+    };
+
+    // While the push stream is open, polling is only a fallback for missed reconnects
+    const [streaming, setStreaming] = useState(false);
+
     const { data, error, isLoading, mutate } = useSWR<EventLog[]>('/api/events', fetcher, {
-        refreshInterval: refreshInterval,
+        refreshInterval: streaming ? 0 : refreshInterval,
         revalidateOnFocus: true,
         revalidateOnReconnect: true,
         keepPreviousData: true, // Show stale data while fetching
     });
 
+    useEffect(() => {
+        let source: EventSource | null = null;
+        let cancelled = false;
+
+        openEventStream((event) => {
+            const merged = mergeEvents(feed.current.events, [event]);
+            feed.current = { events: merged, etag: null }; // Body changed; old ETag no longer matches
+            mutate(merged, { revalidate: false });
+        }).then((opened) => {
+            if (cancelled) {
+                opened?.close();
+                return;
+            }
+            source = opened;
+            if (!source) return;
+            source.onopen = () => setStreaming(true);
+            source.onerror = () => setStreaming(false); // EventSource retries; poll meanwhile
+        });
+
+        return () => {
+            cancelled = true;
+            source?.close();
+            setStreaming(false);
+        };
+    }, [mutate]);
+
     return {
         events: data || [],
         isLoading,